@@ -1,493 +1,736 @@
 import tkinter as tk
-from tkinter import filedialog, scrolledtext, ttk, messagebox
-import requests
-import json
+from tkinter import filedialog, scrolledtext, ttk, messagebox, simpledialog
 import os
 import logging
+import queue
+import threading
+import time
+from array import array
+from itertools import islice
+
+import requests
+
+from batch_engine import run_ordered, DEFAULT_WORKERS, LOOKAHEAD_PER_WORKER
+from job_journal import Journal, journal_path, load_journal, run_key
+from model_catalog import ModelCatalog
+from model_fanout import GB, FanoutStats, comparison_path, plan_groups, write_comparison
+from model_warmup import CLOSE_TIMEOUT, ModelPin
+from prompt_dedup import Deduper, DEFAULT_THRESHOLD
+from packed_generation import PackedGenerator
+from speculative import CANCEL_POLICIES, DEFAULT_CANCEL_POLICY, SpeculativeGenerator
+from prompt_source import PromptSource, STREAM_THRESHOLD, available_columns, detect_format, guess_column
+from result_export import available_formats, export_path, export_row, open_exporter
+from result_store import ResultStore
+from result_view import ResultView
+from semantic_cache import DEFAULT_EMBED_MODEL, OllamaEmbedder
+from semantic_cache import DEFAULT_THRESHOLD as DEFAULT_SEMANTIC_THRESHOLD, available as semantic_available
+from telemetry import MetricsWriter, format_stats, metrics_path
+from prompt_generators import (
+    DEFAULT_MODEL, concurrency, generate_single_prompt, generate_chinese_prompt, ollama, result_cache,
+    run_telemetry, semantic_cache, stream_stats
+)
 
 # Global variables
 available_models = []
-
-# Fetch available Ollama models
+model_catalog = ModelCatalog(ollama)  # Last known models, refreshed in the background
+input_source = None  # PromptSource when a large/structured file is streamed from disk
+results = ResultStore()  # The run's output; the output pane only renders a window of it
+
+# Background batch state - the worker thread never touches Tk directly, it
+# posts messages to ui_queue and the main loop drains them with root.after()
+ui_queue = queue.Queue()
+stop_event = threading.Event()
+batch_thread = None
+active_pins = []  # ModelPins of the running batch, released on close if the batch can't
+UI_POLL_MS = 50
+UI_MAX_MESSAGES_PER_POLL = 500
+STATS_REFRESH_S = 1.0
+stats_view = {"updated": 0.0}
+
+# Live streaming drafts. Workers append streamed pieces to drafts[index];
+# the UI shows the draft of the next prompt due in the output (the results
+# still land in input order) and flushes new pieces once per poll tick, so
+# the text widget is redrawn at most every UI_POLL_MS rather than per token.
+draft_lock = threading.Lock()
+drafts = {}
+draft_view = {"index": 0, "pieces": None, "shown": 0}
+
+# Available Ollama models - startup uses the cached list and never waits on the network
 def fetch_ollama_models():
     global available_models
-    try:
-        response = requests.get("http://localhost:11434/api/tags")
-        response.raise_for_status()
-        data = response.json()
-        available_models = [model["name"] for model in data.get("models", [])]
-        if not available_models:
-            available_models = ["gemma3:27b"]  # Fallback
-    except Exception as e:
-        print(f"Error fetching Ollama models: {e}")
-        available_models = ["gemma3:27b"]  # Fallback if API fails
+    available_models = model_catalog.models or [DEFAULT_MODEL]  # Fallback before the first fetch
     return available_models
 
+def refresh_models(announce=True):
+    """Fetch the live model list in the background; the combobox updates when it arrives"""
+    def done(models, error):
+        ui_queue.put(("models", (models, error)))
+    if model_catalog.refresh(done) and announce:
+        update_status("Refreshing model list...")
+
+def apply_models(models, error):
+    global available_models
+    if error is not None:
+        print(f"Error fetching Ollama models: {error}")
+        update_status(f"Could not reach Ollama to refresh models ({error}) - using the last known list")
+        return
+    if not models:
+        update_status("Ollama has no models installed - pull one with 'ollama pull <model>'")
+        return
+    available_models = models
+    model_dropdown.config(values=available_models)
+    if model_var.get() not in available_models:
+        model_var.set(available_models[0])
+    fill_compare_list()
+    update_status(f"Model list updated - {len(available_models)} models available")
+
 def update_status(message):
     status_text.config(state=tk.NORMAL)
     status_text.delete("1.0", tk.END)
     status_text.insert(tk.END, message)
     status_text.config(state=tk.DISABLED)
-    root.update()
+
+def make_draft_callback(index):
+    """Build the on_token callback a worker uses to stream prompt `index`"""
+    def on_token(piece):
+        with draft_lock:
+            if piece is None:
+                drafts[index] = []
+            else:
+                drafts.setdefault(index, []).append(piece)
+    return on_token
+
+def reset_drafts():
+    with draft_lock:
+        drafts.clear()
+    result_view.clear_draft()
+    draft_view.update(index=0, pieces=None, shown=0)
+
+def flush_draft():
+    """Show whatever has streamed in for the next prompt due since the last tick"""
+    with draft_lock:
+        pieces = drafts.get(draft_view["index"])
+        new_pieces = pieces[draft_view["shown"]:] if pieces is not None else []
+    if pieces is not draft_view["pieces"]:
+        # Retry started over (or a new prompt came up) - redraw from scratch
+        result_view.clear_draft()
+        draft_view.update(pieces=pieces, shown=0)
+        with draft_lock:
+            new_pieces = list(pieces) if pieces is not None else []
+    if not new_pieces:
+        return
+    result_view.extend_draft("".join(new_pieces))
+    draft_view["shown"] += len(new_pieces)
+
+def commit_result(index, text, meta):
+    """Replace the streamed draft for prompt `index` with its cleaned result"""
+    result_view.clear_draft()
+    with draft_lock:
+        drafts.pop(index, None)
+    draft_view.update(index=index + 1, pieces=None, shown=0)
+    results.append(text, **meta)
+
+def drain_ui_queue():
+    """Apply queued updates from the batch thread, then reschedule"""
+    for _ in range(UI_MAX_MESSAGES_PER_POLL):
+        try:
+            kind, payload = ui_queue.get_nowait()
+        except queue.Empty:
+            break
+        if kind == "status":
+            update_status(payload)
+        elif kind == "result":
+            commit_result(*payload)
+        elif kind == "models":
+            apply_models(*payload)
+        elif kind == "ask":
+            title, message, reply = payload
+            reply.put(messagebox.askyesno(title, message))
+        elif kind == "done":
+            reset_drafts()
+            set_running(False)
+            update_stats()
+    result_view.refresh()
+    flush_draft()
+    if batch_thread is not None and batch_thread.is_alive():
+        if time.monotonic() - stats_view["updated"] >= STATS_REFRESH_S:
+            update_stats()
+    root.after(UI_POLL_MS, drain_ui_queue)
+
+def update_stats():
+    stats_text.config(state=tk.NORMAL)
+    stats_text.delete("1.0", tk.END)
+    stats_text.insert(tk.END, format_stats(run_telemetry.snapshot()))
+    if concurrency.summary():
+        stats_text.insert(tk.END, f"\n{concurrency.summary()}")
+    stats_text.config(state=tk.DISABLED)
+    stats_view["updated"] = time.monotonic()
+
+def set_running(running):
+    """Lock the controls that would start or disturb a batch while one is running"""
+    state = tk.DISABLED if running else tk.NORMAL
+    for button in (process_btn, chinese_btn, resume_btn, load_btn, clear_btn):
+        button.config(state=state)
+    stop_btn.config(state=tk.NORMAL if running else tk.DISABLED)
+
+def start_batch(batch_fn):
+    """Run batch_fn on a background thread; it reports back through ui_queue"""
+    global batch_thread
+    if batch_thread is not None and batch_thread.is_alive():
+        return
+    reset_drafts()
+    
+    def runner():
+        try:
+            batch_fn()
+        except Exception as e:
+            logging.exception("Batch failed")
+            ui_queue.put(("status", f"Batch failed: {e}"))
+        finally:
+            ui_queue.put(("done", None))
+    
+    stop_event.clear()
+    set_running(True)
+    batch_thread = threading.Thread(target=runner, name="dragon-batch", daemon=True)
+    batch_thread.start()
+
+def ask_from_batch(title, message):
+    """Ask a yes/no question on the Tk thread from the batch thread and wait for the answer"""
+    reply = queue.Queue()
+    ui_queue.put(("ask", (title, message, reply)))
+    return reply.get()
+
+def stop_batch():
+    """Stop the running batch; prompts in flight hang up on their next token"""
+    stop_event.set()
+    update_status("Stopping - closing the prompts in flight...")
+
+def on_close():
+    stop_event.set()
+    # The batch thread dies with the window, before its own release would run
+    for pin in list(active_pins):
+        pin.release(timeout=CLOSE_TIMEOUT)
+    root.destroy()
+
+def set_input_preview(source, total):
+    """Show the first prompts of a streamed file, read-only, in the input pane"""
+    preview = source.preview()
+    input_text.config(state=tk.NORMAL)
+    input_text.delete("1.0", tk.END)
+    input_text.insert(tk.END, '\n'.join(preview))
+    if total > len(preview):
+        input_text.insert(tk.END, f"\n\n... {total - len(preview)} more prompts will be streamed from the file")
+    input_text.config(state=tk.DISABLED)
+
+def release_input_source():
+    """Go back to taking input from the (editable) input pane"""
+    global input_source
+    input_source = None
+    input_text.config(state=tk.NORMAL)
 
 def load_prompt_file():
+    global input_source
     file_path = filedialog.askopenfilename(
         title="Select Prompt File",
-        filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")]
+        filetypes=[("Prompt Files", "*.txt *.jsonl *.ndjson *.csv"), ("Text Files", "*.txt"),
+                   ("JSON Lines", "*.jsonl *.ndjson"), ("CSV Files", "*.csv"), ("All Files", "*.*")]
     )
     if file_path:
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read().strip()
-                input_prompts = [line.strip() for line in content.split('\n') if line.strip()]
-                
-            input_text.delete("1.0", tk.END)
-            input_text.insert(tk.END, '\n'.join(input_prompts))
+            file_format = detect_format(file_path)
+            column = None
+            if file_format != "text":
+                columns = available_columns(file_path, file_format)
+                column = simpledialog.askstring(
+                    "Prompt Column",
+                    f"Which field holds the prompts?\nAvailable: {', '.join(columns)}",
+                    initialvalue=guess_column(columns), parent=root)
+                if not column:
+                    return
+                column = column.strip()
+            source = PromptSource(file_path, file_format, column)
+            
+            total = len(source)
+            release_input_source()
+            if source.format == "text" and total <= STREAM_THRESHOLD:
+                # Small plain files stay editable in the input pane, as before
+                input_text.delete("1.0", tk.END)
+                input_text.insert(tk.END, '\n'.join(source))
+            else:
+                input_source = source
+                set_input_preview(source, total)
             
-            file_label.config(text=f"Loaded: {os.path.basename(file_path)} ({len(input_prompts)} prompts)")
+            streamed = " - streamed from disk" if input_source is not None else ""
+            file_label.config(text=f"Loaded: {source.describe()} ({total} prompts{streamed})")
             mode_var.set("enhance")
-            update_status(f"Loaded {len(input_prompts)} prompts for enhancement")
+            on_mode_change()
+            update_status(f"Loaded {total} prompts for enhancement")
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load file: {e}")
 
 def save_output_file():
-    if not output_text.get("1.0", tk.END).strip():
+    if not len(results):
         messagebox.showwarning("Warning", "No output to save")
         return
         
     file_path = filedialog.asksaveasfilename(
         title="Save Enhanced Prompts",
         defaultextension=".txt",
-        filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")]
+        filetypes=[("Text Files", "*.txt")]
+                  + [(f"{file_format.upper()} with metadata", f"*.{file_format}")
+                     for file_format in available_formats() if file_format != "txt"]
+                  + [("All Files", "*.*")]
     )
     if file_path:
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(output_text.get("1.0", tk.END).strip())
-            update_status(f"Saved to: {os.path.basename(file_path)}")
+            with open_exporter(file_path) as exporter:
+                for index, prompt, text, meta in results.rows():
+                    exporter.write(export_row(index, prompt, text, meta, results.info))
+            update_status(f"Saved {len(results)} results to: {os.path.basename(file_path)}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save file: {e}")
 
-def clean_prompt_output(generated_text, is_chinese=False):
-    """Enhanced cleaning function for both English and Chinese outputs"""
-    import re
-    
-    # Clean the output - remove think tags, explanations, and formatting
-    clean_prompt = generated_text.strip()
-    
-    # Remove <think> blocks (existing functionality)
-    clean_prompt = re.sub(r'<think>.*?</think>', '', clean_prompt, flags=re.DOTALL)
-    
-    # Remove any remaining XML-like tags (existing functionality)
-    clean_prompt = re.sub(r'<[^>]+>', '', clean_prompt)
-    
-    # Remove Polaris thinking blocks - ENHANCED for your bleeding issues
-    clean_prompt = re.sub(r'\*\*Thoughts:\*\*.*?(?=\*\*Prompt:\*\*|\*\*Summary:\*\*|\*\*Final Prompt:\*\*|$)', '', clean_prompt, flags=re.DOTALL)
-    clean_prompt = re.sub(r'\*\*Summary:\*\*.*?(?=\*\*Prompt:\*\*|\*\*Final Prompt:\*\*|$)', '', clean_prompt, flags=re.DOTALL)
-    clean_prompt = re.sub(r'Thoughts:.*?(?=Prompt:|Summary:|Final Prompt:|$)', '', clean_prompt, flags=re.DOTALL)
-    clean_prompt = re.sub(r'Summary:.*?(?=Prompt:|Final Prompt:|$)', '', clean_prompt, flags=re.DOTALL)
-    
-    # Remove common unwanted prefixes/phrases (existing + enhanced)
-    unwanted_phrases = [
-        "Here's the enhanced prompt:",
-        "Enhanced prompt:",
-        "Prompt:",
-        "**Prompt:**",
-        "**Final Prompt:**",
-        "Final Prompt:",
-        "The refined prompt is:",
-        "Here is the enhanced version:",
-        "Enhanced version:",
-        "Here's a unique variation:",
-        "Unique variation:",
-        "Variation:"
-    ]
-    
-    # Add Chinese-specific unwanted phrases
-    if is_chinese:
-        unwanted_phrases.extend([
-            "以下是增强后的提示词：",
-            "增强提示词：",
-            "提示词：",
-            "改进后的提示词：",
-            "这是独特的变体：",
-            "变体：",
-            "使用哈苏",
-            "采用超现实主义数字艺术风格",
-            "f/2.8",
-            "ISO 100"
-        ])
-    
-    for phrase in unwanted_phrases:
-        if clean_prompt.startswith(phrase):
-            clean_prompt = clean_prompt[len(phrase):].strip()
-    
-    # Handle Chinese truncation issues
-    if is_chinese and clean_prompt.endswith('。') and len(clean_prompt) < 50:
-        # Likely truncated, but keep what we have
-        pass
-    
-    # Convert to single line and clean spaces
-    clean_prompt = " ".join(clean_prompt.split())
-    
-    return clean_prompt
-
-def generate_single_prompt(base_prompt, is_enhancement=True):
-    """Generate a single enhanced prompt using Ollama (EXISTING ENGLISH FUNCTION)"""
-    
-    # Enhancement system prompt (existing)
-    enhancement_system_prompt = """You are an expert AI artist and prompt engineer, tasked with refining and elevating an existing text-to-image prompt for the Flux Dev model. Your goal is to transform the provided input prompt into a single, highly detailed, evocative, and comprehensive prompt that will generate an amazing picture.
-Focus on enriching the input prompt by thoughtfully incorporating and enhancing elements such as:
-Subject and Action: Clearly define and elaborate on the main subject(s) and any actions or interactions they are performing. Add more descriptive adjectives and verbs.
-Environment and Setting: Expand on the background, atmosphere, and specific details of the environment. Think about the time of day, weather, and any relevant objects or structures.
-Artistic Style: Suggest a specific and compelling artistic style. Be precise, referencing movements (e.g., Art Nouveau, Baroque, Impressionistic), renowned artists, photographic styles (cinematic photography, fashion editorial), or digital art aesthetics (unreal engine render, octane render, concept art).
-Lighting and Mood: Describe the lighting conditions with precision (e.g., dramatic volumetric lighting, soft ambient glow, neon-lit cyberpunk scene, golden hour backlighting). Convey the desired emotional tone and atmosphere (e.g., serene, mysterious, vibrant, melancholic).
-Composition and Perspective: Guide the framing and camera angle (e.g., wide shot, extreme close-up, Dutch angle, symmetrical composition). Consider elements like depth of field, leading lines, or the rule of thirds.
-Color Palette: Specify the dominant colours or colour schemes (e.g., monochromatic, vibrant neon, muted earthy tones, complementary colours).
-Level of Detail: Emphasise details that add richness and realism, such as textures, materials, or intricate patterns.
-Technical Specifications (Optional): For photorealistic outputs, suggest camera-specific details like lens type (85mm prime lens), aperture (f/1.8), shutter speed, or film stock (Kodak Portra 400).
-Your entire output must be a single, refined text-to-image prompt only on a single text line. Do not provide any conversational text, explanations, or reasoning. The output should be ready for direct use with the Flux Dev model."""
-
-    # Generation system prompt (existing)
-    generation_system_prompt = """You are a creative prompt generator specialising in creating unique variations for text-to-image generation with the Flux Dev model. Your task is to take a core concept and generate a completely unique, detailed variation whilst maintaining the essential elements specified.
-
-Core Instructions:
-- Preserve ALL essential elements from the input (e.g., if "blonde woman in sci-fi" is specified, every output must have a blonde woman in a sci-fi setting)
-- Create maximum variation in ALL other aspects: poses, expressions, actions, environments, lighting, camera angles, artistic styles, moods, compositions, clothing/accessories, time of day, weather, colours, textures
-- Make each variation feel distinctly different whilst keeping the core subject intact
-- Adapt your variation strategy to the subject matter (human subjects = vary poses/expressions/clothing, abstract art = vary forms/textures/compositions, landscapes = vary weather/lighting/perspective)
-- Generate detailed, evocative descriptions that will produce visually striking results
-
-Variation Categories to Randomise:
-Physical Aspects: poses, expressions, gestures, body language, clothing, accessories, hair styles (if not specified)
-Environmental: settings, backgrounds, architecture, landscapes, weather, time of day, season
-Technical: camera angles, focal lengths, depth of field, composition rules, framing
-Artistic: art styles, lighting conditions, colour palettes, mood, atmosphere, rendering techniques
-Actions: what the subject is doing, interactions with environment, dynamic elements
-
-Your entire output must be a single, unique text-to-image prompt on one line. No explanations, just the prompt ready for Flux Dev."""
-
-    if is_enhancement:
-        system_prompt = enhancement_system_prompt
-        full_prompt = f"{system_prompt}\n\nInput prompt to enhance: {base_prompt}"
-    else:
-        system_prompt = generation_system_prompt
-        full_prompt = f"{system_prompt}\n\nCore concept to create unique variation from: {base_prompt}"
-
-    max_retries = 3
-    retries = 0
-    
-    while retries < max_retries:
-        try:
-            request_json = {
-                "model": model_var.get(),
-                "prompt": full_prompt,
-                "max_tokens": 400,
-                "temperature": 0.7,
-                "top_p": 0.85,
-                "stream": True
-            }
-            
-            response = requests.post(
-                "http://localhost:11434/api/generate", 
-                json=request_json, 
-                timeout=120, 
-                stream=True
-            )
-            response.raise_for_status()
-            
-            generated_text = ""
-            for line in response.iter_lines():
-                if line:
-                    json_line = json.loads(line.decode("utf-8"))
-                    if "response" in json_line:
-                        generated_text += json_line["response"]
-            
-            # Use enhanced cleaning function
-            clean_prompt = clean_prompt_output(generated_text, is_chinese=False)
-            
-            # Check word count
-            word_count = len(clean_prompt.split())
-            
-            # Check if complete (ends with proper punctuation)
-            is_complete = clean_prompt.strip().endswith((".", "!", "?"))
-            
-            # Enforce hard 300-word limit
-            if word_count > 300:
-                words = clean_prompt.split()
-                clean_prompt = " ".join(words[:300])
-                if not clean_prompt.endswith((".", "!", "?")):
-                    clean_prompt = clean_prompt.rstrip() + "."
-                word_count = 300
-            
-            # Accept if within range and complete
-            if word_count >= 225 and is_complete and word_count <= 300:
-                return clean_prompt, word_count
-            
-            # Accept shorter prompts if they seem complete and reasonable
-            if word_count >= 150 and is_complete and retries >= 1:
-                return clean_prompt, word_count
-            
-            if retries < max_retries - 1:
-                retries += 1
-                if word_count < 150:
-                    full_prompt = f"{system_prompt}\n\nInput: {base_prompt}\n\nExpand this response to be more detailed: {clean_prompt}"
-                elif not is_complete:
-                    clean_prompt = clean_prompt.rstrip() + "."
-                    return clean_prompt, word_count
-                else:
-                    break
-            else:
-                break
-                
-        except Exception as e:
-            retries += 1
-            if retries == max_retries:
-                return f"[Error generating prompt: {e}]", 0
-    
-    return clean_prompt if 'clean_prompt' in locals() else "[Generation failed]", word_count if 'word_count' in locals() else 0
+def apply_cache_settings():
+    """Copy the cache checkboxes onto the shared cache and reset run counters"""
+    result_cache.enabled = bool(cache_var.get())
+    result_cache.cache_generate = bool(cache_generate_var.get())
+    result_cache.reset_stats()
+    # The embedding model if it is installed, otherwise the local stand-in
+    embed_model = next((m for m in available_models if m in (DEFAULT_EMBED_MODEL, f"{DEFAULT_EMBED_MODEL}:latest")),
+                       None)
+    semantic_cache.configure(bool(semantic_var.get()), get_semantic_threshold(),
+                             OllamaEmbedder(ollama, embed_model) if embed_model else None)
+    semantic_cache.reset_stats()
+    stream_stats.reset()
+    run_telemetry.reset()
+
+def get_dedup_threshold():
+    """Similarity above which two input prompts count as the same, or None to keep every prompt"""
+    if not dedup_var.get():
+        return None
+    try:
+        threshold = float(dedup_threshold_var.get())
+    except (tk.TclError, ValueError):
+        threshold = DEFAULT_THRESHOLD
+    return min(max(threshold, 0.5), 1.0)
 
-def generate_chinese_prompt(base_prompt, is_enhancement=True):
-    """Generate Chinese prompt - NEW FUNCTION for token efficiency"""
-    
-    # Chinese Enhancement system prompt
-    chinese_enhancement_system_prompt = """你是一位专业的AI艺术家和提示词工程师，专门为Flux Dev模型优化和改进现有的文本到图像提示词。你的目标是将输入的提示词转换成单个高度详细、富有表现力和全面的中文提示词，生成令人惊叹的图像。
-
-重点增强以下元素：
-主体和动作：清晰定义并详述主要主体及其执行的动作或互动，添加更多描述性形容词和动词
-环境和设置：扩展背景、氛围和环境的具体细节，考虑时间、天气和相关物体或结构
-艺术风格：建议具体而引人注目的艺术风格，精确引用艺术运动、著名艺术家、摄影风格或数字艺术美学
-光线和情绪：精确描述光线条件，传达所需的情感基调和氛围
-构图和视角：指导取景和相机角度，考虑景深、引导线或三分法则等元素
-色彩搭配：指定主要颜色或配色方案
-细节层次：强调增加丰富性和真实感的细节，如纹理、材质或复杂图案
-技术规格：对于真实感输出，建议相机具体细节
-
-你的输出必须是单个精炼的中文文本到图像提示词，只能在一行文本中。不要提供任何对话文本、解释或推理。输出应该可以直接用于Flux Dev模型。"""
-
-    # Chinese Generation system prompt
-    chinese_generation_system_prompt = """你是专门为Flux Dev模型创建独特变体的创意提示词生成器。你的任务是接受核心概念并生成完全独特的详细变体，同时保持指定的基本元素。
-
-核心指令：
-- 保留输入中的所有基本元素
-- 在所有其他方面创造最大变化：姿势、表情、动作、环境、光线、相机角度、艺术风格、情绪、构图、服装配饰、时间、天气、颜色、纹理
-- 使每个变体感觉截然不同，同时保持核心主题完整
-- 根据主题调整变化策略
-- 生成详细且富有表现力的描述
-
-变化类别包括：
-身体方面：姿势、表情、手势、身体语言、服装、配饰、发型
-环境方面：设置、背景、建筑、景观、天气、时间、季节
-技术方面：相机角度、焦距、景深、构图规则、取景
-艺术方面：艺术风格、光线条件、色彩搭配、情绪、氛围、渲染技术
-动作方面：主体在做什么、与环境的互动、动态元素
-
-你的输出必须是单个独特的中文文本到图像提示词，在一行中。不要解释，只提供可直接用于Flux Dev的提示词。"""
-
-    if is_enhancement:
-        system_prompt = chinese_enhancement_system_prompt
-        full_prompt = f"{system_prompt}\n\n要增强的输入提示词: {base_prompt}"
-    else:
-        system_prompt = chinese_generation_system_prompt
-        full_prompt = f"{system_prompt}\n\n要创建独特变体的核心概念: {base_prompt}"
+def get_semantic_threshold():
+    """Cosine similarity at which a cached result of another prompt is reused"""
+    try:
+        threshold = float(semantic_threshold_var.get())
+    except (tk.TclError, ValueError):
+        threshold = DEFAULT_SEMANTIC_THRESHOLD
+    return min(max(threshold, 0.8), 1.0)
 
-    max_retries = 3
-    retries = 0
-    
-    while retries < max_retries:
-        try:
-            request_json = {
-                "model": model_var.get(),
-                "prompt": full_prompt,
-                "max_tokens": 300,  # Reduced for Chinese efficiency
-                "temperature": 0.7,
-                "top_p": 0.85,
-                "stream": True
-            }
-            
-            response = requests.post(
-                "http://localhost:11434/api/generate", 
-                json=request_json, 
-                timeout=120, 
-                stream=True
-            )
-            response.raise_for_status()
-            
-            generated_text = ""
-            for line in response.iter_lines():
-                if line:
-                    json_line = json.loads(line.decode("utf-8"))
-                    if "response" in json_line:
-                        generated_text += json_line["response"]
-            
-            # Use enhanced cleaning function with Chinese flag
-            clean_prompt = clean_prompt_output(generated_text, is_chinese=True)
-            
-            # Chinese character count (more meaningful than word count)
-            char_count = len(clean_prompt.replace(" ", ""))
-            
-            # Check if complete
-            is_complete = clean_prompt.strip().endswith(("。", "！", "？", ".", "!", "?"))
-            
-            # Enforce character limit for Chinese (150-200 chars is quite detailed)
-            if char_count > 200:
-                clean_prompt = clean_prompt[:200]
-                if not clean_prompt.endswith(("。", "！", "？", ".", "!", "?")):
-                    clean_prompt = clean_prompt.rstrip() + "。"
-                char_count = len(clean_prompt.replace(" ", ""))
-            
-            # Accept if within range and complete
-            if char_count >= 100 and is_complete and char_count <= 200:
-                return clean_prompt, char_count
-            
-            # Accept shorter prompts if they seem complete
-            if char_count >= 80 and is_complete and retries >= 1:
-                return clean_prompt, char_count
-            
-            if retries < max_retries - 1:
-                retries += 1
-                if char_count < 80:
-                    full_prompt = f"{system_prompt}\n\n输入: {base_prompt}\n\n请扩展这个回应，使其更详细: {clean_prompt}"
-                elif not is_complete:
-                    clean_prompt = clean_prompt.rstrip() + "。"
-                    return clean_prompt, char_count
-                else:
-                    break
-            else:
-                break
-                
-        except Exception as e:
-            retries += 1
-            if retries == max_retries:
-                return f"[生成提示词时出错: {e}]", 0
-    
-    return clean_prompt if 'clean_prompt' in locals() else "[生成失败]", char_count if 'char_count' in locals() else 0
+def get_pack_size():
+    """Prompts asked for per request; 1 sends every prompt on its own"""
+    try:
+        pack_size = int(pack_var.get())
+    except (tk.TclError, ValueError):
+        pack_size = 1
+    return min(max(pack_size, 1), 8)
 
-def process_prompts():
-    """Main processing function - EXISTING ENGLISH PROCESSING"""
+def get_candidate_count():
+    """Speculative candidates started per prompt; 1 turns speculation off"""
+    try:
+        candidates = int(candidates_var.get())
+    except (tk.TclError, ValueError):
+        candidates = 1
+    return min(max(candidates, 1), 4)
+
+def get_compare_models():
+    """The selected model followed by the ones picked to run alongside it"""
+    picked = [compare_list.get(n) for n in compare_list.curselection()]
+    return list(dict.fromkeys([model_var.get()] + picked))
+
+def get_vram_budget():
+    """GB of VRAM the models of a comparison may share; 0 loads one model at a time"""
+    try:
+        budget = float(vram_var.get())
+    except (tk.TclError, ValueError):
+        budget = 0.0
+    return max(budget, 0.0)
+
+def fill_compare_list():
+    """List every model but the selected one, keeping what was picked"""
+    picked = {compare_list.get(n) for n in compare_list.curselection()}
+    compare_list.delete(0, tk.END)
+    for model in available_models:
+        if model != model_var.get():
+            compare_list.insert(tk.END, model)
+            if model in picked:
+                compare_list.selection_set(tk.END)
+
+def get_worker_count():
+    """Read the parallel request count from the GUI, falling back to the default"""
+    try:
+        workers = int(workers_var.get())
+    except (tk.TclError, ValueError):
+        workers = DEFAULT_WORKERS
+    return max(1, workers)
+
+# Per-language wiring for the batch runner
+LANGUAGES = {
+    "english": {
+        "generate": generate_single_prompt,
+        "label": "prompt",
+        "unit": "words",
+        "results": "enhanced prompts",
+        "log_file": "prompt_factory.log",
+    },
+    "chinese": {
+        "generate": generate_chinese_prompt,
+        "label": "Chinese prompt",
+        "unit": "characters",
+        "results": "Chinese prompts",
+        "log_file": "prompt_factory_chinese.log",
+    },
+}
+
+def collect_input_prompts():
+    """Read the prompts to process from the GUI, or None (after warning) if there are none"""
     if mode_var.get() == "enhance":
+        if input_source is not None:
+            return input_source
         input_content = input_text.get("1.0", tk.END).strip()
         if not input_content:
             messagebox.showwarning("Warning", "No input prompts to enhance")
-            return
-        
-        input_prompts = [line.strip() for line in input_content.split('\n') if line.strip()]
-        total_prompts = len(input_prompts)
-        
-    else:
-        theme = theme_entry.get().strip()
-        if not theme:
-            messagebox.showwarning("Warning", "Please enter a theme/style for generation")
-            return
+            return None
         
-        try:
-            total_prompts = int(count_entry.get())
-            if total_prompts <= 0:
-                raise ValueError
-        except ValueError:
-            messagebox.showwarning("Warning", "Please enter a valid number of prompts to generate")
-            return
-        
-        input_prompts = [theme] * total_prompts
+        return [line.strip() for line in input_content.split('\n') if line.strip()]
+    
+    theme = theme_entry.get().strip()
+    if not theme:
+        messagebox.showwarning("Warning", "Please enter a theme/style for generation")
+        return None
     
-    output_text.delete("1.0", tk.END)
+    try:
+        total_prompts = int(count_entry.get())
+        if total_prompts <= 0:
+            raise ValueError
+    except ValueError:
+        messagebox.showwarning("Warning", "Please enter a valid number of prompts to generate")
+        return None
+    
+    return [theme] * total_prompts
+
+def process_batch(language, input_prompts, resume=False, models=None):
+    """Run a whole batch for one language on the background thread.
+
+    Every finished prompt is written to the run's journal; with `resume`,
+    prompts already in the journal are replayed instead of regenerated.
+    `models` fans the prompts out to several models, grouped so each one is
+    loaded once (see model_fanout.py); by default the selected model runs.
+    """
+    settings = LANGUAGES[language]
+    label = settings["label"]
+    total_prompts = len(input_prompts)
+    models = list(dict.fromkeys(models or [model_var.get()]))
+    fanout = len(models) > 1
+    total_items = total_prompts * len(models)
+    
+    results.clear()
+    result_view.reset()
     
-    log_file = "prompt_factory.log"
     logging.basicConfig(
-        filename=log_file, 
+        filename=settings["log_file"], 
         level=logging.INFO, 
         format="%(asctime)s - %(message)s",
         filemode='a'
     )
     
-    update_status("Starting prompt processing...")
-    logging.info(f"Starting processing of {total_prompts} prompts")
+    # Read everything Tk-related up front; the workers must not touch widgets
+    is_enhancement = mode_var.get() == "enhance"
+    mode = "enhance" if is_enhancement else "generate"
+    workers = get_worker_count()
+    candidates = get_candidate_count()
+    ollama.ensure_pool_size(workers * candidates)
+    # Adaptive mode treats every request slot as a ceiling and finds the level itself
+    concurrency.configure(bool(adaptive_var.get()), workers * candidates)
+    unload_after = bool(unload_var.get())
+    vram_bytes = get_vram_budget() * GB if fanout else 0
+    apply_cache_settings()
+    info = {"language": language, "mode": mode, "unit": settings["unit"]}
+    results.info = info
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    live_format = export_var.get()
+    live_path = (export_path(language, mode, stamp, live_format)
+                 if live_format in available_formats() else None)
+    compare_path = comparison_path(language, mode, stamp) if fanout else None
+    metrics = MetricsWriter(metrics_path(language, mode, stamp), run_telemetry,
+                            dict(info, model=models if fanout else models[0], workers=workers,
+                                 total=total_items))
+    # Generate mode repeats the theme on purpose - only enhancement is deduplicated
+    threshold = get_dedup_threshold() if is_enhancement else None
+    deduper = Deduper(threshold) if threshold is not None else None
+    # Speculation is for low latency and packing for throughput - speculation wins if both are set
+    speculative = (SpeculativeGenerator(language, candidates, pick_var.get())
+                   if candidates > 1 else None)
+    pack_size = get_pack_size()
+    packer = PackedGenerator(language, pack_size) if pack_size > 1 and speculative is None else None
     
-    enhanced_prompts = []
+    # One journal per model, so each model's part of a fan-out run resumes on its own.
+    # Filled in on the batch thread - hashing a big streamed input takes a while.
+    journals, done = {}, {}
     
-    for i, prompt in enumerate(input_prompts):
-        update_status(f"Processing prompt {i+1}/{total_prompts}...")
-        
-        is_enhancement = mode_var.get() == "enhance"
-        enhanced_prompt, word_count = generate_single_prompt(prompt, is_enhancement)
-        
-        enhanced_prompts.append(enhanced_prompt)
-        
-        if output_text.get("1.0", tk.END).strip():
-            output_text.insert(tk.END, "\n")
-        output_text.insert(tk.END, enhanced_prompt)
-        
-        logging.info(f"Processed prompt {i+1}: {word_count} words")
-        root.update()
+    def open_journals():
+        """Open the journals; returns the prompts they restore, or None if the user backs out"""
+        paths = {model: journal_path(language, mode, run_key(language, mode, model, input_prompts))
+                 for model in models}
+        if not resume:
+            # A fresh run starts its journal over - don't lose a resumable one unasked
+            unfinished = sum(len(records) for records, finished in map(load_journal, paths.values())
+                             if not finished)
+            if unfinished and not ask_from_batch(
+                    "Unfinished run", f"This input has an unfinished run with {unfinished} prompts done. "
+                                      "Starting over discards them - use Resume Run to keep them.\n\n"
+                                      "Start over anyway?"):
+                return None
+        for model, path in paths.items():
+            done[model] = load_journal(path)[0] if resume else {}
+            journals[model] = Journal(path, {"language": language, "mode": mode, "model": model,
+                                             "total": total_prompts}, resume=resume)
+        return sum(len(records) for records in done.values())
     
-    update_status(f"Completed! Generated {len(enhanced_prompts)} enhanced prompts")
-    logging.info(f"Processing completed. Generated {len(enhanced_prompts)} prompts")
-
-def process_chinese_prompts():
-    """Chinese processing function - NEW FUNCTION"""
-    if mode_var.get() == "enhance":
-        input_content = input_text.get("1.0", tk.END).strip()
-        if not input_content:
-            messagebox.showwarning("Warning", "No input prompts to enhance")
-            return
-        
-        input_prompts = [line.strip() for line in input_content.split('\n') if line.strip()]
-        total_prompts = len(input_prompts)
-        
-    else:
-        theme = theme_entry.get().strip()
-        if not theme:
-            messagebox.showwarning("Warning", "Please enter a theme/style for generation")
-            return
-        
-        try:
-            total_prompts = int(count_entry.get())
-            if total_prompts <= 0:
-                raise ValueError
-        except ValueError:
-            messagebox.showwarning("Warning", "Please enter a valid number of prompts to generate")
-            return
-        
-        input_prompts = [theme] * total_prompts
+    generate = speculative or packer or settings["generate"]
     
-    output_text.delete("1.0", tk.END)
+    def worker(item):
+        position, i, prompt, repeats, model = item
+        if i in done[model]:
+            record = done[model][i]
+            return record["output"], record["count"], {
+                "attempts": record.get("attempts", 0), "tokens": record.get("tokens", 0),
+                "latency": record.get("latency", 0.0), "journal": True}
+        if repeats is not None:
+            return None  # Filled in from the prompt it repeats, which is always earlier
+        report = {}
+        started = time.monotonic()
+        text, count = generate(prompt, is_enhancement, model,
+                               on_token=make_draft_callback(position),
+                               variant=i, report=report, cancel=stop_event)
+        report["latency"] = time.monotonic() - started
+        return text, count, report
     
-    log_file = "prompt_factory_chinese.log"
-    logging.basicConfig(
-        filename=log_file, 
-        level=logging.INFO, 
-        format="%(asctime)s - %(message)s",
-        filemode='a'
-    )
+    # Dedup verdicts from the first pass over the input, for the groups after it
+    verdicts = array("q")
     
-    update_status("Starting Chinese prompt processing...")
-    logging.info(f"Starting Chinese processing of {total_prompts} prompts")
+    def repeats_of(i, prompt):
+        if deduper is None:
+            return None
+        if i >= len(verdicts):
+            repeats = deduper.check(i, prompt)
+            verdicts.append(-1 if repeats is None else repeats)
+        return verdicts[i] if verdicts[i] >= 0 else None
     
-    enhanced_prompts = []
+    # Prompts read ahead at a time - as many as the engine keeps queued
+    read_ahead = workers * LOOKAHEAD_PER_WORKER
     
-    for i, prompt in enumerate(input_prompts):
-        update_status(f"Processing Chinese prompt {i+1}/{total_prompts}...")
-        
-        is_enhancement = mode_var.get() == "enhance"
-        enhanced_prompt, char_count = generate_chinese_prompt(prompt, is_enhancement)
-        
-        enhanced_prompts.append(enhanced_prompt)
-        
-        if output_text.get("1.0", tk.END).strip():
-            output_text.insert(tk.END, "\n")
-        output_text.insert(tk.END, enhanced_prompt)
+    def group_items(group, offset):
+        """(position, input index, prompt, repeats, model) for every prompt of one model group"""
+        position = offset
+        source = enumerate(input_prompts)
+        while True:
+            chunk = [(i, prompt, repeats_of(i, prompt)) for i, prompt in islice(source, read_ahead)]
+            if not chunk:
+                return
+            if semantic_cache.applies_to(is_enhancement):
+                # One embedding request for the prompts that will be looked up, not one each
+                semantic_cache.prefetch([prompt for i, prompt, repeats in chunk
+                                         if repeats is None and any(i not in done[model] for model in group)])
+            for i, prompt, repeats in chunk:
+                for model in group:
+                    yield position, i, prompt, repeats, model
+                    position += 1
+    
+    update_status(f"Preparing {total_prompts} {settings['results']}...")
+    
+    def batch():
+        restored = open_journals()
+        if restored is None:
+            ui_queue.put(("status", "Not started - the unfinished run's journal was kept"))
+            return
+        finished = False
+        produced = 0
+        active_pins.clear()
+        per_model = FanoutStats(models)
+        exporter = open_exporter(live_path) if live_path else None
+        # Results of first occurrences, for the repeats that come after them
+        originals = ResultStore()
+        original_rows = {}
+        # Every output by (input index, model), for the comparison table
+        outputs = ResultStore() if fanout else None
+        output_rows = {}
+        try:
+            logging.info(f"Starting {language} processing of {total_prompts} prompts"
+                         + (f" with {len(models)} models: {', '.join(models)}" if fanout else "")
+                         + (f" (resuming, {restored} already done)" if resume else ""))
+            ui_queue.put(("status", f"Processing {total_prompts} {settings['results']} ({workers} in parallel)"
+                                    + (f" with {len(models)} models" if fanout else "")
+                                    + (f" - {restored} restored from the journal" if restored else "") + "..."))
+            sizes, loaded = {}, ()
+            if fanout:
+                try:
+                    sizes, loaded = ollama.model_sizes(), ollama.running_models()
+                except requests.RequestException:
+                    pass  # No sizes means one model at a time, which is always safe
+            groups = plan_groups(models, sizes, vram_bytes, loaded)
+            offset = 0
+            for number, group in enumerate(groups):
+                if stop_event.is_set():
+                    break
+                # Load the group's models up front and keep them loaded until it is over;
+                # a model that has to make room for the next group is unloaded
+                group_pins = [ModelPin(ollama, model, language, mode,
+                                       unload_after=unload_after or number < len(groups) - 1)
+                              for model in group]
+                active_pins.extend(group_pins)
+                ui_queue.put(("status", f"Loading {', '.join(group)}..."))
+                warmup_started = time.monotonic()
+                for pin in group_pins:
+                    pin.load()
+                warmup = time.monotonic() - warmup_started
+                run_telemetry.record_warmup(warmup)
+                for pin in group_pins:
+                    logging.info(pin.summary())
+                ui_queue.put(("status", f"{', '.join(group)} ready after {warmup:.1f}s - processing "
+                                        f"{total_prompts} {settings['results']} ({workers} in parallel)..."))
+                concurrency.watch(ollama, group[0])
+                per_model.start_group(group)
+                try:
+                    for _, (position, i, prompt, repeats, model), result in run_ordered(
+                            group_items(group, offset), worker, workers, should_stop=stop_event.is_set):
+                        if stop_event.is_set():
+                            break  # Its stream may have been cut off by Stop - not a result
+                        if result is None:
+                            row = original_rows[(model, repeats)]
+                            result = (originals.text(row), originals.meta(row)["count"],
+                                      {"attempts": 0, "tokens": 0, "latency": 0.0, "cached": True})
+                        elif deduper is not None and repeats is None:
+                            original_rows[(model, i)] = originals.append(result[0], count=result[1])
+                        enhanced_prompt, count, report = result
+                        produced += 1
+                        per_model.record(model, report["tokens"])
+                        if outputs is not None:
+                            output_rows[(i, model)] = outputs.append(enhanced_prompt, count=count)
+                        meta = {"count": count, "attempts": report["attempts"], "tokens": report["tokens"],
+                                "latency": report["latency"], "model": model}
+                        ui_queue.put(("result", (position, enhanced_prompt, dict(meta, prompt=prompt, input_index=i))))
+                        if exporter is not None:
+                            exporter.write(export_row(i, prompt, enhanced_prompt, meta, info))
+                        ui_queue.put(("status", f"Processed {label} {i+1}/{total_prompts}"
+                                                + (f" with {model} ({produced}/{total_items})" if fanout else "")
+                                                + f" ({workers} in parallel)..."))
+                        if report.get("journal"):
+                            continue
+                        run_telemetry.record_prompt(report["attempts"], report["latency"],
+                                                    report.get("cached", False))
+                        metrics.maybe_write()
+                        journals[model].record(i, prompt, enhanced_prompt, count, attempts=report["attempts"],
+                                               tokens=report["tokens"], latency=round(report["latency"], 3),
+                                               **({"duplicate_of": repeats} if repeats is not None else {}))
+                        logging.info(f"Processed {label} {i+1}" + (f" with {model}" if fanout else "")
+                                     + f": {count} {settings['unit']}, "
+                                     f"{report['attempts']} attempts, {report['tokens']} tokens")
+                finally:
+                    per_model.end_group(group)
+                    concurrency.stop_watching()
+                    for pin in group_pins:
+                        pin.release()
+                offset += total_prompts * len(group)
+            finished = not stop_event.is_set()
+        finally:
+            for journal in journals.values():
+                journal.close(finished=finished)
+            metrics.write(finished=finished)
+            originals.close()
+            if exporter is not None:
+                exporter.close()
+            if outputs is not None:
+                write_comparison(compare_path, input_prompts, models,
+                                 lambda i, model: ((outputs.text(output_rows[(i, model)]),
+                                                    outputs.meta(output_rows[(i, model)])["count"])
+                                                   if (i, model) in output_rows else None))
+                outputs.close()
         
-        logging.info(f"Processed Chinese prompt {i+1}: {char_count} characters")
-        root.update()
+        warmup = f"Model warm-up: {run_telemetry.snapshot()['warmup_s']:.1f}s"
+        if not finished:
+            ui_queue.put(("status", f"Stopped after {produced}/{total_items} {settings['results']} "
+                                    f"- use Resume Run to pick up where this left off"))
+            logging.info(f"{language.capitalize()} processing stopped. Generated {produced} prompts")
+        else:
+            exported = f" - exported to {live_path}" if live_path else ""
+            compared = f" - compared in {compare_path}" if compare_path else ""
+            servers = f" | {ollama.summary()}" if ollama.summary() else ""
+            duplicates = f" | {deduper.summary()}" if deduper is not None else ""
+            packed = f" | {packer.summary()}" if packer is not None else ""
+            speculated = f" | {speculative.stats.summary()}" if speculative is not None else ""
+            semantic = f" | {semantic_cache.summary()}" if semantic_cache.summary() else ""
+            per_model_lines = "".join(f"\n{line}" for line in per_model.lines()) if fanout else ""
+            ui_queue.put(("status", f"Completed! Generated {produced} {settings['results']}{exported}{compared}\n"
+                                    f"{result_cache.summary()}{semantic}{duplicates}{packed}{speculated} | {warmup} | "
+                                    f"{stream_stats.summary()}{servers}{per_model_lines}"))
+            logging.info(f"{language.capitalize()} processing completed. Generated {produced} prompts")
+            logging.info(result_cache.summary())
+            if semantic_cache.summary():
+                logging.info(semantic_cache.summary())
+            logging.info(stream_stats.summary())
+            if deduper is not None:
+                logging.info(deduper.summary())
+            if packer is not None:
+                logging.info(packer.summary())
+            if speculative is not None:
+                logging.info(speculative.stats.summary())
+            if concurrency.summary():
+                logging.info(concurrency.summary())
+            logging.info(warmup)
+            if ollama.summary():
+                logging.info(ollama.summary())
+            for line in per_model.lines() if fanout else []:
+                logging.info(line)
+        for pin in active_pins:
+            for error in pin.errors:
+                logging.warning(f"Model warm-up/release: {error}")
     
-    update_status(f"Completed! Generated {len(enhanced_prompts)} Chinese prompts")
-    logging.info(f"Chinese processing completed. Generated {len(enhanced_prompts)} prompts")
+    start_batch(batch)
+
+def process_prompts():
+    """Main processing function - EXISTING ENGLISH PROCESSING"""
+    input_prompts = collect_input_prompts()
+    if input_prompts is not None:
+        process_batch("english", input_prompts, models=get_compare_models())
+
+def process_chinese_prompts():
+    """Chinese processing function - NEW FUNCTION"""
+    input_prompts = collect_input_prompts()
+    if input_prompts is not None:
+        process_batch("chinese", input_prompts, models=get_compare_models())
+
+def resume_run():
+    """Pick up an interrupted run of the current input where its journal left off"""
+    input_prompts = collect_input_prompts()
+    if input_prompts is None:
+        return
+    mode = mode_var.get()
+    model = model_var.get()
+    candidates = []
+    for language in LANGUAGES:
+        path = journal_path(language, mode, run_key(language, mode, model, input_prompts))
+        if os.path.exists(path):
+            candidates.append((os.path.getmtime(path), language, path))
+    if not candidates:
+        messagebox.showinfo("Resume Run", "No journal found for this input, mode and model - "
+                                          "start it with one of the Process buttons instead")
+        return
+    _, language, _ = max(candidates)
+    process_batch(language, input_prompts, resume=True, models=get_compare_models())
 
 def clear_all():
     """Clear all text areas"""
+    release_input_source()
     input_text.delete("1.0", tk.END)
-    output_text.delete("1.0", tk.END)
+    results.clear()
+    result_view.reset()
     file_label.config(text="No file loaded")
     update_status("Cleared all content")
 
@@ -620,6 +863,28 @@ load_btn = tk.Button(enhance_frame, text="Load Prompt File",
                      padx=20, pady=8)
 load_btn.grid(row=1, column=0, padx=10, pady=10)
 
+# Duplicate inputs are generated once and the result copied to every repeat.
+# Off by default: repeats that used to get enhancements of their own would get copies.
+dedup_var = tk.BooleanVar(value=False)
+dedup_check = tk.Checkbutton(enhance_frame, text="Skip duplicate prompts, similarity ≥", 
+                             variable=dedup_var, 
+                             bg=BG_BLACK, fg=TEXT_WHITE, 
+                             selectcolor=BG_CHARCOAL,
+                             activebackground=BG_BLACK,
+                             activeforeground=SCARLET_RED,
+                             font=("Arial", 10))
+dedup_check.grid(row=1, column=1, padx=(10, 0), pady=10, sticky="e")
+
+dedup_threshold_var = tk.StringVar(value=f"{DEFAULT_THRESHOLD:.2f}")
+dedup_spinbox = tk.Spinbox(enhance_frame, from_=0.5, to=1.0, increment=0.05, width=5, 
+                           format="%.2f", textvariable=dedup_threshold_var, 
+                           font=("Arial", 11),
+                           bg=BG_CHARCOAL, fg=TEXT_WHITE, 
+                           buttonbackground=BG_CHARCOAL,
+                           insertbackground=SCARLET_RED,
+                           relief="solid", bd=1)
+dedup_spinbox.grid(row=1, column=2, padx=(0, 10), pady=10, sticky="w")
+
 # Generation Mode Frame
 generate_frame = tk.LabelFrame(scrollable_frame, text="Generation Mode", 
                                font=("Arial", 12, "bold"), 
@@ -658,13 +923,185 @@ model_label = tk.Label(model_frame, text="Ollama Model:",
                        bg=BG_BLACK, fg=TEXT_WHITE, font=("Arial", 11))
 model_label.grid(row=0, column=0, padx=15, pady=15)
 
-model_var = tk.StringVar(value=available_models[0] if available_models else "gemma3:27b")
+model_var = tk.StringVar(value=available_models[0] if available_models else DEFAULT_MODEL)
 model_dropdown = ttk.Combobox(model_frame, textvariable=model_var, 
                               values=available_models, state="readonly", 
                               width=35, font=("Arial", 11),
                               style='Dragon.TCombobox')
 model_dropdown.grid(row=0, column=1, padx=15, pady=15)
 
+# Parallel requests - match this to OLLAMA_NUM_PARALLEL on the server
+workers_label = tk.Label(model_frame, text="Parallel requests:", 
+                         bg=BG_BLACK, fg=TEXT_WHITE, font=("Arial", 11))
+workers_label.grid(row=0, column=2, padx=(15, 5), pady=15)
+
+workers_var = tk.StringVar(value=str(DEFAULT_WORKERS))
+workers_spinbox = tk.Spinbox(model_frame, from_=1, to=32, width=5, 
+                             textvariable=workers_var, 
+                             font=("Arial", 11),
+                             bg=BG_CHARCOAL, fg=TEXT_WHITE, 
+                             buttonbackground=BG_CHARCOAL,
+                             insertbackground=SCARLET_RED,
+                             relief="solid", bd=1)
+workers_spinbox.grid(row=0, column=3, padx=(0, 15), pady=15)
+
+# Result cache - re-runs of the same prompt file skip prompts already done
+cache_var = tk.BooleanVar(value=True)
+cache_check = tk.Checkbutton(model_frame, text="Reuse cached results", 
+                             variable=cache_var, 
+                             bg=BG_BLACK, fg=TEXT_WHITE, 
+                             selectcolor=BG_CHARCOAL,
+                             activebackground=BG_BLACK,
+                             activeforeground=SCARLET_RED,
+                             font=("Arial", 10))
+cache_check.grid(row=1, column=0, columnspan=2, padx=15, pady=(0, 10), sticky="w")
+
+cache_generate_var = tk.BooleanVar(value=False)
+cache_generate_check = tk.Checkbutton(model_frame, text="Also cache generated variations", 
+                                      variable=cache_generate_var, 
+                                      bg=BG_BLACK, fg=TEXT_WHITE, 
+                                      selectcolor=BG_CHARCOAL,
+                                      activebackground=BG_BLACK,
+                                      activeforeground=SCARLET_RED,
+                                      font=("Arial", 10))
+cache_generate_check.grid(row=1, column=2, columnspan=2, padx=15, pady=(0, 10), sticky="w")
+
+# Semantic cache - inputs that only differ in wording reuse each other's results
+semantic_var = tk.BooleanVar(value=False)
+semantic_check = tk.Checkbutton(model_frame, 
+                                text="Also reuse results of similar prompts, similarity ≥" if semantic_available()
+                                else "Reuse results of similar prompts (needs numpy)", 
+                                variable=semantic_var, 
+                                state=tk.NORMAL if semantic_available() else tk.DISABLED,
+                                bg=BG_BLACK, fg=TEXT_WHITE, 
+                                selectcolor=BG_CHARCOAL,
+                                activebackground=BG_BLACK,
+                                activeforeground=SCARLET_RED,
+                                font=("Arial", 10))
+semantic_check.grid(row=7, column=0, columnspan=2, padx=15, pady=(0, 10), sticky="w")
+
+semantic_threshold_var = tk.StringVar(value=f"{DEFAULT_SEMANTIC_THRESHOLD:.2f}")
+semantic_spinbox = tk.Spinbox(model_frame, from_=0.8, to=1.0, increment=0.01, width=5, 
+                              format="%.2f", textvariable=semantic_threshold_var, 
+                              font=("Arial", 11),
+                              bg=BG_CHARCOAL, fg=TEXT_WHITE, 
+                              buttonbackground=BG_CHARCOAL,
+                              insertbackground=SCARLET_RED,
+                              relief="solid", bd=1)
+semantic_spinbox.grid(row=7, column=2, padx=15, pady=(0, 10), sticky="w")
+
+# Live export - each result is written to exports/ as soon as it is done
+export_label = tk.Label(model_frame, text="Live export:", 
+                        bg=BG_BLACK, fg=TEXT_WHITE, font=("Arial", 11))
+export_label.grid(row=2, column=0, padx=15, pady=(0, 10), sticky="w")
+
+export_var = tk.StringVar(value="off")
+export_dropdown = ttk.Combobox(model_frame, textvariable=export_var, 
+                               values=["off"] + [f for f in available_formats() if f != "txt"], 
+                               state="readonly", width=10, font=("Arial", 11),
+                               style='Dragon.TCombobox')
+export_dropdown.grid(row=2, column=1, padx=15, pady=(0, 10), sticky="w")
+
+refresh_models_btn = tk.Button(model_frame, text="Refresh Models", 
+                               command=refresh_models, 
+                               bg=BG_CHARCOAL, fg=TEXT_WHITE, 
+                               font=("Arial", 10),
+                               relief="raised", bd=2,
+                               activebackground=DARK_GOLD,
+                               activeforeground=BG_BLACK)
+refresh_models_btn.grid(row=2, column=2, columnspan=2, padx=15, pady=(0, 10), sticky="w")
+
+# Packing - several short prompts per request; keep Parallel requests at least this high
+pack_label = tk.Label(model_frame, text="Prompts per request:", 
+                      bg=BG_BLACK, fg=TEXT_WHITE, font=("Arial", 11))
+pack_label.grid(row=3, column=0, padx=15, pady=(0, 10), sticky="w")
+
+pack_var = tk.StringVar(value="1")
+pack_spinbox = tk.Spinbox(model_frame, from_=1, to=8, width=5, 
+                          textvariable=pack_var, 
+                          font=("Arial", 11),
+                          bg=BG_CHARCOAL, fg=TEXT_WHITE, 
+                          buttonbackground=BG_CHARCOAL,
+                          insertbackground=SCARLET_RED,
+                          relief="solid", bd=1)
+pack_spinbox.grid(row=3, column=1, padx=15, pady=(0, 10), sticky="w")
+
+# Speculative candidates - several seeded attempts per prompt at once, for low latency
+candidates_label = tk.Label(model_frame, text="Candidates per prompt:", 
+                            bg=BG_BLACK, fg=TEXT_WHITE, font=("Arial", 11))
+candidates_label.grid(row=3, column=2, padx=(15, 5), pady=(0, 10))
+
+candidates_var = tk.StringVar(value="1")
+candidates_spinbox = tk.Spinbox(model_frame, from_=1, to=4, width=5, 
+                                textvariable=candidates_var, 
+                                font=("Arial", 11),
+                                bg=BG_CHARCOAL, fg=TEXT_WHITE, 
+                                buttonbackground=BG_CHARCOAL,
+                                insertbackground=SCARLET_RED,
+                                relief="solid", bd=1)
+candidates_spinbox.grid(row=3, column=3, padx=(0, 15), pady=(0, 10))
+
+pick_label = tk.Label(model_frame, text="Keep candidate:", 
+                      bg=BG_BLACK, fg=TEXT_WHITE, font=("Arial", 11))
+pick_label.grid(row=4, column=2, padx=(15, 5), pady=(0, 10))
+
+pick_var = tk.StringVar(value=DEFAULT_CANCEL_POLICY)
+pick_dropdown = ttk.Combobox(model_frame, textvariable=pick_var, 
+                             values=list(CANCEL_POLICIES), 
+                             state="readonly", width=6, font=("Arial", 11),
+                             style='Dragon.TCombobox')
+pick_dropdown.grid(row=4, column=3, padx=(0, 15), pady=(0, 10))
+
+# Adaptive concurrency - Parallel requests becomes a ceiling the run tunes itself under
+adaptive_var = tk.BooleanVar(value=False)
+adaptive_check = tk.Checkbutton(model_frame, text="Adapt parallel requests to the server", 
+                                variable=adaptive_var, 
+                                bg=BG_BLACK, fg=TEXT_WHITE, 
+                                selectcolor=BG_CHARCOAL,
+                                activebackground=BG_BLACK,
+                                activeforeground=SCARLET_RED,
+                                font=("Arial", 10))
+adaptive_check.grid(row=4, column=0, columnspan=2, padx=15, pady=(0, 10), sticky="w")
+
+# The model is loaded and pinned for every run; this frees its VRAM afterwards
+unload_var = tk.BooleanVar(value=False)
+unload_check = tk.Checkbutton(model_frame, text="Unload the model when the run ends", 
+                              variable=unload_var, 
+                              bg=BG_BLACK, fg=TEXT_WHITE, 
+                              selectcolor=BG_CHARCOAL,
+                              activebackground=BG_BLACK,
+                              activeforeground=SCARLET_RED,
+                              font=("Arial", 10))
+unload_check.grid(row=5, column=0, columnspan=2, padx=15, pady=(0, 10), sticky="w")
+
+# Models picked here get every prompt too, for a side-by-side comparison
+compare_label = tk.Label(model_frame, text="Also run with:", 
+                         bg=BG_BLACK, fg=TEXT_WHITE, 
+                         font=("Arial", 11))
+compare_label.grid(row=6, column=0, padx=15, pady=(0, 10), sticky="nw")
+
+compare_list = tk.Listbox(model_frame, selectmode=tk.MULTIPLE, height=4, 
+                          exportselection=False, 
+                          bg=BG_CHARCOAL, fg=TEXT_WHITE, 
+                          selectbackground=SCARLET_RED, 
+                          font=("Arial", 10))
+compare_list.grid(row=6, column=1, padx=15, pady=(0, 10), sticky="ew")
+fill_compare_list()
+model_dropdown.bind("<<ComboboxSelected>>", lambda event: fill_compare_list())
+
+vram_label = tk.Label(model_frame, text="Shared VRAM (GB, 0 = one at a time):", 
+                      bg=BG_BLACK, fg=TEXT_WHITE, 
+                      font=("Arial", 11))
+vram_label.grid(row=6, column=2, padx=15, pady=(0, 10), sticky="nw")
+
+vram_var = tk.StringVar(value="0")
+vram_spinbox = tk.Spinbox(model_frame, from_=0, to=512, width=5, 
+                          textvariable=vram_var, 
+                          bg=BG_CHARCOAL, fg=TEXT_WHITE, 
+                          buttonbackground=BG_CHARCOAL, 
+                          font=("Arial", 11))
+vram_spinbox.grid(row=6, column=3, padx=15, pady=(0, 10), sticky="nw")
+
 # Control Buttons with Dragon styling
 button_frame = tk.Frame(scrollable_frame, bg=BG_BLACK)
 button_frame.grid(row=4, column=0, columnspan=2, pady=20)
@@ -700,6 +1137,27 @@ clear_btn = tk.Button(button_frame, text="Clear All",
                       padx=20, pady=10)
 clear_btn.grid(row=0, column=2, padx=10)
 
+stop_btn = tk.Button(button_frame, text="Stop", 
+                     command=stop_batch, 
+                     state=tk.DISABLED,
+                     bg=BG_CHARCOAL, fg=SCARLET_RED, 
+                     font=("Arial", 12, "bold"),
+                     relief="raised", bd=3,
+                     activebackground=SCARLET_RED,
+                     activeforeground=TEXT_WHITE,
+                     padx=20, pady=10)
+stop_btn.grid(row=0, column=3, padx=10)
+
+resume_btn = tk.Button(button_frame, text="Resume Run", 
+                       command=resume_run, 
+                       bg=BG_CHARCOAL, fg=RICH_GOLD, 
+                       font=("Arial", 11, "bold"),
+                       relief="raised", bd=2,
+                       activebackground=RICH_GOLD,
+                       activeforeground=BG_BLACK,
+                       padx=15, pady=8)
+resume_btn.grid(row=1, column=3, padx=10, pady=(10, 0))
+
 # Chinese processing button (functionality preserved, UI cleaned)
 chinese_btn = tk.Button(button_frame, text="Process Chinese", 
                         command=process_chinese_prompts, 
@@ -744,30 +1202,50 @@ output_frame = tk.LabelFrame(io_frame, text="Enhanced Prompts",
                              bd=2, relief="ridge")
 output_frame.grid(row=0, column=1, sticky="ew", padx=(8, 0), pady=5)
 
-output_text = scrolledtext.ScrolledText(output_frame, wrap=tk.WORD, 
-                                        width=50, height=15, 
-                                        bg=BG_CHARCOAL, fg=TEXT_WHITE, 
-                                        font=("Consolas", 9),
-                                        insertbackground=SCARLET_RED,
-                                        selectbackground=SCARLET_RED,
-                                        selectforeground=TEXT_WHITE,
-                                        relief="solid", bd=1)
-output_text.grid(row=0, column=0, sticky="ew", padx=10, pady=10)
+# Plain Text + scrollbar rather than ScrolledText: the scrollbar tracks the
+# position in the whole result store, not in the rendered window
+output_text = tk.Text(output_frame, wrap=tk.WORD, 
+                      width=50, height=15, 
+                      bg=BG_CHARCOAL, fg=TEXT_WHITE, 
+                      font=("Consolas", 9),
+                      insertbackground=SCARLET_RED,
+                      selectbackground=SCARLET_RED,
+                      selectforeground=TEXT_WHITE,
+                      relief="solid", bd=1)
+output_text.grid(row=0, column=0, sticky="ew", padx=(10, 0), pady=10)
+output_text.tag_configure("draft", foreground=TEXT_SILVER)
+output_scrollbar = ttk.Scrollbar(output_frame, orient="vertical")
+output_scrollbar.grid(row=0, column=1, sticky="ns", padx=(0, 10), pady=10)
+result_view = ResultView(output_text, output_scrollbar, results)
 
 # Status Area with Dragon styling
 status_frame = tk.LabelFrame(scrollable_frame, text="Status", 
                              font=("Arial", 12, "bold"), 
                              bg=BG_BLACK, fg=RICH_GOLD, 
                              bd=2, relief="ridge")
-status_frame.grid(row=6, column=0, columnspan=2, sticky="ew", padx=15, pady=(10, 15))
+status_frame.grid(row=6, column=0, sticky="nsew", padx=(15, 8), pady=(10, 15))
 
-status_text = tk.Text(status_frame, height=3, 
+status_text = tk.Text(status_frame, height=5, width=50, wrap=tk.WORD, 
                       bg=BG_CHARCOAL, fg=RICH_GOLD, 
                       font=("Arial", 10), 
                       state=tk.DISABLED,
                       relief="solid", bd=1)
 status_text.grid(row=0, column=0, sticky="ew", padx=10, pady=10)
 
+# Live run statistics from the server's own timings - see telemetry.py
+stats_frame = tk.LabelFrame(scrollable_frame, text="Run Statistics", 
+                            font=("Arial", 12, "bold"), 
+                            bg=BG_BLACK, fg=RICH_GOLD, 
+                            bd=2, relief="ridge")
+stats_frame.grid(row=6, column=1, sticky="nsew", padx=(8, 15), pady=(10, 15))
+
+stats_text = tk.Text(stats_frame, height=5, width=50, wrap=tk.WORD, 
+                     bg=BG_CHARCOAL, fg=TEXT_WHITE, 
+                     font=("Consolas", 9), 
+                     state=tk.DISABLED,
+                     relief="solid", bd=1)
+stats_text.grid(row=0, column=0, sticky="ew", padx=10, pady=10)
+
 # Configure grid weights for the scrollable frame
 scrollable_frame.grid_columnconfigure(0, weight=1)
 scrollable_frame.grid_columnconfigure(1, weight=1)
@@ -778,6 +1256,7 @@ io_frame.grid_columnconfigure(1, weight=1)
 input_frame.grid_columnconfigure(0, weight=1)
 output_frame.grid_columnconfigure(0, weight=1)
 status_frame.grid_columnconfigure(0, weight=1)
+stats_frame.grid_columnconfigure(0, weight=1)
 
 # Initialize mode
 on_mode_change()
@@ -785,4 +1264,8 @@ on_mode_change()
 # Initial status with Dragon flair
 update_status("Dragon Diffusion ready - Select processing mode and configure options")
 
+root.protocol("WM_DELETE_WINDOW", on_close)
+root.after(UI_POLL_MS, drain_ui_queue)
+if model_catalog.is_stale():
+    refresh_models(announce=False)
 root.mainloop()
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""Concurrent batch engine for Dragon Diffusion prompt runs.
+
+Keeps a bounded number of Ollama requests in flight so a server started with
+OLLAMA_NUM_PARALLEL > 1 has work for every slot, while results are still
+handed back strictly in input order.
+"""
+import concurrent.futures
+from collections import deque
+
+DEFAULT_WORKERS = 4
+
+# How many finished-but-not-yet-yielded results we allow per worker. A slow
+# prompt at the head of the queue must not stall the other slots, so the
+# submission window is wider than the pool itself.
+LOOKAHEAD_PER_WORKER = 4
+
+
+def run_ordered(items, worker_fn, workers=DEFAULT_WORKERS, should_stop=None, poll_interval=0.05):
+    """Run worker_fn over items with at most `workers` calls in flight.
+
+    Yields (index, item, result) tuples in the same order as `items`.
+    `items` may be any iterable; it is consumed lazily so very large inputs
+    are never materialised all at once. If `should_stop` (checked every
+    `poll_interval` seconds while waiting) returns True the run ends early
+    without waiting for the prompt at the head of the queue; queued prompts
+    are never started.
+    """
+    workers = max(1, int(workers))
+    window = workers * LOOKAHEAD_PER_WORKER
+    source = iter(enumerate(items))
+    pending = deque()
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                                     thread_name_prefix="dragon-worker")
+
+    def fill():
+        while len(pending) < window:
+            try:
+                index, item = next(source)
+            except StopIteration:
+                return
+            pending.append((index, item, executor.submit(worker_fn, item)))
+
+    try:
+        fill()
+        while pending:
+            index, item, future = pending[0]
+            while True:
+                if should_stop is not None and should_stop():
+                    return
+                try:
+                    result = future.result(timeout=poll_interval if should_stop is not None else None)
+                    break
+                except concurrent.futures.TimeoutError:
+                    pass
+            pending.popleft()
+            fill()
+            yield index, item, result
+    finally:
+        # Caller stopped early (or something blew up) - don't start
+        # anything that hasn't been picked up by a worker yet, and don't
+        # block on requests that are already streaming.
+        executor.shutdown(wait=False, cancel_futures=True)
+
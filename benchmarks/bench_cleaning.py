@@ -0,0 +1,92 @@
+"""Micro-benchmark for clean_prompt_output.
+
+Runs the precompiled pipeline in prompt_cleaning.py against a copy of the
+original per-call regex implementation over a corpus of realistic raw model
+outputs, checks the two agree byte for byte, and prints time per call.
+
+    python benchmarks/bench_cleaning.py [--repeat N]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompt_cleaning import clean_prompt_output  # noqa: E402
+
+
+def legacy_clean_prompt_output(generated_text, is_chinese=False):
+    """The cleaning function as it was before prompt_cleaning.py (reference only)"""
+    clean_prompt = generated_text.strip()
+    clean_prompt = re.sub(r'<think>.*?</think>', '', clean_prompt, flags=re.DOTALL)
+    clean_prompt = re.sub(r'<[^>]+>', '', clean_prompt)
+    clean_prompt = re.sub(r'\*\*Thoughts:\*\*.*?(?=\*\*Prompt:\*\*|\*\*Summary:\*\*|\*\*Final Prompt:\*\*|$)', '', clean_prompt, flags=re.DOTALL)
+    clean_prompt = re.sub(r'\*\*Summary:\*\*.*?(?=\*\*Prompt:\*\*|\*\*Final Prompt:\*\*|$)', '', clean_prompt, flags=re.DOTALL)
+    clean_prompt = re.sub(r'Thoughts:.*?(?=Prompt:|Summary:|Final Prompt:|$)', '', clean_prompt, flags=re.DOTALL)
+    clean_prompt = re.sub(r'Summary:.*?(?=Prompt:|Final Prompt:|$)', '', clean_prompt, flags=re.DOTALL)
+    unwanted_phrases = [
+        "Here's the enhanced prompt:", "Enhanced prompt:", "Prompt:", "**Prompt:**",
+        "**Final Prompt:**", "Final Prompt:", "The refined prompt is:",
+        "Here is the enhanced version:", "Enhanced version:",
+        "Here's a unique variation:", "Unique variation:", "Variation:"
+    ]
+    if is_chinese:
+        unwanted_phrases.extend([
+            "以下是增强后的提示词：", "增强提示词：", "提示词：", "改进后的提示词：",
+            "这是独特的变体：", "变体：", "使用哈苏", "采用超现实主义数字艺术风格",
+            "f/2.8", "ISO 100"
+        ])
+    for phrase in unwanted_phrases:
+        if clean_prompt.startswith(phrase):
+            clean_prompt = clean_prompt[len(phrase):].strip()
+    return " ".join(clean_prompt.split())
+
+
+PROMPT = ("A breathtaking ultra-wide panoramic vista of a bioluminescent fungal forest sprawling "
+          "across a fractured amethyst mesa, colossal crystalline structures piercing a swirling "
+          "nebula sky, dramatic volumetric lighting, hyperdetailed textures, art by Roger Dean. ")
+CHINESE_PROMPT = "超现实主义魔法森林，生物发光的蘑菇在苔藓覆盖的地面上投射出棱镜般的光芒，戏剧性的体积光穿透古老橡树的树冠，85mm镜头f/1.8拍摄，octane渲染。"
+REASONING = ("Okay, the user wants a richer prompt. If the light level x < threshold then the scene "
+             "reads as night, so maybe keep 0 < x < 1 and think about the palette again. ")
+
+
+def build_corpus():
+    """(name, raw_output, is_chinese) cases modelled on what real models send back"""
+    return [
+        ("clean_english", PROMPT * 3, False),
+        ("preamble", "Here's the enhanced prompt: " + PROMPT * 3, False),
+        ("markdown_final", "**Thoughts:** the user wants drama.\n**Final Prompt:** " + PROMPT * 3, False),
+        ("polaris_bleed", "Thoughts: lighting first.\nSummary: go cinematic.\nPrompt: " + PROMPT * 3, False),
+        ("short_think", "<think>\n" + REASONING * 5 + "\n</think>\n" + PROMPT * 3, False),
+        ("think_50kb_closed", "<think>\n" + REASONING * 300 + "\n</think>\n" + PROMPT * 3, False),
+        ("think_50kb_unclosed", "<think>\n" + REASONING * 300, False),
+        ("nested_think_50kb_unclosed", ("<think>" + REASONING) * 300, False),
+        ("chinese_prefix", "以下是增强后的提示词：" + CHINESE_PROMPT * 2, True),
+        ("chinese_think", "<think>" + REASONING * 10 + "</think>" + CHINESE_PROMPT * 2, True),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="calls per case (default: 20)")
+    args = parser.parse_args()
+
+    print(f"{'case':<28} {'size':>8} {'legacy us':>12} {'new us':>10} {'speedup':>8}")
+    for name, raw, is_chinese in build_corpus():
+        expected = legacy_clean_prompt_output(raw, is_chinese)
+        actual = clean_prompt_output(raw, is_chinese)
+        if actual != expected:
+            print(f"{name}: OUTPUT MISMATCH")
+            return 1
+        legacy = min(timeit.repeat(lambda: legacy_clean_prompt_output(raw, is_chinese),
+                                   number=args.repeat, repeat=3)) / args.repeat
+        new = min(timeit.repeat(lambda: clean_prompt_output(raw, is_chinese),
+                                number=args.repeat, repeat=3)) / args.repeat
+        print(f"{name:<28} {len(raw):>8} {legacy * 1e6:>12.1f} {new * 1e6:>10.1f} {legacy / new:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""End-to-end pipeline benchmark against the mock Ollama server.
+
+Starts benchmarks/mock_ollama.py in a subprocess (so its CPU time is not
+counted as ours), points the generators at it and pushes a batch through the
+same ordered worker engine the GUI uses. Reports throughput, client CPU per
+prompt, peak memory and latency percentiles per scenario, for the English
+and Chinese paths, so client-side regressions show up without a GPU.
+
+    python benchmarks/bench_pipeline.py                      # every scenario
+    python benchmarks/bench_pipeline.py -s english-enhance -n 500 --workers 16
+    python benchmarks/bench_pipeline.py --json results.json  # for comparing runs
+    python benchmarks/bench_pipeline.py -s english-short --speculative 3
+    python benchmarks/bench_pipeline.py -s saturated --workers 24 --adaptive
+
+Peak RSS is the process high-water mark so far, so it only ever grows
+across scenarios in one invocation - run a single scenario to measure it.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import prompt_generators  # noqa: E402
+from batch_engine import run_ordered  # noqa: E402
+from endpoint_pool import EndpointPool  # noqa: E402
+from speculative import SpeculativeGenerator  # noqa: E402
+from telemetry import percentile  # noqa: E402
+
+MODEL = "mock:latest"
+
+# Server delays are per token; ~300 tokens per English prompt
+SCENARIOS = {
+    "english-enhance": {"language": "english", "enhance": True,
+                        "server": ["--token-delay", "0.001", "--jitter", "0.0005"]},
+    "english-generate": {"language": "english", "enhance": False,
+                         "server": ["--token-delay", "0.001", "--jitter", "0.0005"]},
+    "english-short": {"language": "english", "enhance": True,
+                      "server": ["--token-delay", "0.001", "--length", "normal:160:40"]},
+    "english-flaky": {"language": "english", "enhance": True,
+                      "server": ["--token-delay", "0.001", "--failure-rate", "0.05"]},
+    "chinese-enhance": {"language": "chinese", "enhance": True,
+                        "server": ["--token-delay", "0.001", "--jitter", "0.0005"]},
+    "chinese-short": {"language": "chinese", "enhance": True,
+                      "server": ["--token-delay", "0.001", "--chinese-length", "normal:70:20"]},
+    "overhead": {"language": "english", "enhance": True,
+                 "server": ["--token-delay", "0", "--length", "fixed:260"]},
+    # Only 6 streams at full speed - more just queue, as on a real GPU
+    "saturated": {"language": "english", "enhance": True,
+                  "server": ["--token-delay", "0.002", "--length", "fixed:260", "--parallel", "6"]},
+}
+
+SAMPLE_PROMPTS = [
+    "A bioluminescent mushroom forest inhabited by miniature clockwork dragons",
+    "A steampunk laboratory with brass instruments",
+    "A cyberpunk street with neon advertisements",
+    "An abandoned lighthouse in a storm",
+    "一座被云海环绕的空中城堡",
+    "雨夜霓虹灯下的古老街巷",
+]
+
+
+def start_mock_server(server_args, seed):
+    """Run the mock in a subprocess and return (process, url)"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "mock_ollama.py"), "--port", "0",
+         "--models", MODEL, "--seed", str(seed)] + server_args,
+        stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("listening on "):
+        process.kill()
+        raise RuntimeError(f"Mock server failed to start: {line!r}")
+    return process, line.split()[-1]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_scenario(name, scenario, count, workers, seed, candidates=1, adaptive=False):
+    process, url = start_mock_server(scenario["server"], seed)
+    try:
+        prompt_generators.ollama = EndpointPool([url], pool_size=workers * candidates)
+        prompt_generators.result_cache.enabled = False
+        prompt_generators.stream_stats.reset()
+        prompt_generators.run_telemetry.reset()
+        prompt_generators.concurrency.configure(adaptive, workers * candidates)
+        generate = (prompt_generators.generate_chinese_prompt if scenario["language"] == "chinese"
+                    else prompt_generators.generate_single_prompt)
+        if candidates > 1:
+            generate = SpeculativeGenerator(scenario["language"], candidates)
+        prompts = [SAMPLE_PROMPTS[i % len(SAMPLE_PROMPTS)] + f" #{i}" for i in range(count)]
+
+        def worker(item):
+            i, prompt = item
+            report = {}
+            started = time.perf_counter()
+            text, result_count = generate(prompt, scenario["enhance"], MODEL, variant=i, report=report)
+            return text, result_count, report, time.perf_counter() - started
+
+        latencies, attempts, failed = [], 0, 0
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        for _, _, (text, result_count, report, latency) in run_ordered(enumerate(prompts), worker, workers):
+            latencies.append(latency)
+            attempts += report["attempts"]
+            failed += result_count == 0
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        prompt_generators.ollama.close()
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "language": scenario["language"],
+        "prompts": count,
+        "workers": workers,
+        "prompts_per_s": round(count / wall, 2),
+        "cpu_ms_per_prompt": round(1000 * cpu / count, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1) if resource is not None else None,
+        "latency_p50_ms": round(1000 * percentile(latencies, 0.50), 1),
+        "latency_p95_ms": round(1000 * percentile(latencies, 0.95), 1),
+        "latency_p99_ms": round(1000 * percentile(latencies, 0.99), 1),
+        "attempts_per_prompt": round(attempts / count, 2),
+        "failed": failed,
+        "early_stops": prompt_generators.stream_stats.summary(),
+        "speculative": generate.stats.summary() if candidates > 1 else None,
+        "concurrency": prompt_generators.concurrency.summary() or None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable, default: all)")
+    parser.add_argument("-n", "--count", type=int, default=200, help="prompts per scenario")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--speculative", type=int, default=1, metavar="K",
+                        help="start K candidates per prompt (default: 1, off)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="let the adaptive limiter pick the requests in flight, up to --workers")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'scenario':<18} {'prompts/s':>9} {'cpu ms/p':>9} {'rss MB':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'att/p':>6} {'failed':>6}")
+    for name in args.scenario or list(SCENARIOS):
+        result = run_scenario(name, SCENARIOS[name], args.count, args.workers, args.seed, args.speculative,
+                              args.adaptive)
+        results.append(result)
+        rss = f"{result['peak_rss_mb']:.1f}" if result["peak_rss_mb"] is not None else "n/a"
+        print(f"{name:<18} {result['prompts_per_s']:>9.1f} {result['cpu_ms_per_prompt']:>9.2f} {rss:>7} "
+              f"{result['latency_p50_ms']:>8.1f} {result['latency_p95_ms']:>8.1f} "
+              f"{result['latency_p99_ms']:>8.1f} {result['attempts_per_prompt']:>6.2f} {result['failed']:>6}")
+        for summary in (result["speculative"], result["concurrency"]):
+            if summary:
+                print(f"{'':<18} {summary}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
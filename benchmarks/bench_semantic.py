@@ -0,0 +1,98 @@
+"""Lookup latency and recall of the semantic cache's vector index.
+
+Fills a VectorIndex in a temporary directory with clustered random unit
+vectors (standing in for embeddings of similar prompts), then looks up
+perturbed copies of stored rows - near-duplicates at about the given
+similarity - and unrelated queries. Prints the time to build and reopen the
+memory-mapped index, lookup latency percentiles, and recall against an
+exhaustive search. Needs numpy.
+
+    python benchmarks/bench_semantic.py [--rows N] [--dimensions D] [--similarity S]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from semantic_cache import DEFAULT_THRESHOLD, EXACT_ROWS, VectorIndex, _normalise  # noqa: E402
+from telemetry import percentile  # noqa: E402
+
+SCOPE = "bench"
+
+
+def clustered(rng, rows, dimensions, clusters=1000):
+    """Unit vectors around `clusters` centres, like embeddings of prompts on a few themes"""
+    centres = _normalise(rng.standard_normal((clusters, dimensions)).astype(np.float32))
+    vectors = centres[rng.integers(0, clusters, rows)] + 0.6 * rng.standard_normal(
+        (rows, dimensions)).astype(np.float32) / np.sqrt(dimensions)
+    return _normalise(vectors).astype(np.float32)
+
+
+def near(rng, vectors, similarity):
+    """Copies of `vectors` turned away by about arccos(similarity)"""
+    noise = _normalise(rng.standard_normal(vectors.shape).astype(np.float32))
+    noise -= (noise * vectors).sum(axis=1, keepdims=True) * vectors
+    noise = _normalise(noise)
+    return (similarity * vectors + np.sqrt(1 - similarity ** 2) * noise).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000, help="index size (default: 100000)")
+    parser.add_argument("--dimensions", type=int, default=768, help="embedding size (default: 768)")
+    parser.add_argument("--similarity", type=float, default=0.97,
+                        help="similarity of the near-duplicate queries (default: 0.97)")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench")
+        index = VectorIndex(path)
+        started = time.perf_counter()
+        for start in range(0, args.rows, 100000):
+            count = min(100000, args.rows - start)
+            index.add(clustered(rng, count, args.dimensions), SCOPE,
+                      [f"key-{row}" for row in range(start, start + count)])
+        built = time.perf_counter() - started
+        index.close()
+
+        started = time.perf_counter()
+        index = VectorIndex(path)
+        reopened = time.perf_counter() - started
+        stored = np.asarray(index._vectors[:index.count])
+
+        picked = rng.integers(0, args.rows, args.queries)
+        cases = {"near-duplicate": near(rng, stored[picked], args.similarity),
+                 "unrelated": clustered(rng, args.queries, args.dimensions)}
+        search = "exhaustive" if args.rows <= EXACT_ROWS else "LSH"
+        print(f"{args.rows} rows x {args.dimensions} dims ({search} search): "
+              f"built in {built:.1f}s, reopened in {reopened:.2f}s")
+        print(f"{'queries':<16} {'p50 us':>8} {'p95 us':>8} {'p99 us':>8} {'hits':>6} {'recall':>7}")
+        for name, queries in cases.items():
+            latencies, found = [], []
+            for query in queries:
+                started = time.perf_counter()
+                match = index.search(query[None, :], SCOPE)[0]
+                latencies.append(time.perf_counter() - started)
+                found.append(match is not None and match[1] >= DEFAULT_THRESHOLD)
+            # What an exhaustive search finds above the threshold, a batch of rows at a time
+            best = np.full(len(queries), -1.0, dtype=np.float32)
+            for start in range(0, len(stored), 100000):
+                best = np.maximum(best, (stored[start:start + 100000] @ queries.T).max(axis=0))
+            expected = best >= DEFAULT_THRESHOLD
+            recall = (np.array(found) & expected).sum() / expected.sum() if expected.sum() else 1.0
+            latencies.sort()
+            print(f"{name:<16} {percentile(latencies, 0.5) * 1e6:>8.0f} {percentile(latencies, 0.95) * 1e6:>8.0f} "
+                  f"{percentile(latencies, 0.99) * 1e6:>8.0f} {sum(found):>6} {recall:>7.1%}")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Compare prompt-eval cost of pasted-in vs. "system"-field system prompts.
+
+Needs a running Ollama server. For each layout it sends the same set of
+enhancement requests and reads prompt_eval_count / prompt_eval_duration from
+the final stream chunk, so the saving from prefix reuse shows up directly.
+
+    python benchmarks/bench_system_prefix.py --model gemma3:27b -n 20 [--chinese]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generation_options import request_options  # noqa: E402
+from ollama_client import OllamaClient  # noqa: E402
+from prompt_generators import (  # noqa: E402
+    DEFAULT_MODEL, ENHANCEMENT_SYSTEM_PROMPT, CHINESE_ENHANCEMENT_SYSTEM_PROMPT, build_request
+)
+
+SAMPLE_PROMPTS = [
+    "A bioluminescent mushroom forest inhabited by miniature clockwork dragons",
+    "A steampunk laboratory with brass instruments",
+    "A cyberpunk street with neon advertisements",
+    "A magical forest with glowing mushrooms",
+    "An abandoned lighthouse in a storm",
+    "A desert caravan under two moons",
+]
+
+
+def final_chunk(client, request_json):
+    """Stream one request to completion and return its final (done) chunk"""
+    last = {}
+    with client.generate(request_json) as response:
+        for line in response.iter_lines():
+            if line:
+                last = json.loads(line.decode("utf-8"))
+    return last
+
+
+def run_layout(client, model, system_prompt, prefix, options, count, inline_system):
+    # One untimed request first so model load time doesn't skew either side
+    final_chunk(client, build_request(model, system_prompt, prefix + SAMPLE_PROMPTS[0],
+                                      options, inline_system=inline_system))
+    evals, durations = [], []
+    for i in range(count):
+        prompt = prefix + SAMPLE_PROMPTS[i % len(SAMPLE_PROMPTS)] + f" #{i}"
+        chunk = final_chunk(client, build_request(model, system_prompt, prompt, options,
+                                                  inline_system=inline_system))
+        evals.append(chunk.get("prompt_eval_count", 0))
+        durations.append(chunk.get("prompt_eval_duration", 0) / 1e6)
+    return evals, durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=None, help="Ollama URL (default: OLLAMA_HOST or localhost)")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("-n", "--count", type=int, default=10, help="requests per layout")
+    parser.add_argument("--chinese", action="store_true", help="use the Chinese system prompt")
+    parser.add_argument("--full", action="store_true",
+                        help="generate full outputs instead of stopping after one token")
+    args = parser.parse_args()
+
+    client = OllamaClient(args.host)
+    language = "chinese" if args.chinese else "english"
+    options, _ = request_options(language, "enhance")
+    if not args.full:
+        options["num_predict"] = 1  # only the prompt-eval phase matters here
+    system_prompt = CHINESE_ENHANCEMENT_SYSTEM_PROMPT if args.chinese else ENHANCEMENT_SYSTEM_PROMPT
+    prefix = "要增强的输入提示词: " if args.chinese else "Input prompt to enhance: "
+
+    print(f"{'layout':<10} {'eval tokens':>12} {'eval ms p50':>12} {'eval ms mean':>13}")
+    results = {}
+    for layout, inline in (("inline", True), ("system", False)):
+        evals, durations = run_layout(client, args.model, system_prompt, prefix, options, args.count, inline)
+        results[layout] = statistics.mean(durations)
+        print(f"{layout:<10} {statistics.mean(evals):>12.1f} {statistics.median(durations):>12.1f} "
+              f"{statistics.mean(durations):>13.1f}")
+    if results["inline"]:
+        saved = 100 * (1 - results["system"] / results["inline"])
+        print(f"prompt-eval time saved per request: {saved:.0f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+"""A fake Ollama server for benchmarking the client side without a GPU.
+
+Serves /api/tags, /api/ps and a streaming /api/generate that behaves like
+the real thing: NDJSON chunks, a final "done" chunk with timings and
+`context`, num_predict honoured, the connection dropped when the client
+hangs up. Output is either synthetic (English words or Chinese characters,
+matching the request's language) with a configurable length distribution,
+or replayed from recorded NDJSON streams. Requests with a JSON `format` get
+an {"items": [...]} object with as many items as the prompt asks for.
+Per-token delay, jitter, a failure rate (half HTTP 500s, half streams cut
+mid-way), a rate of streams only cut mid-way, a limit on streams decoded at full speed and a model load delay
+simulate a real server. A generate call without a prompt loads (or, with
+keep_alive 0, unloads) the model the way Ollama does. A request with a seed
+in its options gets the same output for the same prompt every time. /api/embed answers for
+the embedding models with hashed bag-of-words vectors, so the same text
+always gets the same embedding and texts sharing most words come out close.
+
+    python benchmarks/mock_ollama.py --port 11435 --token-delay 0.01 --length normal:300:60
+    python benchmarks/mock_ollama.py --replay recorded_streams/ --failure-rate 0.02
+
+It prints "listening on <url>" once ready. Import MockOllama to run it in
+process instead.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CJK = re.compile(r"[一-鿿]")
+WORD = re.compile(r"[一-鿿]|[^\W一-鿿]+")
+PACK_COUNT = re.compile(r"(\d+) (?:distinct variations|input prompts)|(\d+)个")
+
+MODEL_SIZE = 4 * 1024 ** 3  # Reported in /api/tags for every model, like a 7B q4 model
+EMBED_MODEL_SIZE = 274 * 1024 ** 2  # Like nomic-embed-text
+EMBED_DIMENSIONS = 768
+
+ENGLISH_WORDS = ("a lone dragon perched on obsidian cliffs above a glowing molten river "
+                 "cinematic volumetric light drifting embers intricate scales golden hour "
+                 "ultra detailed octane render shallow depth of field moody atmosphere").split()
+CHINESE_TEXT = ("一条孤独的巨龙栖息在黑曜石悬崖上俯瞰发光的熔岩河流电影级体积光飘散的余烬"
+                "精致的鳞片黄金时刻超高细节浅景深氛围感十足")
+
+
+def parse_length(spec):
+    """"fixed:N", "uniform:LO:HI" or "normal:MEAN:SD" -> a sampler of token counts"""
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(":") if value]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: int(values[0])
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.randint(int(values[0]), int(values[1]))
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(1, int(rng.gauss(values[0], values[1])))
+    raise ValueError(f"Bad length spec {spec!r}, expected fixed:N, uniform:LO:HI or normal:MEAN:SD")
+
+
+def load_recordings(path):
+    """Response pieces of every recorded NDJSON stream in a file or directory"""
+    paths = sorted(glob.glob(os.path.join(path, "*.ndjson")) + glob.glob(os.path.join(path, "*.jsonl"))
+                   if os.path.isdir(path) else [path])
+    recordings = []
+    for recording in paths:
+        with open(recording, "r", encoding="utf-8") as f:
+            pieces = [json.loads(line).get("response", "") for line in f if line.strip()]
+        recordings.append([piece for piece in pieces if piece])
+    return recordings
+
+
+def synthetic_pieces(rng, length, chinese):
+    """`length` tokens of plausible prompt text, ending in a full stop"""
+    if chinese:
+        pieces = [CHINESE_TEXT[(i * 2) % len(CHINESE_TEXT):(i * 2) % len(CHINESE_TEXT) + 2]
+                  for i in range(length)]
+        pieces[-1] = "。"
+        return pieces
+    pieces = [("" if i == 0 else " ") + rng.choice(ENGLISH_WORDS) for i in range(length)]
+    pieces[-1] = "."
+    return pieces
+
+
+def embedding(text):
+    """Unit vector of the text's hashed words (characters for Chinese), with hashed signs"""
+    vector = [0.0] * EMBED_DIMENSIONS
+    for word in WORD.findall(text.lower()):
+        h = zlib.crc32(word.encode("utf-8"))
+        vector[h % EMBED_DIMENSIONS] += 1.0 if h & (1 << 31) else -1.0
+    norm = sum(x * x for x in vector) ** 0.5 or 1.0
+    return [x / norm for x in vector]
+
+
+def packed_pieces(rng, sampler, chinese, count):
+    """A JSON answer with `count` items, streamed a few characters per token"""
+    items = [{"id": n, "prompt": "".join(synthetic_pieces(rng, sampler(rng), chinese))}
+             for n in range(1, count + 1)]
+    text = json.dumps({"items": items}, ensure_ascii=False)
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+class MockConfig:
+    def __init__(self, models=("mock:latest",), token_delay=0.0, jitter=0.0, failure_rate=0.0,
+                 length="normal:300:60", chinese_length="normal:170:40", replay=None, seed=None,
+                 parallel=0, load_delay=0.0, embed_models=("nomic-embed-text",), drop_rate=0.0):
+        self.models = list(models)
+        self.embed_models = list(embed_models)
+        self.load_delay = load_delay
+        self.loaded = set()
+        self.token_delay = token_delay
+        # Streams decoded at full speed at once; past that every stream slows
+        # down in proportion, like a saturated GPU (0 = unlimited)
+        self.parallel = parallel
+        self.active = 0
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate  # Streams cut mid-way, on top of failure_rate
+        self.length = parse_length(length)
+        self.chinese_length = parse_length(chinese_length)
+        self.recordings = load_recordings(replay) if replay else None
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.requests = 0
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None  # Set on the server-specific subclass
+
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client hung up early, as the stream guard does
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data):
+        body = (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(body), body))
+        self.wfile.flush()
+
+    def _load(self, request):
+        """Sleep through a model load if the model isn't loaded; returns its nanoseconds"""
+        config = self.config
+        with config.rng_lock:
+            if request["model"] in config.loaded or request.get("keep_alive") in (0, "0"):
+                return 0
+            config.loaded.add(request["model"])
+        time.sleep(config.load_delay)
+        return int(config.load_delay * 1e9)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/api/tags":
+            self._send_json(200, {"models": [{"name": name, "size": MODEL_SIZE} for name in self.config.models]
+                                  + [{"name": name, "size": EMBED_MODEL_SIZE} for name in self.config.embed_models]})
+        elif self.path.rstrip("/") == "/api/ps":
+            self._send_json(200, {"models": [{"name": name, "model": name} for name in self.config.models
+                                             if name in self.config.loaded]})
+        elif self.path.rstrip("/") == "/api/version":
+            self._send_json(200, {"version": "mock"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.rstrip("/") == "/api/embed":
+            self._embed(request)
+            return
+        if self.path.rstrip("/") != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        config = self.config
+        if request.get("model") not in config.models:
+            self._send_json(404, {"error": f"model '{request.get('model')}' not found"})
+            return
+
+        load_ns = self._load(request)
+        if not request.get("prompt"):
+            unload = request.get("keep_alive") in (0, "0")
+            if unload:
+                with config.rng_lock:
+                    config.loaded.discard(request["model"])
+            self._send_json(200, {"model": request["model"], "response": "", "done": True,
+                                  "done_reason": "unload" if unload else "load",
+                                  "load_duration": load_ns, "total_duration": load_ns})
+            return
+
+        text = request.get("system", "") + request.get("prompt", "")
+        # Answer in the language of the instructions, not of the input prompt
+        chinese = bool(CJK.search(request.get("system") or request.get("prompt", "")))
+        seed = request.get("options", {}).get("seed")
+        with config.rng_lock:
+            # Failures stay random; only the output follows the seed
+            rng = random.Random(f"{seed}:{text}") if seed is not None else config.rng
+            config.requests += 1
+            failure = config.rng.random() < config.failure_rate
+            drop_midway = ((failure and config.rng.random() < 0.5)
+                           or (config.drop_rate > 0 and config.rng.random() < config.drop_rate))
+            sampler = config.chinese_length if chinese else config.length
+            packed = PACK_COUNT.search(request.get("prompt", "")) if request.get("format") else None
+            if packed:
+                count = int(packed.group(1) or packed.group(2))
+                pieces = packed_pieces(rng, sampler, chinese, count)
+            elif config.recordings:
+                pieces = list(rng.choice(config.recordings))
+            else:
+                pieces = synthetic_pieces(rng, sampler(rng), chinese)
+            delays = [max(0.0, config.token_delay + rng.uniform(-config.jitter, config.jitter))
+                      for _ in pieces]
+        if failure and not drop_midway:
+            self._send_json(500, {"error": "mock failure"})
+            return
+
+        num_predict = request.get("options", {}).get("num_predict", -1)
+        if num_predict is not None and num_predict > 0:
+            pieces = pieces[:num_predict]
+        cut_at = len(pieces) // 2 if drop_midway else None
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        started = time.perf_counter_ns()
+        with config.rng_lock:
+            config.active += 1
+        try:
+            for i, (piece, delay) in enumerate(zip(pieces, delays)):
+                if i == cut_at:
+                    self.close_connection = True
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+                if delay:
+                    time.sleep(delay * max(1.0, config.active / config.parallel) if config.parallel else delay)
+                self._chunk({"model": request["model"], "response": piece, "done": False})
+            eval_ns = time.perf_counter_ns() - started
+            prompt_tokens = len(text) // 4 + len(request.get("context") or [])
+            self._chunk({
+                "model": request["model"], "response": "", "done": True,
+                "done_reason": "length" if len(pieces) == num_predict else "stop",
+                "context": list(range(prompt_tokens + len(pieces))),
+                "total_duration": eval_ns + 1000 * prompt_tokens + load_ns,
+                "load_duration": load_ns,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": 1000 * prompt_tokens,
+                "eval_count": len(pieces),
+                "eval_duration": eval_ns,
+            })
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client hung up early, as the stream guard does
+        finally:
+            with config.rng_lock:
+                config.active -= 1
+
+
+    def _embed(self, request):
+        if request.get("model") not in self.config.embed_models:
+            self._send_json(404, {"error": f"model '{request.get('model')}' not found"})
+            return
+        texts = request.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        self._send_json(200, {"model": request["model"], "embeddings": [embedding(text) for text in texts]})
+
+
+class MockOllama:
+    """In-process mock server; use as a context manager or start()/stop()"""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or MockConfig()
+        handler = type("BoundMockHandler", (MockHandler,), {"config": self.config})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def add_server_arguments(parser):
+    parser.add_argument("--models", default="mock:latest", help="comma separated model names")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds per streamed token")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random delay per token")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="fraction of requests that fail (HTTP 500 or a stream cut mid-way)")
+    parser.add_argument("--drop-rate", type=float, default=0.0,
+                        help="fraction of streams cut mid-way, on top of --failure-rate")
+    parser.add_argument("--length", default="normal:300:60", help="English output tokens distribution")
+    parser.add_argument("--chinese-length", default="normal:170:40", help="Chinese output tokens distribution")
+    parser.add_argument("--replay", default=None, help="recorded NDJSON stream file or directory to replay")
+    parser.add_argument("--load-delay", type=float, default=0.0,
+                        help="seconds to load a model that isn't loaded yet")
+    parser.add_argument("--parallel", type=int, default=0,
+                        help="streams decoded at full speed at once; more slow every stream down (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--embed-models", default="nomic-embed-text",
+                        help="comma separated embedding model names for /api/embed")
+
+
+def config_from_args(args):
+    return MockConfig(models=args.models.split(","), token_delay=args.token_delay, jitter=args.jitter,
+                      failure_rate=args.failure_rate, length=args.length,
+                      chinese_length=args.chinese_length, replay=args.replay, seed=args.seed,
+                      parallel=args.parallel, load_delay=args.load_delay,
+                      embed_models=[name for name in args.embed_models.split(",") if name],
+                      drop_rate=args.drop_rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435, help="0 picks a free port")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockOllama(config_from_args(args), args.host, args.port)
+    print(f"listening on {server.url}", flush=True)
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""Adaptive limit on generation requests in flight.
+
+A fixed worker count either leaves the GPU idle or queues requests on the
+server until they time out, and with a big model loaded too many requests
+can push it out of VRAM. AdaptiveLimiter finds the level for whatever
+server a run lands on, AIMD style, judging it once per window of finished
+requests:
+
+- slow start: from INITIAL_LIMIT, the limit doubles while decode
+  throughput keeps rising
+- then one more slot at a time while it still rises; if the last step
+  did not help it is taken back and the limit holds, trying one more slot
+  again every PROBE_AFTER windows
+- it is cut to DECREASE_FACTOR of itself on errors, when seconds per token
+  grow past LATENCY_BACKOFF times the best seen (requests are queueing), or
+  when the model was reloaded or dropped out of /api/ps (evicted)
+
+The batch engine still starts "Parallel requests" workers; the limiter only
+lets up to `limit` of them talk to Ollama at once, so that setting becomes
+the ceiling.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from telemetry import LOAD_STALL_SECONDS, NS
+
+WINDOW_SECONDS = 1.0      # Shortest judging window
+INCREASE_GAIN = 1.05      # Throughput must beat the last window by 5% to count as rising
+LATENCY_BACKOFF = 2.0     # Seconds per token, against the best window seen
+DECREASE_FACTOR = 0.7
+PROBE_AFTER = 5           # Flat windows before trying one more slot again
+PS_INTERVAL = 5.0         # Seconds between /api/ps checks
+
+# Where slow start begins - Ollama's own default of parallel requests per model
+INITIAL_LIMIT = 4
+
+
+class AdaptiveLimiter:
+    """AIMD limit on concurrent generation requests; a no-op until enabled"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._watch_stop = None
+        self.enabled = False
+        self.in_flight = 0
+        self.generation = 0
+        self.configure(False, 1)
+
+    def configure(self, enabled, max_limit, min_limit=1):
+        """Start a run: enable or disable, and reset to slow start below max_limit.
+
+        in_flight is left alone - streams a stopped run abandoned still hold
+        their slots until they hang up, they just no longer count as its results.
+        """
+        with self._cond:
+            self.generation += 1
+            self.enabled = enabled
+            self.max_limit = max(min_limit, max_limit)
+            self.min_limit = min_limit
+            self.limit = min(self.max_limit, max(min_limit, INITIAL_LIMIT))
+            self.slow_start = True
+            self.last_step = 0
+            self.flat_windows = 0
+            self.best_per_token = None
+            self.last_throughput = 0.0
+            self.throughput = 0.0
+            self.peak = self.limit
+            self.increases = 0
+            self.decreases = 0
+            self.windows = 0
+            self.evicted = False
+            self._new_window(time.monotonic())
+            self._cond.notify_all()
+
+    def _new_window(self, now):
+        self.window_start = now
+        self.window_requests = 0
+        self.window_tokens = 0
+        self.window_seconds = 0.0  # Summed request time, for seconds per token
+        self.window_errors = 0
+        self.window_reloads = 0
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the `limit` request slots; call .finished() on what it yields"""
+        if not self.enabled:
+            yield _Request()
+            return
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+            request = _Request(self.generation)
+        try:
+            yield request
+        except BaseException:
+            request.failed = True
+            raise
+        finally:
+            self._release(request)
+
+    def _release(self, request):
+        now = time.monotonic()
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+            if request.generation != self.generation:
+                return  # Left over from an earlier run
+            self.window_requests += 1
+            self.window_tokens += request.tokens
+            self.window_seconds += now - request.started
+            self.window_errors += request.failed
+            self.window_reloads += request.reloaded
+            if (self.window_errors or self.evicted
+                    or (now - self.window_start >= WINDOW_SECONDS and self.window_requests >= self.limit)):
+                self._judge(now)
+
+    def _judge(self, now):
+        throughput = self.window_tokens / max(now - self.window_start, 1e-6)
+        per_token = self.window_seconds / self.window_tokens if self.window_tokens else None
+        # The first window's model load is expected, not a sign of eviction
+        reloaded = self.window_reloads and self.windows
+        queueing = (per_token is not None and self.best_per_token is not None
+                    and per_token > self.best_per_token * LATENCY_BACKOFF)
+        if per_token is not None and not self.window_errors:
+            self.best_per_token = min(per_token, self.best_per_token or per_token)
+
+        if self.window_errors or self.evicted or reloaded or queueing:
+            step = max(self.min_limit, int(self.limit * DECREASE_FACTOR)) - self.limit
+            self.slow_start = False
+            self.evicted = False
+        elif throughput > self.last_throughput * INCREASE_GAIN:
+            step = self.limit if self.slow_start else 1
+            self.flat_windows = 0
+        else:
+            # More slots stopped paying off - take the last step back and hold
+            step = -self.last_step if self.last_step > 0 else 0
+            self.slow_start = False
+            self.flat_windows += 1
+            if self.flat_windows >= PROBE_AFTER:
+                step, self.flat_windows = 1, 0
+
+        new_limit = min(self.max_limit, max(self.min_limit, self.limit + step))
+        self.last_step = new_limit - self.limit
+        self.increases += self.last_step > 0
+        self.decreases += self.last_step < 0
+        self.limit = new_limit
+        self.peak = max(self.peak, new_limit)
+        self.last_throughput = throughput
+        self.throughput = throughput
+        self.windows += 1
+        self._new_window(now)
+
+    def watch(self, client, model):
+        """Poll /api/ps in the background and back off if `model` is evicted"""
+        self.stop_watching()
+        if not self.enabled:
+            return
+        self._watch_stop = threading.Event()
+        threading.Thread(target=self._watch, args=(client, model, self._watch_stop),
+                         name="dragon-ps-watch", daemon=True).start()
+
+    def stop_watching(self):
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+
+    def _watch(self, client, model, stop):
+        seen = False
+        while not stop.wait(PS_INTERVAL):
+            try:
+                loaded = client.running_models()
+            except Exception:
+                return  # Older servers have no /api/ps - rely on load times alone
+            if model in loaded:
+                seen = True
+            elif seen:
+                seen = False
+                with self._cond:
+                    self.evicted = True
+
+    def summary(self):
+        with self._cond:
+            if not self.enabled:
+                return ""
+            return (f"Concurrency: limit {self.limit} (peak {self.peak}, {self.increases} up, "
+                    f"{self.decreases} down), {self.throughput:.0f} tok/s")
+
+
+class _Request:
+    """One request's outcome, reported back to the limiter"""
+
+    def __init__(self, generation=0):
+        self.generation = generation
+        self.started = time.monotonic()
+        self.tokens = 0
+        self.failed = False
+        self.reloaded = False
+
+    def finished(self, final_chunk, chunks):
+        """Record the final stream chunk ({} if cut short) and chunks seen"""
+        self.tokens = final_chunk.get("eval_count", chunks)
+        self.reloaded = final_chunk.get("load_duration", 0) > LOAD_STALL_SECONDS * NS
@@ -0,0 +1,291 @@
+"""Spread one batch across several Ollama servers.
+
+EndpointPool has the same generate/list_models interface as OllamaClient,
+with one pooled client per server behind it. Each request goes to the
+server with the fewest requests in flight (or, with latency routing, the
+lowest in-flight count weighted by its recent response time), and only to
+servers known to have the requested model.
+
+A server that refuses connections, times out or fails mid-stream is marked
+down and skipped; it is probed again with real traffic after RECHECK_AFTER
+seconds. A request that fails to start moves straight on to the next server.
+One that dies mid-stream raises EndpointFailover if another server with the
+model is up, and the generators restart that attempt elsewhere, up to
+MAX_FAILOVERS times per prompt.
+
+Servers come from OLLAMA_HOSTS (comma separated), falling back to
+OLLAMA_HOST / localhost. DRAGON_ROUTING picks "least_outstanding" (default)
+or "latency"; DRAGON_MODEL_MERGE picks whether the model list is the
+"union" (default) or "intersection" of what the servers have.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from ollama_client import OllamaClient, DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT, TAGS_TIMEOUT, resolve_base_url
+
+ROUTING = ("least_outstanding", "latency")
+MODEL_MERGE = ("union", "intersection")
+
+# Seconds a failed server is left alone before traffic is tried on it again
+RECHECK_AFTER = 10.0
+
+# Weight of the newest sample in the response time moving average
+LATENCY_SMOOTHING = 0.3
+
+
+class EndpointFailover(requests.ConnectionError):
+    """A stream died with its server, and another server can take the request"""
+
+
+def resolve_base_urls(base_urls=None):
+    """Server URLs: explicit list, then OLLAMA_HOSTS, then the single-server default"""
+    if not base_urls:
+        hosts = os.environ.get("OLLAMA_HOSTS", "")
+        base_urls = [host.strip() for host in hosts.split(",") if host.strip()]
+    if not base_urls:
+        return [resolve_base_url()]
+    return list(dict.fromkeys(resolve_base_url(url) for url in base_urls))
+
+
+class Endpoint:
+    """One server and its routing state"""
+
+    def __init__(self, client):
+        self.client = client
+        self.outstanding = 0
+        self.latency = None  # Moving average of seconds to first response byte
+        self.down_since = None
+        self.served = 0
+        self.failures = 0
+        self.models = None  # Set of model names once listed
+
+    @property
+    def url(self):
+        return self.client.base_url
+
+    def available(self, now):
+        return self.down_since is None or now - self.down_since >= RECHECK_AFTER
+
+    def has_model(self, model):
+        return self.models is None or not model or model in self.models
+
+
+class TrackedResponse:
+    """Streaming response that hands its server back to the pool on close"""
+
+    def __init__(self, response, pool, endpoint, latency, model=None):
+        self._response = response
+        self._model = model
+        self._pool = pool
+        self.endpoint = endpoint
+        self._latency = latency
+        self._failed = False
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def iter_lines(self, *args, **kwargs):
+        try:
+            yield from self._response.iter_lines(*args, **kwargs)
+        except requests.RequestException as e:
+            self._failed = True
+            if self._pool.has_alternative(self.endpoint, self._model):
+                raise EndpointFailover(f"{self.endpoint.url} failed mid-stream: {e}") from e
+            raise
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._response.close()
+            self._pool._release(self.endpoint, failed=self._failed,
+                                latency=None if self._failed else self._latency)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EndpointPool:
+    """Least-outstanding-requests router over several Ollama servers"""
+
+    def __init__(self, base_urls=None, routing=None, model_merge=None,
+                 pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.endpoints = [Endpoint(OllamaClient(url, pool_size, timeout))
+                          for url in resolve_base_urls(base_urls)]
+        self.routing = routing or os.environ.get("DRAGON_ROUTING", ROUTING[0])
+        self.model_merge = model_merge or os.environ.get("DRAGON_MODEL_MERGE", MODEL_MERGE[0])
+        if self.routing not in ROUTING:
+            raise ValueError(f"Unknown routing {self.routing!r}, expected one of {ROUTING}")
+        if self.model_merge not in MODEL_MERGE:
+            raise ValueError(f"Unknown model merge {self.model_merge!r}, expected one of {MODEL_MERGE}")
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return self.endpoints[0].url
+
+    def ensure_pool_size(self, pool_size):
+        # Any one server may end up holding every worker's connection
+        for endpoint in self.endpoints:
+            endpoint.client.ensure_pool_size(pool_size)
+
+    def _cost(self, endpoint):
+        if self.routing == "latency":
+            # Unmeasured servers cost nothing, so they get measured first
+            return ((endpoint.outstanding + 1) * (endpoint.latency or 0.0), endpoint.served)
+        return (endpoint.outstanding, endpoint.latency or 0.0, endpoint.served)
+
+    def _acquire(self, model, exclude):
+        """Reserve the cheapest usable server, or None if every one has been tried"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude and e.has_model(model)]
+            healthy = [e for e in candidates if e.available(now)]
+            # With everything down, keep trying rather than fail outright -
+            # the same as a single server that is briefly unreachable
+            endpoint = min(healthy or candidates, key=self._cost, default=None)
+            if endpoint is not None:
+                endpoint.outstanding += 1
+            return endpoint
+
+    def _release(self, endpoint, failed=False, latency=None):
+        with self._lock:
+            endpoint.outstanding -= 1
+            if failed:
+                endpoint.down_since = time.monotonic()
+                endpoint.failures += 1
+                return
+            endpoint.down_since = None
+            endpoint.served += 1
+            if latency is not None:
+                endpoint.latency = (latency if endpoint.latency is None else
+                                    LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * endpoint.latency)
+
+    def has_alternative(self, endpoint, model=None):
+        """Whether another server that is up could take a request for `model`"""
+        now = time.monotonic()
+        with self._lock:
+            return any(e is not endpoint and e.available(now) and e.has_model(model) for e in self.endpoints)
+
+    def generate(self, request_json, timeout=None):
+        """POST to /api/generate on the best server, failing over until one answers"""
+        tried = []
+        last_error = None
+        model = request_json.get("model")
+        while True:
+            endpoint = self._acquire(model, tried)
+            if endpoint is None:
+                if last_error is None:
+                    raise requests.ConnectionError(f"No Ollama server has the model {model!r}")
+                raise last_error
+            tried.append(endpoint)
+            started = time.monotonic()
+            try:
+                response = endpoint.client.generate(request_json, timeout)
+            except requests.HTTPError as e:
+                # 5xx means the server is in trouble; a 404 just means it lacks the model
+                e.response.close()
+                self._release(endpoint, failed=e.response.status_code >= 500)
+                last_error = e
+                continue
+            except requests.RequestException as e:
+                self._release(endpoint, failed=True)
+                last_error = e
+                continue
+            return TrackedResponse(response, self, endpoint, time.monotonic() - started, model)
+
+    def embed(self, model, texts, timeout=None):
+        """Embed on the best server with the embedding model, failing over like generate"""
+        tried = []
+        last_error = None
+        while True:
+            endpoint = self._acquire(model, tried)
+            if endpoint is None:
+                if last_error is None:
+                    raise requests.ConnectionError(f"No Ollama server has the model {model!r}")
+                raise last_error
+            tried.append(endpoint)
+            try:
+                embeddings = endpoint.client.embed(model, texts, timeout)
+            except requests.HTTPError as e:
+                e.response.close()
+                self._release(endpoint, failed=e.response.status_code >= 500)
+                last_error = e
+                continue
+            except requests.RequestException as e:
+                self._release(endpoint, failed=True)
+                last_error = e
+                continue
+            # Not timed - an embedding says nothing about how fast the server generates
+            self._release(endpoint)
+            return embeddings
+
+    def _list_one(self, endpoint, timeout):
+        try:
+            models = endpoint.client.list_models(timeout)
+        except requests.RequestException as e:
+            with self._lock:
+                endpoint.down_since = time.monotonic()
+                endpoint.failures += 1
+            return e
+        with self._lock:
+            endpoint.models = set(models)
+            endpoint.down_since = None
+        return models
+
+    def list_models(self, timeout=TAGS_TIMEOUT):
+        """Models across all reachable servers - union or intersection, see model_merge"""
+        with ThreadPoolExecutor(max_workers=len(self.endpoints)) as executor:
+            listings = list(executor.map(lambda e: self._list_one(e, timeout), self.endpoints))
+        answered = [models for models in listings if not isinstance(models, Exception)]
+        if not answered:
+            raise listings[0]
+        if self.model_merge == "intersection":
+            common = set(answered[0]).intersection(*answered[1:])
+            return [name for name in answered[0] if name in common]
+        return list(dict.fromkeys(name for models in answered for name in models))
+
+    def model_sizes(self, timeout=TAGS_TIMEOUT):
+        """Model sizes from every reachable server, the largest if they differ; raises if none answer"""
+        sizes, errors = {}, []
+        for endpoint in self.endpoints:
+            try:
+                for name, size in endpoint.client.model_sizes(timeout).items():
+                    sizes[name] = max(size, sizes.get(name, 0))
+            except requests.RequestException as e:
+                errors.append(e)
+        if len(errors) == len(self.endpoints):
+            raise errors[0]
+        return sizes
+
+    def running_models(self, timeout=TAGS_TIMEOUT):
+        """Models loaded on any reachable server (/api/ps); raises if none of them answer"""
+        loaded, errors = [], []
+        for endpoint in self.endpoints:
+            try:
+                loaded.extend(endpoint.client.running_models(timeout))
+            except requests.RequestException as e:
+                errors.append(e)
+        if len(errors) == len(self.endpoints):
+            raise errors[0]
+        return list(dict.fromkeys(loaded))
+
+    def summary(self):
+        with self._lock:
+            if len(self.endpoints) == 1:
+                return ""
+            return "Servers: " + ", ".join(
+                f"{e.url} {e.served} done" + (f", {e.failures} failed" if e.failures else "")
+                + (" (down)" if e.down_since is not None else "")
+                for e in self.endpoints)
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.client.close()
@@ -0,0 +1,124 @@
+"""Ollama sampling options per language and mode.
+
+/api/generate only reads sampling settings from the nested "options" object
+(top-level "temperature" or "max_tokens" are silently ignored), and the
+output limit is called num_predict. The limit here is derived from the same
+word/character budget the generators validate against, so the server stops
+decoding at the budget instead of producing text that gets cut off anyway.
+
+Any value can be overridden per language and mode from dragon_options.json:
+
+    {"english/enhance": {"temperature": 0.6, "num_ctx": 8192},
+     "chinese/generate": {"seed": 42, "keep_alive": "1h"}}
+"""
+import json
+import os
+
+OPTIONS_FILE = "dragon_options.json"
+
+# Rough tokens per unit of budget: ~1.35 tokens per English word, ~1.2 per
+# CJK character. HEADROOM leaves room for a closing sentence (and the odd
+# preamble the cleaner strips) before the server cuts the model off.
+TOKENS_PER_WORD = 1.35
+TOKENS_PER_CHAR = 1.2
+HEADROOM = 1.25
+
+# None means "leave it to the server". num_ctx in particular is best left
+# alone unless needed: a value different from the loaded model's forces
+# Ollama to reload it.
+PROFILES = {
+    ("english", "enhance"): {
+        "max_words": 300,
+        "temperature": 0.7,
+        "top_p": 0.85,
+        "seed": None,
+        "num_ctx": None,
+        "keep_alive": "30m",
+    },
+    ("english", "generate"): {
+        "max_words": 300,
+        "temperature": 0.7,
+        "top_p": 0.85,
+        "seed": None,
+        "num_ctx": None,
+        "keep_alive": "30m",
+    },
+    ("chinese", "enhance"): {
+        "max_chars": 200,
+        "temperature": 0.7,
+        "top_p": 0.85,
+        "seed": None,
+        "num_ctx": None,
+        "keep_alive": "30m",
+    },
+    ("chinese", "generate"): {
+        "max_chars": 200,
+        "temperature": 0.7,
+        "top_p": 0.85,
+        "seed": None,
+        "num_ctx": None,
+        "keep_alive": "30m",
+    },
+}
+
+# Keys that describe our own budget rather than Ollama options
+_BUDGET_KEYS = ("max_words", "max_chars", "keep_alive")
+
+_overrides = None
+_pinned_keep_alive = None  # Set for the length of a run by model_warmup.ModelPin
+
+
+def load_overrides(path=OPTIONS_FILE):
+    """Read per-profile overrides from disk once; a missing file means none"""
+    global _overrides
+    if _overrides is None:
+        _overrides = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    _overrides = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error reading {path}: {e}")
+    return _overrides
+
+
+def pin_keep_alive(keep_alive):
+    """Send this keep_alive on every request until called again with None"""
+    global _pinned_keep_alive
+    _pinned_keep_alive = keep_alive
+
+
+def get_profile(language, mode):
+    profile = dict(PROFILES[(language, mode)])
+    profile.update(load_overrides().get(f"{language}/{mode}", {}))
+    return profile
+
+
+def budget_tokens(words=None, chars=None):
+    """Token limit that covers a number of English words or Chinese characters"""
+    if words is not None:
+        return int(words * TOKENS_PER_WORD * HEADROOM)
+    return int(chars * TOKENS_PER_CHAR * HEADROOM)
+
+
+def num_predict_for(profile):
+    """Token limit covering the profile's word or character budget"""
+    return budget_tokens(profile.get("max_words"), profile.get("max_chars"))
+
+
+def request_options(language, mode, variant=None):
+    """Build the ("options", keep_alive) pair for one /api/generate request.
+
+    If the profile pins a seed, each variation of a generate-mode run gets
+    seed + variant so the set is reproducible without being all the same.
+    Enhance mode ignores `variant`: there it is only the input's position,
+    and a result must not depend on where its line sits in the file.
+    """
+    profile = get_profile(language, mode)
+    options = {key: value for key, value in profile.items()
+               if key not in _BUDGET_KEYS and value is not None}
+    options["num_predict"] = num_predict_for(profile)
+    if "seed" in options and variant is not None and mode == "generate":
+        options["seed"] += variant
+    keep_alive = _pinned_keep_alive if _pinned_keep_alive is not None else profile.get("keep_alive")
+    return options, keep_alive
@@ -0,0 +1,107 @@
+"""Crash-safe journal of finished prompts, so long runs can be resumed.
+
+Each run appends one JSON line per completed prompt to a journal file named
+after the run's identity (language, mode, model and the exact input list).
+Writes are flushed to the OS straight away and fsync'd in batches, so a crash,
+an Ollama restart or a closed window loses at most the last few prompts.
+Starting the same run again with resume=True replays the journal and only
+the prompts missing from it are sent to Ollama.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+JOURNAL_DIR = "journals"
+
+# fsync after this many records or this many seconds, whichever comes first
+FSYNC_EVERY = 25
+FSYNC_INTERVAL = 2.0
+
+
+def run_key(language, mode, model, input_prompts):
+    """Stable identity of a run - same inputs and settings, same journal"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([language, mode, model], ensure_ascii=False).encode("utf-8"))
+    for prompt in input_prompts:
+        digest.update(prompt.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()[:16]
+
+
+def journal_path(language, mode, key, directory=JOURNAL_DIR):
+    return os.path.join(directory, f"{language}-{mode}-{key}.jsonl")
+
+
+def load_journal(path):
+    """Return ({index: record}, finished) from a journal; missing file means nothing done.
+
+    A torn last line from a crash mid-write is skipped.
+    """
+    done = {}
+    finished = False
+    if not os.path.exists(path):
+        return done, finished
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("type") == "result":
+                done[record["index"]] = record
+            elif record.get("type") == "done":
+                finished = True
+    return done, finished
+
+
+def _ends_mid_line(path):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+class Journal:
+    """Append-only, fsync-batched writer for one run"""
+
+    def __init__(self, path, header, resume=False):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        torn = resume and _ends_mid_line(path)
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+        if torn:
+            self._file.write("\n")  # Fence off a half-written line from a crash
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._write(dict(header, type="resume" if resume else "run", started=time.time()))
+        self._sync()
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def record(self, index, prompt, output, count, **extra):
+        """Append one finished prompt"""
+        with self._lock:
+            self._write(dict(extra, type="result", index=index, prompt=prompt, output=output, count=count))
+            if self._unsynced >= FSYNC_EVERY or time.monotonic() - self._last_sync >= FSYNC_INTERVAL:
+                self._sync()
+
+    def close(self, finished=False):
+        with self._lock:
+            if self._file.closed:
+                return
+            if finished:
+                self._write({"type": "done", "finished": time.time()})
+            self._sync()
+            self._file.close()
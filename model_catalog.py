@@ -0,0 +1,82 @@
+"""Model list cached on disk, refreshed in the background.
+
+The window opens with the models seen last time, read from MODELS_FILE
+without touching the network; the live list is fetched on a background
+thread (when the cached one is older than MODELS_TTL, or on demand) and
+handed back through a callback, so a slow or missing Ollama never holds up
+startup.
+"""
+import json
+import os
+import threading
+import time
+
+MODELS_FILE = "dragon_models.json"
+MODELS_TTL = 6 * 60 * 60  # Seconds before the cached list is refreshed at startup
+
+# Short connect timeout - an unreachable server should fail fast
+REFRESH_TIMEOUT = (2, 10)
+
+
+class ModelCatalog:
+    """Last known model names plus a background refresh from the server"""
+
+    def __init__(self, client, path=MODELS_FILE, ttl=MODELS_TTL):
+        self.client = client
+        self.path = path
+        self.ttl = ttl
+        self.models = []
+        self.fetched_at = 0.0
+        self._refreshing = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.models = list(data.get("models", []))
+            self.fetched_at = float(data.get("fetched_at", 0.0))
+        except (OSError, ValueError) as e:
+            print(f"Error reading {self.path}: {e}")
+
+    def _save(self):
+        # Write-then-rename so a crash never leaves a half-written cache
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"models": self.models, "fetched_at": self.fetched_at}, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error writing {self.path}: {e}")
+
+    def is_stale(self):
+        return not self.models or time.time() - self.fetched_at > self.ttl
+
+    def refresh(self, callback):
+        """Fetch the live list on a background thread; returns False if one is already running.
+
+        callback(models, error) is called from that thread - models is None
+        when the fetch failed. The cached list is kept in that case.
+        """
+        if not self._refreshing.acquire(blocking=False):
+            return False
+
+        def fetch():
+            try:
+                try:
+                    models = self.client.list_models(timeout=REFRESH_TIMEOUT)
+                except Exception as e:
+                    callback(None, e)
+                    return
+                if models:
+                    self.models = models
+                    self.fetched_at = time.time()
+                    self._save()
+                callback(models, None)
+            finally:
+                self._refreshing.release()
+
+        threading.Thread(target=fetch, name="dragon-models", daemon=True).start()
+        return True
@@ -0,0 +1,107 @@
+"""Run one prompt set through several models, loading each model once.
+
+plan_groups splits the models into groups that run one after another. The
+prompts of one group go through all of its models together, so a model is
+loaded when its group starts and released when it ends, never reloaded
+mid-run. Models only share a group (and VRAM) when their sizes from
+/api/tags, plus VRAM_OVERHEAD for the KV cache and buffers, fit in the
+configured VRAM together; without a budget each model runs on its own. A
+model the server already has loaded goes first.
+
+FanoutStats keeps per-model throughput, and write_comparison lines every
+input up against each model's output in one wide table.
+"""
+import csv
+import os
+import threading
+import time
+
+from result_export import BUFFER_BYTES, EXPORT_DIR
+
+VRAM_OVERHEAD = 1.2  # Weights size -> VRAM needed with the KV cache and buffers
+GB = 1024 ** 3
+
+
+def plan_groups(models, sizes=None, vram_bytes=0, loaded=()):
+    """Split `models` into groups to run one after another, see the module docstring"""
+    models = list(dict.fromkeys(models))
+    sizes = sizes or {}
+    groups = []
+    if vram_bytes:
+        # First fit, biggest model first; unknown sizes get a group of their own
+        room = []
+        for model in sorted(models, key=lambda m: sizes.get(m, 0), reverse=True):
+            need = sizes.get(model, 0) * VRAM_OVERHEAD
+            for n, group in enumerate(groups):
+                if need and room[n] >= need:
+                    group.append(model)
+                    room[n] -= need
+                    break
+            else:
+                groups.append([model])
+                room.append(vram_bytes - need if need else 0)
+        for group in groups:
+            group.sort(key=models.index)
+    else:
+        groups = [[model] for model in models]
+    # Already loaded first, then in the order the models were picked
+    groups.sort(key=lambda group: (not any(m in loaded for m in group), min(map(models.index, group))))
+    return groups
+
+
+class FanoutStats:
+    """Prompts, tokens and time per model"""
+
+    def __init__(self, models):
+        self._lock = threading.Lock()
+        self.models = list(models)
+        self.prompts = dict.fromkeys(self.models, 0)
+        self.tokens = dict.fromkeys(self.models, 0)
+        self.seconds = dict.fromkeys(self.models, 0.0)  # Wall time of the model's group
+        self._started = {}
+
+    def start_group(self, group):
+        with self._lock:
+            for model in group:
+                self._started[model] = time.monotonic()
+
+    def end_group(self, group):
+        with self._lock:
+            for model in group:
+                self.seconds[model] += time.monotonic() - self._started.pop(model, time.monotonic())
+
+    def record(self, model, tokens):
+        with self._lock:
+            self.prompts[model] += 1
+            self.tokens[model] += tokens
+
+    def lines(self):
+        with self._lock:
+            return [f"{model}: {self.prompts[model]} prompts, "
+                    f"{self.prompts[model] / self.seconds[model] if self.seconds[model] else 0.0:.2f}/s, "
+                    f"{self.tokens[model] / self.seconds[model] if self.seconds[model] else 0.0:.0f} tok/s"
+                    for model in self.models]
+
+
+def comparison_path(language, mode, stamp, directory=EXPORT_DIR):
+    return os.path.join(directory, f"{language}-{mode}-compare-{stamp}.csv")
+
+
+def write_comparison(path, prompts, models, cell):
+    """One CSV row per input: the prompt, then each model's output and count.
+
+    `cell(index, model)` returns (output, count), or None if that model did
+    not get to the prompt.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # utf-8-sig so spreadsheet apps pick up the Chinese text correctly
+    with open(path, "w", encoding="utf-8-sig", newline="", buffering=BUFFER_BYTES) as f:
+        writer = csv.writer(f)
+        writer.writerow(["index", "prompt"] + [f"{column} ({model})" for model in models
+                                               for column in ("output", "count")])
+        for index, prompt in enumerate(prompts):
+            row = [index, prompt]
+            for model in models:
+                result = cell(index, model)
+                row.extend(result if result is not None else ("", ""))
+            writer.writerow(row)
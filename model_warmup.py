@@ -0,0 +1,101 @@
+"""Load the model before a batch, keep it loaded during it, let it go after.
+
+Without this the first prompt of every batch waits for the model to load,
+and a pause longer than keep_alive (or a switch to another model) unloads
+it mid-run. ModelPin sends Ollama's "load only" request - a generate call
+with no prompt - to every server that has the model, then pins it with a
+long keep_alive on every request of the run; each request starts that clock
+again. When the run ends the model is either unloaded (keep_alive 0) or
+handed back to its profile's keep_alive. If the app is killed before that,
+the pin still runs out on its own instead of holding the VRAM for good.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from generation_options import get_profile, pin_keep_alive, request_options
+
+PINNED = "30m"  # Longer than any pause in a run, but not forever
+UNLOAD = 0
+
+# Loading a big model from disk can take minutes
+LOAD_TIMEOUT = (5, 600)
+# Releasing while the window closes should not hold it open for long
+CLOSE_TIMEOUT = (2, 10)
+
+
+def _clients(client, model):
+    """The clients of every server with the model behind an EndpointPool, or the client itself"""
+    endpoints = getattr(client, "endpoints", None)
+    if not endpoints:
+        return [client]
+    return [endpoint.client for endpoint in endpoints if endpoint.has_model(model)]
+
+
+class ModelPin:
+    """Warm-up, pinning and release of one model for one run"""
+
+    def __init__(self, client, model, language, mode, unload_after=False):
+        self.client = client
+        self.model = model
+        self.unload_after = unload_after
+        # Same options as the run, so a num_ctx override doesn't force a reload later
+        self.options = request_options(language, mode)[0]
+        self.options.pop("num_predict", None)
+        self.keep_alive = get_profile(language, mode).get("keep_alive")
+        self.load_seconds = 0.0
+        self.errors = []
+        self._released = False
+        self._lock = threading.Lock()
+
+    def _send(self, client, keep_alive, timeout):
+        request_json = {"model": self.model, "keep_alive": keep_alive, "stream": False}
+        if keep_alive != UNLOAD:
+            request_json["options"] = self.options
+        with client.generate(request_json, timeout) as response:
+            return response.json()
+
+    def _load_one(self, client):
+        try:
+            return self._send(client, PINNED, LOAD_TIMEOUT).get("load_duration", 0) / 1e9
+        except (requests.RequestException, ValueError) as e:
+            self.errors.append(f"{client.base_url}: {e}")
+            return 0.0
+
+    def load(self):
+        """Load and pin the model everywhere; returns the seconds it took"""
+        clients = _clients(self.client, self.model)
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, len(clients))) as executor:
+            server_loads = list(executor.map(self._load_one, clients))
+        # Servers load in parallel, so the wait is the slowest one, not the sum.
+        # 0 means it was already loaded.
+        self.load_seconds = max(server_loads, default=0.0)
+        pin_keep_alive(PINNED)
+        return time.monotonic() - started
+
+    def release(self, timeout=LOAD_TIMEOUT):
+        """Stop pinning: unload the model, or give it back its normal keep_alive.
+
+        Only the first call does anything, so the batch and the closing
+        window can both call it.
+        """
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        pin_keep_alive(None)
+        keep_alive = UNLOAD if self.unload_after else self.keep_alive
+        if keep_alive is None:
+            keep_alive = "5m"  # Ollama's own default
+        for client in _clients(self.client, self.model):
+            try:
+                self._send(client, keep_alive, timeout)
+            except (requests.RequestException, ValueError) as e:
+                self.errors.append(f"{client.base_url}: {e}")
+
+    def summary(self):
+        action = "unloaded" if self.unload_after else "released"
+        return f"Model warm-up: {self.model} took {self.load_seconds:.1f}s to load, {action} after its group"
@@ -0,0 +1,93 @@
+"""Shared HTTP client for talking to an Ollama server.
+
+One pooled, keep-alive requests.Session is reused for every generate call,
+retry and model listing, so a long batch pays the TCP (and TLS, for remote
+GPU hosts) handshake once per connection rather than once per prompt.
+"""
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = "http://localhost:11434"
+DEFAULT_POOL_SIZE = 16
+
+# (connect, read) timeouts in seconds. The read timeout is the longest gap
+# allowed between streamed chunks, not the total generation time.
+DEFAULT_TIMEOUT = (5, 120)
+TAGS_TIMEOUT = (3, 10)
+
+
+def resolve_base_url(base_url=None):
+    """Pick the server URL: explicit argument, then OLLAMA_HOST, then localhost"""
+    url = base_url or os.environ.get("OLLAMA_HOST") or DEFAULT_BASE_URL
+    if "://" not in url:
+        url = f"http://{url}"
+    return url.rstrip("/")
+
+
+class OllamaClient:
+    """Pooled keep-alive client for the Ollama REST API"""
+
+    def __init__(self, base_url=None, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.base_url = resolve_base_url(base_url)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        self._mount_adapter(pool_size)
+
+    def _mount_adapter(self, pool_size):
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def ensure_pool_size(self, pool_size):
+        """Grow the connection pool so every worker thread can hold a connection"""
+        if pool_size > self.pool_size:
+            self.pool_size = pool_size
+            self._mount_adapter(pool_size)
+
+    def url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def generate(self, request_json, timeout=None):
+        """POST to /api/generate and return the (streaming) response"""
+        response = self.session.post(
+            self.url("/api/generate"),
+            json=request_json,
+            timeout=timeout or self.timeout,
+            stream=bool(request_json.get("stream", True))
+        )
+        response.raise_for_status()
+        return response
+
+    def list_models(self, timeout=TAGS_TIMEOUT):
+        """Return the names of the models installed on the server"""
+        response = self.session.get(self.url("/api/tags"), timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+        return [model["name"] for model in data.get("models", [])]
+
+    def embed(self, model, texts, timeout=None):
+        """POST to /api/embed and return one embedding per text"""
+        response = self.session.post(self.url("/api/embed"), json={"model": model, "input": texts},
+                                     timeout=timeout or self.timeout)
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    def model_sizes(self, timeout=TAGS_TIMEOUT):
+        """Return {name: size in bytes} for the models installed on the server"""
+        response = self.session.get(self.url("/api/tags"), timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+        return {model["name"]: model.get("size", 0) for model in data.get("models", [])}
+
+    def running_models(self, timeout=TAGS_TIMEOUT):
+        """Return the names of the models currently loaded in memory (/api/ps)"""
+        response = self.session.get(self.url("/api/ps"), timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+        return [model["name"] for model in data.get("models", [])]
+
+    def close(self):
+        self.session.close()
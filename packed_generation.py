@@ -0,0 +1,239 @@
+"""Several prompts per Ollama request.
+
+Each single-prompt request re-sends the system prompt (and, in generate
+mode, the same theme) to get one prompt back. PackedGenerator asks for K at
+once instead: K variations of a theme, or K short inputs to enhance, in one
+request constrained to a JSON schema through Ollama's `format` field. Each
+item is then cleaned and validated on its own; an item that is missing or
+fails validation goes back through the normal single-prompt path by itself.
+
+It is a drop-in for generate_single_prompt / generate_chinese_prompt: the
+batch engine's workers call it as usual and it gathers compatible calls
+(same model and mode, and in generate mode the same theme) into packs, so
+nothing upstream changes. A pack is sent once K calls have joined it, or
+after PACK_WAIT seconds with whatever has arrived.
+"""
+import json
+import logging
+import threading
+import time
+
+from generation_options import request_options
+from prompt_generators import (
+    CANCELLED_RESULT, CHINESE_ENHANCEMENT_SYSTEM_PROMPT, CHINESE_GENERATION_SYSTEM_PROMPT, DEFAULT_MODEL,
+    ENHANCEMENT_SYSTEM_PROMPT, GENERATION_SYSTEM_PROMPT, build_request, generate_chinese_prompt,
+    generate_single_prompt, result_cache, stream_generation
+)
+from prompt_validation import measure, validate_item
+from result_cache import make_key
+from stream_guard import StreamGuard
+
+DEFAULT_PACK_SIZE = 4
+PACK_WAIT = 0.25  # Seconds a partial pack waits for more calls to join
+
+# Enhancement inputs longer than this are sent on their own
+SHORT_INPUT = {"english": 40, "chinese": 60}  # words / characters
+
+# Extra tokens per item for the JSON around it
+JSON_OVERHEAD_TOKENS = 24
+
+PACK_FORMAT = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"id": {"type": "integer"}, "prompt": {"type": "string"}},
+                "required": ["id", "prompt"],
+            },
+        },
+    },
+    "required": ["items"],
+}
+
+SETTINGS = {
+    "english": {
+        "single": generate_single_prompt,
+        "system": {"enhance": ENHANCEMENT_SYSTEM_PROMPT, "generate": GENERATION_SYSTEM_PROMPT},
+        "generate": ("Core concept to create unique variations from: {theme}\n\n"
+                     "Write {k} distinct variations, each a complete prompt of 225-300 words. "
+                     "Answer in JSON: {{\"items\": [{{\"id\": 1, \"prompt\": \"...\"}}, ...]}} "
+                     "with ids 1 to {k}."),
+        "enhance": ("Enhance each of these {k} input prompts separately, each into a complete "
+                    "prompt of 225-300 words:\n{inputs}\n\n"
+                    "Answer in JSON: {{\"items\": [{{\"id\": <input number>, \"prompt\": \"...\"}}, ...]}}"),
+    },
+    "chinese": {
+        "single": generate_chinese_prompt,
+        "system": {"enhance": CHINESE_ENHANCEMENT_SYSTEM_PROMPT, "generate": CHINESE_GENERATION_SYSTEM_PROMPT},
+        "generate": ("要创建独特变体的核心概念: {theme}\n\n"
+                     "请写出{k}个各不相同的变体，每个都是100-200字的完整提示词。"
+                     "以JSON回答：{{\"items\": [{{\"id\": 1, \"prompt\": \"...\"}}, ...]}}，id从1到{k}。"),
+        "enhance": ("请分别增强以下{k}个输入提示词，每个增强为100-200字的完整提示词：\n{inputs}\n\n"
+                    "以JSON回答：{{\"items\": [{{\"id\": 输入编号, \"prompt\": \"...\"}}, ...]}}"),
+    },
+}
+
+
+class _Slot:
+    """One call waiting to be served by a pack"""
+
+    def __init__(self, prompt, variant):
+        self.prompt = prompt
+        self.variant = variant
+        self.result = None  # (prompt, count, tokens) once served; None means "go single"
+        self.claimed = False
+        self.done = False
+
+
+class PackedGenerator:
+    """Gathers concurrent single-prompt calls into packed requests"""
+
+    def __init__(self, language, pack_size=DEFAULT_PACK_SIZE, wait=PACK_WAIT):
+        self.language = language
+        self.pack_size = pack_size
+        self.wait = wait
+        self._cond = threading.Condition()
+        self._groups = {}
+        self.packs = 0
+        self.packed_items = 0
+        self.fallbacks = 0
+        self.failed_packs = 0
+
+    def __call__(self, base_prompt, is_enhancement=True, model=None, on_token=None, variant=None,
+                 retry_policy=None, report=None, cancel=None):
+        """Same arguments and result as generate_single_prompt"""
+        settings = SETTINGS[self.language]
+        model = model or DEFAULT_MODEL
+        report = report if report is not None else {}
+
+        def single():
+            return settings["single"](base_prompt, is_enhancement, model, on_token=on_token,
+                                      variant=variant, retry_policy=retry_policy, report=report,
+                                      cancel=cancel)
+
+        if is_enhancement and measure(base_prompt, self.language) > SHORT_INPUT[self.language]:
+            return single()
+
+        # Same cache entries as the single path, so either can serve the other's repeats
+        mode = "enhance" if is_enhancement else "generate"
+        cache_key = None
+        if result_cache.applies_to(is_enhancement):
+            options, _ = request_options(self.language, mode, variant)
+            cache_key = make_key(model, settings["system"][mode], base_prompt, mode, self.language,
+                                 options, None if is_enhancement else variant)
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                report.update(attempts=0, tokens=0, cached=True)
+                return cached
+
+        slot = _Slot(base_prompt, variant)
+        key = (mode, model, None if is_enhancement else base_prompt)
+        batch = self._join(key, slot)
+        if batch is not None:
+            self._serve(batch, mode, model, cancel)
+        else:
+            self._wait_done(slot)
+
+        if slot.result is None and cancel is not None and cancel.is_set():
+            return CANCELLED_RESULT[self.language]
+        if slot.result is None:
+            with self._cond:
+                self.fallbacks += 1
+            return single()
+        text, count, tokens = slot.result
+        report.update(attempts=1, tokens=tokens, cached=False, policy="packed")
+        if cache_key is not None:
+            result_cache.put(cache_key, text, count)
+        return text, count
+
+    def _join(self, key, slot):
+        """Add the slot to its group; return the batch if this call has to send it"""
+        with self._cond:
+            group = self._groups.setdefault(key, [])
+            group.append(slot)
+            if len(group) >= self.pack_size:
+                return self._claim(key)
+            deadline = time.monotonic() + self.wait
+            while not slot.claimed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return self._claim(key)
+                self._cond.wait(remaining)
+            return None
+
+    def _claim(self, key):
+        batch = self._groups.pop(key)
+        for slot in batch:
+            slot.claimed = True
+        self._cond.notify_all()
+        return batch
+
+    def _wait_done(self, slot):
+        with self._cond:
+            while not slot.done:
+                self._cond.wait()
+
+    def _serve(self, batch, mode, model, cancel=None):
+        results = [None] * len(batch)
+        try:
+            results = self._request(batch, mode, model, cancel)
+        except Exception as e:
+            logging.warning(f"Packed request failed, sending its {len(batch)} prompts one by one: {e}")
+            with self._cond:
+                self.failed_packs += 1
+        finally:
+            with self._cond:
+                self.packs += 1
+                for slot, result in zip(batch, results):
+                    slot.result = result
+                    slot.done = True
+                    self.packed_items += result is not None
+                self._cond.notify_all()
+
+    def _request(self, batch, mode, model, cancel=None):
+        settings = SETTINGS[self.language]
+        k = len(batch)
+        if mode == "generate":
+            prompt = settings["generate"].format(theme=batch[0].prompt, k=k)
+        else:
+            inputs = "\n".join(f"{n}. {slot.prompt}" for n, slot in enumerate(batch, 1))
+            prompt = settings["enhance"].format(inputs=inputs, k=k)
+        options, keep_alive = request_options(self.language, mode, batch[0].variant)
+        options["num_predict"] = k * (options["num_predict"] + JSON_OVERHEAD_TOKENS)
+        # The system prompt is the single path's, so the server's cached prefix is shared
+        request_json = build_request(model, settings["system"][mode], prompt, options, keep_alive)
+        request_json["format"] = PACK_FORMAT
+
+        # No budget - only runaway checks, and the run being stopped
+        guard = StreamGuard(is_chinese=self.language == "chinese", cancel=cancel)
+        text, stopped, final_chunk = stream_generation(request_json, guard)
+        if stopped:
+            return [None] * k
+        items = json.loads(text).get("items", [])
+        tokens = final_chunk.get("eval_count", 0) // k
+
+        results = [None] * k
+        if mode == "enhance":
+            # Matched by input number - a skipped or reordered item only affects itself
+            for item in items:
+                if isinstance(item, dict) and isinstance(item.get("id"), int) and 1 <= item["id"] <= k:
+                    accepted = validate_item(str(item.get("prompt", "")), self.language)
+                    if accepted is not None:
+                        results[item["id"] - 1] = accepted + (tokens,)
+        else:
+            # Variations are interchangeable - hand out the valid ones in order
+            accepted = [validate_item(str(item.get("prompt", "")), self.language)
+                        for item in items if isinstance(item, dict)]
+            valid = [result + (tokens,) for result in accepted if result is not None][:k]
+            results[:len(valid)] = valid
+        return results
+
+    def summary(self):
+        with self._cond:
+            if not self.packs:
+                return "Packed: none"
+            failed = f" ({self.failed_packs} requests failed)" if self.failed_packs else ""
+            return (f"Packed: {self.packed_items} prompts in {self.packs} requests, "
+                    f"{self.fallbacks} sent on their own{failed}")
@@ -0,0 +1,174 @@
+"""Cleaning pipeline for raw Ollama output.
+
+Everything that can be built ahead of time (patterns, phrase tables) is built
+once at import. The steps that used lazy DOTALL regexes are done with forward
+scans instead, so a 50 KB reasoning dump with an unclosed <think> or a stray
+"<" in every line is cleaned in linear time rather than quadratic time. The
+output is identical to the original regex-per-call implementation.
+"""
+import re
+
+# Common unwanted prefixes/phrases - order matters, see strip_prefixes()
+UNWANTED_PHRASES = (
+    "Here's the enhanced prompt:",
+    "Enhanced prompt:",
+    "Prompt:",
+    "**Prompt:**",
+    "**Final Prompt:**",
+    "Final Prompt:",
+    "The refined prompt is:",
+    "Here is the enhanced version:",
+    "Enhanced version:",
+    "Here's a unique variation:",
+    "Unique variation:",
+    "Variation:",
+)
+
+# Chinese-specific unwanted phrases, checked after the English ones
+CHINESE_UNWANTED_PHRASES = UNWANTED_PHRASES + (
+    "以下是增强后的提示词：",
+    "增强提示词：",
+    "提示词：",
+    "改进后的提示词：",
+    "这是独特的变体：",
+    "变体：",
+    "使用哈苏",
+    "采用超现实主义数字艺术风格",
+    "f/2.8",
+    "ISO 100",
+)
+
+# Polaris-style thinking blocks: (opening marker, markers that end the block).
+# A block with no end marker runs to the end of the text.
+THINKING_BLOCKS = (
+    ("**Thoughts:**", ("**Prompt:**", "**Summary:**", "**Final Prompt:**")),
+    ("**Summary:**", ("**Prompt:**", "**Final Prompt:**")),
+    ("Thoughts:", ("Prompt:", "Summary:", "Final Prompt:")),
+    ("Summary:", ("Prompt:", "Final Prompt:")),
+)
+
+
+def _compile_block(marker, terminators):
+    return marker, re.compile("|".join(re.escape(t) for t in terminators))
+
+
+def _compile_prefix_table(phrases):
+    """One anchored matcher per starting position in the phrase list.
+
+    The original loop tries each phrase once, in list order, stripping every
+    one that matches. table[j] matches any of phrases[j:] and reports which
+    one via its group number, so the loop becomes one regex match per strip.
+    """
+    table = []
+    for start in range(len(phrases)):
+        alternatives = "|".join(f"({re.escape(p)})" for p in phrases[start:])
+        table.append(re.compile(alternatives))
+    return table
+
+
+_THINKING_BLOCKS = tuple(_compile_block(m, t) for m, t in THINKING_BLOCKS)
+_PREFIX_TABLE = _compile_prefix_table(UNWANTED_PHRASES)
+_CHINESE_PREFIX_TABLE = _compile_prefix_table(CHINESE_UNWANTED_PHRASES)
+
+
+def remove_think_blocks(text):
+    """Drop <think>...</think> blocks (same as a lazy DOTALL regex, in one pass)"""
+    pieces = []
+    pos = 0
+    while True:
+        start = text.find("<think>", pos)
+        if start == -1:
+            break
+        end = text.find("</think>", start + 7)
+        if end == -1:
+            # No closing tag anywhere after this point, so no later <think>
+            # can close either - the rest is kept as-is.
+            break
+        pieces.append(text[pos:start])
+        pos = end + 8
+    if not pieces:
+        return text
+    pieces.append(text[pos:])
+    return "".join(pieces)
+
+
+def remove_tags(text):
+    """Drop anything that looks like <tag> (same as re.sub(r'<[^>]+>', ''))"""
+    pieces = []
+    pos = 0
+    search = pos
+    while True:
+        start = text.find("<", search)
+        if start == -1:
+            break
+        end = text.find(">", start + 1)
+        if end == -1:
+            break
+        if end == start + 1:
+            # "<>" isn't a tag; the ">" can't close anything else either
+            search = end + 1
+            continue
+        pieces.append(text[pos:start])
+        pos = search = end + 1
+    if not pieces:
+        return text
+    pieces.append(text[pos:])
+    return "".join(pieces)
+
+
+def _end_of_text(text, pos):
+    # Where a DOTALL `$` would first match at or after pos: before a final
+    # newline, otherwise at the very end.
+    if text.endswith("\n") and len(text) - 1 >= pos:
+        return len(text) - 1
+    return len(text)
+
+
+def remove_thinking_block(text, marker, terminators):
+    """Drop every `marker` up to (not including) the next terminator or the end"""
+    pieces = []
+    pos = 0
+    while True:
+        start = text.find(marker, pos)
+        if start == -1:
+            break
+        body = start + len(marker)
+        match = terminators.search(text, body)
+        pieces.append(text[pos:start])
+        pos = match.start() if match else _end_of_text(text, body)
+    if not pieces:
+        return text
+    pieces.append(text[pos:])
+    return "".join(pieces)
+
+
+def strip_prefixes(text, table):
+    """Strip leading unwanted phrases, trying each phrase once in list order"""
+    index = 0
+    while index < len(table):
+        match = table[index].match(text)
+        if not match:
+            break
+        text = text[match.end():].strip()
+        index += match.lastindex
+    return text
+
+
+def clean_prompt_output(generated_text, is_chinese=False):
+    """Enhanced cleaning function for both English and Chinese outputs"""
+    # Clean the output - remove think tags, explanations, and formatting
+    clean_prompt = generated_text.strip()
+
+    # Remove <think> blocks, then any remaining XML-like tags
+    clean_prompt = remove_think_blocks(clean_prompt)
+    clean_prompt = remove_tags(clean_prompt)
+
+    # Remove Polaris thinking blocks
+    for marker, terminators in _THINKING_BLOCKS:
+        clean_prompt = remove_thinking_block(clean_prompt, marker, terminators)
+
+    # Remove common unwanted prefixes/phrases
+    clean_prompt = strip_prefixes(clean_prompt, _CHINESE_PREFIX_TABLE if is_chinese else _PREFIX_TABLE)
+
+    # Convert to single line and clean spaces
+    return " ".join(clean_prompt.split())
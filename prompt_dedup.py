@@ -0,0 +1,133 @@
+"""Duplicate and near-duplicate prompt detection in front of the engine.
+
+Prompt files merged from many sources repeat themselves, exactly or with a
+word or two changed. Deduper looks at prompts one at a time, in input order,
+and says for each one whether it is new or a repeat of an earlier prompt:
+
+- exact repeats: the same text after normalising case, Unicode width forms,
+  punctuation and whitespace
+- near repeats: MinHash signatures of character shingles, bucketed with
+  LSH so each prompt is only compared against likely matches, and accepted
+  when the estimated Jaccard similarity reaches the threshold
+
+Only new prompts are sent to Ollama; every repeat gets the result of the
+prompt it repeats. Because it works one prompt at a time it also works on
+prompt files streamed from disk.
+"""
+import random
+import re
+import threading
+import unicodedata
+import zlib
+from array import array
+
+DEFAULT_THRESHOLD = 0.9
+NUM_PERM = 32
+MERSENNE_PRIME = (1 << 61) - 1
+
+# Shingle length in characters - shorter for CJK, where one character is
+# roughly one word
+SHINGLE_CHARS = 5
+CJK_SHINGLE_CHARS = 2
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_WHITESPACE = re.compile(r"\s+")
+_CJK = re.compile(r"[一-鿿]")
+
+
+def normalize(prompt):
+    """Canonical form for exact matching"""
+    text = unicodedata.normalize("NFKC", prompt).casefold()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def shingles(normalized):
+    size = CJK_SHINGLE_CHARS if _CJK.search(normalized) else SHINGLE_CHARS
+    if len(normalized) <= size:
+        return {normalized}
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def lsh_bands(threshold, num_perm=NUM_PERM):
+    """(bands, rows) whose LSH S-curve turns up closest to `threshold`"""
+    options = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(options, key=lambda option: abs((1 / option[0]) ** (1 / option[1]) - threshold))
+
+
+class Deduper:
+    """Online exact + MinHash/LSH duplicate detector.
+
+    `threshold` is the minimum estimated Jaccard similarity for two prompts
+    to count as the same; 1.0 (or `near=False`) keeps exact matching only.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, near=True, num_perm=NUM_PERM, seed=1):
+        self.threshold = threshold
+        self.near = near and threshold < 1.0
+        self.num_perm = num_perm
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+                       for _ in range(num_perm)]
+        self.bands, self.rows = lsh_bands(threshold, num_perm) if self.near else (0, 0)
+        self._lock = threading.Lock()
+        self._exact = {}            # normalised text -> position of first occurrence
+        self._buckets = {}          # (band, band hash) -> [signature numbers]
+        self._signatures = array("Q")
+        self._owners = array("q")   # signature number -> position
+        self.unique = 0
+        self.exact_repeats = 0
+        self.near_repeats = 0
+
+    def _signature(self, normalized):
+        hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(normalized)]
+        return [min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in self._perms]
+
+    def _band_keys(self, signature):
+        rows = self.rows
+        return [(band, hash(tuple(signature[band * rows:(band + 1) * rows]))) for band in range(self.bands)]
+
+    def _similar(self, signature, number):
+        start = number * self.num_perm
+        stored = self._signatures[start:start + self.num_perm]
+        agree = sum(1 for x, y in zip(signature, stored) if x == y)
+        return agree / self.num_perm >= self.threshold
+
+    def check(self, position, prompt):
+        """Return the position this prompt repeats, or None if it is new"""
+        normalized = normalize(prompt)
+        if not normalized:
+            # Only punctuation or whitespace - nothing to compare, so never a repeat
+            with self._lock:
+                self.unique += 1
+            return None
+        with self._lock:
+            original = self._exact.get(normalized)
+            if original is not None:
+                self.exact_repeats += 1
+                return original
+            self._exact[normalized] = position
+            if self.near:
+                signature = self._signature(normalized)
+                keys = self._band_keys(signature)
+                for key in keys:
+                    for number in self._buckets.get(key, ()):
+                        if self._similar(signature, number):
+                            self.near_repeats += 1
+                            self._exact[normalized] = self._owners[number]
+                            return self._owners[number]
+                number = len(self._owners)
+                self._signatures.extend(signature)
+                self._owners.append(position)
+                for key in keys:
+                    self._buckets.setdefault(key, []).append(number)
+            self.unique += 1
+            return None
+
+    def summary(self):
+        with self._lock:
+            saved = self.exact_repeats + self.near_repeats
+            if not saved:
+                return "Duplicates: none"
+            return (f"Duplicates: {saved} generations saved "
+                    f"({self.exact_repeats} exact, {self.near_repeats} near)")
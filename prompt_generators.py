@@ -0,0 +1,445 @@
+"""Prompt generators - the Ollama side of Dragon Diffusion.
+
+Kept free of Tk so the batch worker threads and the benchmark scripts can
+drive them headlessly; the GUI passes the selected model in explicitly.
+"""
+import json
+
+from endpoint_pool import EndpointPool, EndpointFailover
+from prompt_cleaning import clean_prompt_output
+from result_cache import ResultCache, make_key
+from semantic_cache import SemanticCache
+from generation_options import request_options, budget_tokens
+from stream_guard import StreamGuard, StreamStats, BUDGET, CANCELLED, REJECT_REASONS
+from retry_policy import DEFAULT_RETRY_POLICY
+from telemetry import RunTelemetry
+from concurrency import AdaptiveLimiter
+
+DEFAULT_MODEL = "gemma3:27b"
+
+# What a prompt returns when its run is stopped mid-stream; never cached
+CANCELLED_RESULT = {"english": ("[Generation cancelled]", 0), "chinese": ("[生成已取消]", 0)}
+
+# Streams a prompt may lose to a dying server before it gives up; these
+# don't count as retries, but a server that keeps failing must not loop forever
+MAX_FAILOVERS = 3
+
+# Enhancement system prompt (existing)
+ENHANCEMENT_SYSTEM_PROMPT = """You are an expert AI artist and prompt engineer, tasked with refining and elevating an existing text-to-image prompt for the Flux Dev model. Your goal is to transform the provided input prompt into a single, highly detailed, evocative, and comprehensive prompt that will generate an amazing picture.
+Focus on enriching the input prompt by thoughtfully incorporating and enhancing elements such as:
+Subject and Action: Clearly define and elaborate on the main subject(s) and any actions or interactions they are performing. Add more descriptive adjectives and verbs.
+Environment and Setting: Expand on the background, atmosphere, and specific details of the environment. Think about the time of day, weather, and any relevant objects or structures.
+Artistic Style: Suggest a specific and compelling artistic style. Be precise, referencing movements (e.g., Art Nouveau, Baroque, Impressionistic), renowned artists, photographic styles (cinematic photography, fashion editorial), or digital art aesthetics (unreal engine render, octane render, concept art).
+Lighting and Mood: Describe the lighting conditions with precision (e.g., dramatic volumetric lighting, soft ambient glow, neon-lit cyberpunk scene, golden hour backlighting). Convey the desired emotional tone and atmosphere (e.g., serene, mysterious, vibrant, melancholic).
+Composition and Perspective: Guide the framing and camera angle (e.g., wide shot, extreme close-up, Dutch angle, symmetrical composition). Consider elements like depth of field, leading lines, or the rule of thirds.
+Color Palette: Specify the dominant colours or colour schemes (e.g., monochromatic, vibrant neon, muted earthy tones, complementary colours).
+Level of Detail: Emphasise details that add richness and realism, such as textures, materials, or intricate patterns.
+Technical Specifications (Optional): For photorealistic outputs, suggest camera-specific details like lens type (85mm prime lens), aperture (f/1.8), shutter speed, or film stock (Kodak Portra 400).
+Your entire output must be a single, refined text-to-image prompt only on a single text line. Do not provide any conversational text, explanations, or reasoning. The output should be ready for direct use with the Flux Dev model."""
+
+# Generation system prompt (existing)
+GENERATION_SYSTEM_PROMPT = """You are a creative prompt generator specialising in creating unique variations for text-to-image generation with the Flux Dev model. Your task is to take a core concept and generate a completely unique, detailed variation whilst maintaining the essential elements specified.
+
+Core Instructions:
+- Preserve ALL essential elements from the input (e.g., if "blonde woman in sci-fi" is specified, every output must have a blonde woman in a sci-fi setting)
+- Create maximum variation in ALL other aspects: poses, expressions, actions, environments, lighting, camera angles, artistic styles, moods, compositions, clothing/accessories, time of day, weather, colours, textures
+- Make each variation feel distinctly different whilst keeping the core subject intact
+- Adapt your variation strategy to the subject matter (human subjects = vary poses/expressions/clothing, abstract art = vary forms/textures/compositions, landscapes = vary weather/lighting/perspective)
+- Generate detailed, evocative descriptions that will produce visually striking results
+
+Variation Categories to Randomise:
+Physical Aspects: poses, expressions, gestures, body language, clothing, accessories, hair styles (if not specified)
+Environmental: settings, backgrounds, architecture, landscapes, weather, time of day, season
+Technical: camera angles, focal lengths, depth of field, composition rules, framing
+Artistic: art styles, lighting conditions, colour palettes, mood, atmosphere, rendering techniques
+Actions: what the subject is doing, interactions with environment, dynamic elements
+
+Your entire output must be a single, unique text-to-image prompt on one line. No explanations, just the prompt ready for Flux Dev."""
+
+# Chinese Enhancement system prompt
+CHINESE_ENHANCEMENT_SYSTEM_PROMPT = """你是一位专业的AI艺术家和提示词工程师，专门为Flux Dev模型优化和改进现有的文本到图像提示词。你的目标是将输入的提示词转换成单个高度详细、富有表现力和全面的中文提示词，生成令人惊叹的图像。
+
+重点增强以下元素：
+主体和动作：清晰定义并详述主要主体及其执行的动作或互动，添加更多描述性形容词和动词
+环境和设置：扩展背景、氛围和环境的具体细节，考虑时间、天气和相关物体或结构
+艺术风格：建议具体而引人注目的艺术风格，精确引用艺术运动、著名艺术家、摄影风格或数字艺术美学
+光线和情绪：精确描述光线条件，传达所需的情感基调和氛围
+构图和视角：指导取景和相机角度，考虑景深、引导线或三分法则等元素
+色彩搭配：指定主要颜色或配色方案
+细节层次：强调增加丰富性和真实感的细节，如纹理、材质或复杂图案
+技术规格：对于真实感输出，建议相机具体细节
+
+你的输出必须是单个精炼的中文文本到图像提示词，只能在一行文本中。不要提供任何对话文本、解释或推理。输出应该可以直接用于Flux Dev模型。"""
+
+# Chinese Generation system prompt
+CHINESE_GENERATION_SYSTEM_PROMPT = """你是专门为Flux Dev模型创建独特变体的创意提示词生成器。你的任务是接受核心概念并生成完全独特的详细变体，同时保持指定的基本元素。
+
+核心指令：
+- 保留输入中的所有基本元素
+- 在所有其他方面创造最大变化：姿势、表情、动作、环境、光线、相机角度、艺术风格、情绪、构图、服装配饰、时间、天气、颜色、纹理
+- 使每个变体感觉截然不同，同时保持核心主题完整
+- 根据主题调整变化策略
+- 生成详细且富有表现力的描述
+
+变化类别包括：
+身体方面：姿势、表情、手势、身体语言、服装、配饰、发型
+环境方面：设置、背景、建筑、景观、天气、时间、季节
+技术方面：相机角度、焦距、景深、构图规则、取景
+艺术方面：艺术风格、光线条件、色彩搭配、情绪、氛围、渲染技术
+动作方面：主体在做什么、与环境的互动、动态元素
+
+你的输出必须是单个独特的中文文本到图像提示词，在一行中。不要解释，只提供可直接用于Flux Dev的提示词。"""
+
+# (system prompt, first user turn) per language and mode
+PROMPTS = {
+    ("english", "enhance"): (ENHANCEMENT_SYSTEM_PROMPT, "Input prompt to enhance: {}"),
+    ("english", "generate"): (GENERATION_SYSTEM_PROMPT, "Core concept to create unique variation from: {}"),
+    ("chinese", "enhance"): (CHINESE_ENHANCEMENT_SYSTEM_PROMPT, "要增强的输入提示词: {}"),
+    ("chinese", "generate"): (CHINESE_GENERATION_SYSTEM_PROMPT, "要创建独特变体的核心概念: {}"),
+}
+
+ollama = EndpointPool()  # Shared pooled connections to the Ollama server(s)
+result_cache = ResultCache()  # Finished results, reused across runs
+semantic_cache = SemanticCache()  # Inputs that mean the same, for results the exact key misses
+stream_stats = StreamStats()  # Early stream stops for the current run
+run_telemetry = RunTelemetry()  # Server timings and latencies for the current run
+concurrency = AdaptiveLimiter()  # Requests in flight, when adapting to the server
+
+
+def build_request(model, system_prompt, prompt, options, keep_alive=None, inline_system=False):
+    """Build an /api/generate request body.
+
+    The system prompt goes in Ollama's "system" field rather than being
+    pasted in front of every prompt, so each request starts with the same
+    templated prefix and the server can reuse its evaluated KV cache for it.
+    `inline_system` restores the old pasted-in layout (for benchmarking).
+    """
+    request_json = {
+        "model": model,
+        "options": options,
+        "stream": True
+    }
+    if inline_system:
+        request_json["prompt"] = f"{system_prompt}\n\n{prompt}"
+    else:
+        request_json["system"] = system_prompt
+        request_json["prompt"] = prompt
+    if keep_alive is not None:
+        request_json["keep_alive"] = keep_alive
+    return request_json
+
+
+def stream_generation(request_json, guard, on_token=None):
+    """Stream one attempt and return (text, stop_reason, final_chunk).
+
+    `guard` can hang up early (stop_reason is then set and recorded in
+    stream_stats). final_chunk is Ollama's closing "done" chunk with the
+    timings and `context`, or {} if we hung up before it arrived.
+    """
+    generated_text = ""
+    stopped = None
+    final_chunk = {}
+    with concurrency.slot() as slot:
+        with ollama.generate(request_json) as response:
+            for line in response.iter_lines():
+                if line:
+                    json_line = json.loads(line.decode("utf-8"))
+                    if "response" in json_line:
+                        generated_text += json_line["response"]
+                        if on_token:
+                            on_token(json_line["response"])
+                    if json_line.get("done"):
+                        final_chunk = json_line
+                    elif "response" in json_line:
+                        stopped = guard.check(generated_text)
+                        if stopped:
+                            stream_stats.record(stopped, request_json["options"]["num_predict"], guard.chunks)
+                            break
+        slot.finished(final_chunk, guard.chunks)
+    run_telemetry.record_request(final_chunk)
+    return generated_text, stopped, final_chunk
+
+
+def semantic_match(lookup, cache_key):
+    """The cached result of a semantic lookup's match, copied to this input's own key"""
+    if lookup is None or lookup.key is None:
+        return None
+    cached = lookup.hit(result_cache.get(lookup.key, count=False))
+    if cached is not None:
+        result_cache.record_similar_hit()
+        result_cache.put(cache_key, *cached)
+    return cached
+
+
+def generate_single_prompt(base_prompt, is_enhancement=True, model=None, on_token=None, variant=None,
+                           retry_policy=None, report=None, cancel=None):
+    """Generate a single enhanced prompt using Ollama (EXISTING ENGLISH FUNCTION)
+
+    `model` defaults to DEFAULT_MODEL. `on_token`, if given, is called with
+    each streamed piece of text, and with None whenever a retry starts over.
+    `variant` numbers the variations of a generate-mode run for the cache.
+    `retry_policy` decides how short results are retried (see retry_policy.py).
+    `report`, if given, is filled with the attempts and tokens this prompt took.
+    `cancel`, a threading.Event, hangs up the stream and gives up when set.
+    """
+
+    model = model or DEFAULT_MODEL
+    mode = "enhance" if is_enhancement else "generate"
+    system_prompt, template = PROMPTS[("english", mode)]
+    full_prompt = template.format(base_prompt)
+    # Sampling and the num_predict budget must go inside "options" to be honoured
+    options, keep_alive = request_options("english", mode, variant)
+    
+    policy = retry_policy or DEFAULT_RETRY_POLICY
+    report = report if report is not None else {}
+    report.update(attempts=0, tokens=0, cached=False, policy=policy.name)
+    
+    # Serve repeats from the on-disk cache; only accepted results are stored
+    cache_key = None
+    lookup = None
+    if result_cache.applies_to(is_enhancement):
+        cache_key = make_key(model, system_prompt, base_prompt, mode, "english",
+                             options, None if is_enhancement else variant)
+        cached = result_cache.get(cache_key)
+        if cached is None and semantic_cache.applies_to(is_enhancement):
+            # Not the same input - but maybe one that means the same
+            lookup = semantic_cache.lookup(base_prompt, make_key(model, system_prompt, "", mode, "english", options))
+            cached = semantic_match(lookup, cache_key)
+        if cached is not None:
+            report.update(attempts=0, tokens=0, cached=True)
+            return cached
+    
+    def remember(clean_prompt, word_count):
+        if cache_key is not None and word_count > 0:
+            result_cache.put(cache_key, clean_prompt, word_count)
+            if lookup is not None:
+                lookup.store(cache_key)
+        return clean_prompt, word_count
+
+    # What to send when the result comes back short of the 225-300 window
+    def retry_prompts(clean_prompt, missing):
+        return {
+            "expand": f"Input: {base_prompt}\n\nExpand this response to be more detailed: {clean_prompt}",
+            "continue": (f"Continue the prompt above with about {missing} more words of vivid visual detail. "
+                         "Output only the new text, without repeating what is already written.")
+        }
+
+    max_retries = 3
+    retries = 0
+    failovers = 0
+    first_request = build_request(model, system_prompt, full_prompt, options, keep_alive)
+    request_json = first_request
+    prefix = ""  # Text a continuation retry builds on
+    
+    while retries < max_retries:
+        try:
+            if on_token:
+                on_token(None)  # New attempt - discard any previous draft
+                if prefix:
+                    on_token(prefix + " ")
+            # Hang up as soon as the result is settled - past the budget, or
+            # clearly going to be rejected - instead of decoding to the end
+            guard = StreamGuard(max_words=300 - len(prefix.split()), cancel=cancel)
+            generated_text, stopped, final_chunk = stream_generation(request_json, guard, on_token)
+            report["attempts"] += 1
+            report["tokens"] += final_chunk.get("eval_count", guard.chunks)
+            if stopped == CANCELLED:
+                return CANCELLED_RESULT["english"]
+            
+            if stopped in REJECT_REASONS:
+                retries += 1
+                if retries == max_retries:
+                    return "[Generation failed]", 0
+                continue
+            
+            # Use enhanced cleaning function
+            clean_prompt = clean_prompt_output(generated_text, is_chinese=False)
+            if prefix:
+                clean_prompt = f"{prefix} {clean_prompt}".strip()
+            
+            # Check word count
+            word_count = len(clean_prompt.split())
+            
+            # Check if complete (ends with proper punctuation)
+            is_complete = clean_prompt.strip().endswith((".", "!", "?"))
+            if stopped == BUDGET:
+                # Cut off past the budget - the model was still going, and the
+                # text below is truncated to the budget either way
+                is_complete = True
+            
+            # Enforce hard 300-word limit
+            if word_count > 300:
+                words = clean_prompt.split()
+                clean_prompt = " ".join(words[:300])
+                if not clean_prompt.endswith((".", "!", "?")):
+                    clean_prompt = clean_prompt.rstrip() + "."
+                word_count = 300
+            
+            # Accept if within range and complete
+            if word_count >= 225 and is_complete and word_count <= 300:
+                return remember(clean_prompt, word_count)
+            
+            # Accept shorter prompts if they seem complete and reasonable
+            if word_count >= 150 and is_complete and retries >= 1:
+                return remember(clean_prompt, word_count)
+            
+            if retries < max_retries - 1:
+                retries += 1
+                if word_count < 150:
+                    missing = 250 - word_count  # Aim for the middle of the window
+                    request_json, prefix = policy.next_request(
+                        first_request, final_chunk, clean_prompt,
+                        retry_prompts(clean_prompt, missing), budget_tokens(words=missing))
+                elif not is_complete:
+                    clean_prompt = clean_prompt.rstrip() + "."
+                    return remember(clean_prompt, word_count)
+                else:
+                    break
+            else:
+                break
+                
+        except EndpointFailover as e:
+            failovers += 1
+            if failovers > MAX_FAILOVERS:
+                return f"[Error generating prompt: {e}]", 0
+            continue  # Its server died mid-stream - redo the attempt on another one
+        except Exception as e:
+            retries += 1
+            if retries == max_retries:
+                return f"[Error generating prompt: {e}]", 0
+    
+    if 'clean_prompt' in locals():
+        # Never passed the checks - use it this once, but don't cache it
+        return clean_prompt, word_count
+    return "[Generation failed]", 0
+
+def generate_chinese_prompt(base_prompt, is_enhancement=True, model=None, on_token=None, variant=None,
+                            retry_policy=None, report=None, cancel=None):
+    """Generate Chinese prompt - NEW FUNCTION for token efficiency
+
+    The keyword arguments work as in generate_single_prompt.
+    """
+
+    model = model or DEFAULT_MODEL
+    mode = "enhance" if is_enhancement else "generate"
+    system_prompt, template = PROMPTS[("chinese", mode)]
+    full_prompt = template.format(base_prompt)
+    # Sampling and the num_predict budget must go inside "options" to be honoured
+    options, keep_alive = request_options("chinese", mode, variant)
+    
+    policy = retry_policy or DEFAULT_RETRY_POLICY
+    report = report if report is not None else {}
+    report.update(attempts=0, tokens=0, cached=False, policy=policy.name)
+    
+    # Serve repeats from the on-disk cache; only accepted results are stored
+    cache_key = None
+    lookup = None
+    if result_cache.applies_to(is_enhancement):
+        cache_key = make_key(model, system_prompt, base_prompt, mode, "chinese",
+                             options, None if is_enhancement else variant)
+        cached = result_cache.get(cache_key)
+        if cached is None and semantic_cache.applies_to(is_enhancement):
+            # Not the same input - but maybe one that means the same
+            lookup = semantic_cache.lookup(base_prompt, make_key(model, system_prompt, "", mode, "chinese", options))
+            cached = semantic_match(lookup, cache_key)
+        if cached is not None:
+            report.update(attempts=0, tokens=0, cached=True)
+            return cached
+    
+    def remember(clean_prompt, char_count):
+        if cache_key is not None and char_count > 0:
+            result_cache.put(cache_key, clean_prompt, char_count)
+            if lookup is not None:
+                lookup.store(cache_key)
+        return clean_prompt, char_count
+
+    # What to send when the result comes back short of the 100-200 window
+    def retry_prompts(clean_prompt, missing):
+        return {
+            "expand": f"输入: {base_prompt}\n\n请扩展这个回应，使其更详细: {clean_prompt}",
+            "continue": f"请继续补充上面的提示词，再增加约{missing}个字的视觉细节。只输出新增的内容，不要重复已有内容。"
+        }
+
+    max_retries = 3
+    retries = 0
+    failovers = 0
+    first_request = build_request(model, system_prompt, full_prompt, options, keep_alive)
+    request_json = first_request
+    prefix = ""  # Text a continuation retry builds on
+    
+    while retries < max_retries:
+        try:
+            if on_token:
+                on_token(None)  # New attempt - discard any previous draft
+                if prefix:
+                    on_token(prefix)
+            guard = StreamGuard(max_chars=200 - len(prefix.replace(" ", "")), is_chinese=True, cancel=cancel)
+            generated_text, stopped, final_chunk = stream_generation(request_json, guard, on_token)
+            report["attempts"] += 1
+            report["tokens"] += final_chunk.get("eval_count", guard.chunks)
+            if stopped == CANCELLED:
+                return CANCELLED_RESULT["chinese"]
+            
+            if stopped in REJECT_REASONS:
+                retries += 1
+                if retries == max_retries:
+                    return "[生成失败]", 0
+                continue
+            
+            # Use enhanced cleaning function with Chinese flag
+            clean_prompt = clean_prompt_output(generated_text, is_chinese=True)
+            if prefix:
+                clean_prompt = prefix + clean_prompt
+            
+            # Chinese character count (more meaningful than word count)
+            char_count = len(clean_prompt.replace(" ", ""))
+            
+            # Check if complete
+            is_complete = clean_prompt.strip().endswith(("。", "！", "？", ".", "!", "?"))
+            if stopped == BUDGET:
+                is_complete = True  # See generate_single_prompt
+            
+            # Enforce character limit for Chinese (150-200 chars is quite detailed)
+            if char_count > 200:
+                clean_prompt = clean_prompt[:200]
+                if not clean_prompt.endswith(("。", "！", "？", ".", "!", "?")):
+                    clean_prompt = clean_prompt.rstrip() + "。"
+                char_count = len(clean_prompt.replace(" ", ""))
+            
+            # Accept if within range and complete
+            if char_count >= 100 and is_complete and char_count <= 200:
+                return remember(clean_prompt, char_count)
+            
+            # Accept shorter prompts if they seem complete
+            if char_count >= 80 and is_complete and retries >= 1:
+                return remember(clean_prompt, char_count)
+            
+            if retries < max_retries - 1:
+                retries += 1
+                if char_count < 80:
+                    missing = 150 - char_count  # Aim for the middle of the window
+                    request_json, prefix = policy.next_request(
+                        first_request, final_chunk, clean_prompt,
+                        retry_prompts(clean_prompt, missing), budget_tokens(chars=missing))
+                elif not is_complete:
+                    clean_prompt = clean_prompt.rstrip() + "。"
+                    return remember(clean_prompt, char_count)
+                else:
+                    break
+            else:
+                break
+                
+        except EndpointFailover as e:
+            failovers += 1
+            if failovers > MAX_FAILOVERS:
+                return f"[生成提示词时出错: {e}]", 0
+            continue  # Its server died mid-stream - redo the attempt on another one
+        except Exception as e:
+            retries += 1
+            if retries == max_retries:
+                return f"[生成提示词时出错: {e}]", 0
+    
+    if 'clean_prompt' in locals():
+        # Never passed the checks - use it this once, but don't cache it
+        return clean_prompt, char_count
+    return "[生成失败]", 0
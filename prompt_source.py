@@ -0,0 +1,94 @@
+"""File-backed prompt input that streams from disk.
+
+Large prompt files are never read into memory or into the input widget as a
+whole: a PromptSource yields one prompt at a time straight into the batch
+engine, and the GUI only shows a short preview. Plain text files give one
+prompt per non-empty line; JSONL and CSV files give the chosen field/column.
+"""
+import csv
+import itertools
+import json
+import os
+
+# Text files with more prompts than this are streamed instead of loaded
+# into the input widget
+STREAM_THRESHOLD = 1000
+PREVIEW_PROMPTS = 200
+
+FORMATS = {".txt": "text", ".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv"}
+DEFAULT_COLUMNS = ("prompt", "text", "input")
+
+
+def detect_format(path):
+    return FORMATS.get(os.path.splitext(path)[1].lower(), "text")
+
+
+def available_columns(path, file_format=None):
+    """Field names a JSONL/CSV file offers, read from its first record"""
+    file_format = file_format or detect_format(path)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if file_format == "csv":
+            return next(csv.reader(f), [])
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                return list(record) if isinstance(record, dict) else []
+    return []
+
+
+def guess_column(columns):
+    for name in DEFAULT_COLUMNS:
+        if name in columns:
+            return name
+    return columns[0] if columns else None
+
+
+class PromptSource:
+    """Lazily iterable prompts from a text, JSONL or CSV file"""
+
+    def __init__(self, path, file_format=None, column=None):
+        self.path = path
+        self.format = file_format or detect_format(path)
+        self.column = column
+        if self.format != "text" and not self.column:
+            raise ValueError(f"A column is required to read prompts from {self.format.upper()}")
+        self._count = None
+
+    def __iter__(self):
+        with open(self.path, "r", encoding="utf-8-sig", newline="") as f:
+            if self.format == "csv":
+                for row in csv.DictReader(f):
+                    prompt = (row.get(self.column) or "").strip()
+                    if prompt:
+                        yield prompt
+            elif self.format == "jsonl":
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    prompt = str(record.get(self.column) or "").strip() if isinstance(record, dict) else ""
+                    if prompt:
+                        yield prompt
+            else:
+                for line in f:
+                    prompt = line.strip()
+                    if prompt:
+                        yield prompt
+
+    def __len__(self):
+        # One streaming pass, cached - cheap next to a single LLM call
+        if self._count is None:
+            self._count = sum(1 for _ in self)
+        return self._count
+
+    def preview(self, limit=PREVIEW_PROMPTS):
+        return list(itertools.islice(self, limit))
+
+    def describe(self):
+        name = os.path.basename(self.path)
+        if self.format == "text":
+            return name
+        return f"{name} [{self.column}]"
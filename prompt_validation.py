@@ -0,0 +1,38 @@
+"""Length and completeness checks for a finished prompt.
+
+The same accepted window as the generators - 225-300 words for English,
+100-200 characters for Chinese - for callers that validate a result on
+their own, like packed and speculative generation.
+"""
+from prompt_cleaning import clean_prompt_output
+
+# Accepted words (English) / characters (Chinese) per prompt
+WINDOWS = {"english": (225, 300), "chinese": (100, 200)}
+ENDINGS = {"english": (".", "!", "?"), "chinese": ("。", "！", "？", ".", "!", "?")}
+
+
+def measure(text, language):
+    return len(text.split()) if language == "english" else len(text.replace(" ", ""))
+
+
+def validate_item(text, language):
+    """Clean one result; return (prompt, count) if it passes, else None.
+
+    A result past the window is cut back to it and its sentence closed.
+    """
+    low, high = WINDOWS[language]
+    endings = ENDINGS[language]
+    clean = clean_prompt_output(text, is_chinese=language == "chinese")
+    if measure(clean, language) > high:
+        if language == "english":
+            clean = " ".join(clean.split()[:high])
+            if not clean.endswith(endings):
+                clean += endings[0]
+        elif not clean[:high].endswith(endings):
+            clean = clean[:high - 1].rstrip() + endings[0]
+        else:
+            clean = clean[:high]
+    count = measure(clean, language)
+    if low <= count <= high and clean.endswith(endings):
+        return clean, count
+    return None
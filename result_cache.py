@@ -0,0 +1,157 @@
+"""Persistent on-disk cache of finished prompt enhancements.
+
+Results are keyed by everything that shapes the model's answer - model name,
+system prompt, input prompt, mode, language and sampling options - so a
+re-run of the same prompt file only pays for prompts that actually changed.
+Backed by SQLite so it survives restarts and is safe to share between the
+batch worker threads.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = "dragon_cache.sqlite3"
+DEFAULT_MAX_ENTRIES = 100000
+DEFAULT_MAX_AGE_DAYS = 30
+
+# Eviction is a table scan, so only run it every so many writes
+EVICT_EVERY = 200
+
+
+def make_key(model, system_prompt, base_prompt, mode, language, options, variant=None):
+    """Hash the inputs of one generation into a cache key.
+
+    `variant` separates the N results of a generate-mode run, which all share
+    the same theme - without it every variation would come back identical.
+    """
+    payload = json.dumps({
+        "model": model,
+        "system": hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+        "prompt": base_prompt,
+        "mode": mode,
+        "language": language,
+        "options": options,
+        "variant": variant,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """SQLite-backed LRU cache with size and age limits and hit/miss counters"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS, enabled=True, cache_generate=False):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.enabled = enabled
+        # Generate mode wants fresh variety, so it is only cached on request
+        self.cache_generate = cache_generate
+        self.hits = 0
+        self.misses = 0
+        self.similar_hits = 0  # Of the hits, misses a similar cached prompt answered
+        self.stores = 0
+        self._writes_since_evict = 0
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self):
+        # Opened lazily so a disabled cache never touches the disk
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " result TEXT NOT NULL,"
+                " count INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results(last_used)")
+            self._db.commit()
+        return self._db
+
+    def applies_to(self, is_enhancement):
+        return self.enabled and (is_enhancement or self.cache_generate)
+
+    def get(self, key, count=True):
+        """Return (result, count) for key, or None on a miss.
+
+        `count=False` leaves the hit/miss counters alone, for a second lookup
+        of a prompt whose miss was already counted.
+        """
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            row = db.execute("SELECT result, count, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[2] > self.max_age:
+                if row is not None:
+                    db.execute("DELETE FROM results WHERE key = ?", (key,))
+                    db.commit()
+                self.misses += count
+                return None
+            db.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+            db.commit()
+            self.hits += count
+            return row[0], row[1]
+
+    def record_similar_hit(self):
+        """Count a missed prompt that a similar cached prompt answered as a hit"""
+        with self._lock:
+            self.misses -= 1
+            self.hits += 1
+            self.similar_hits += 1
+
+    def put(self, key, result, count):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO results (key, result, count, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, result, count, now, now)
+            )
+            db.commit()
+            self.stores += 1
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= EVICT_EVERY:
+                self._evict(db, now)
+
+    def _evict(self, db, now):
+        """Drop expired entries, then the least recently used beyond max_entries"""
+        self._writes_since_evict = 0
+        db.execute("DELETE FROM results WHERE created < ?", (now - self.max_age,))
+        db.execute(
+            "DELETE FROM results WHERE key IN ("
+            " SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        db.commit()
+
+    def clear(self):
+        with self._lock:
+            db = self._connect()
+            db.execute("DELETE FROM results")
+            db.commit()
+
+    def reset_stats(self):
+        self.hits = self.misses = self.similar_hits = self.stores = 0
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        rate = f" ({100 * self.hits / lookups:.0f}% hit rate)" if lookups else ""
+        similar = f" ({self.similar_hits} similar)" if self.similar_hits else ""
+        return f"Cache: {self.hits} hits{similar} / {self.misses} misses{rate}"
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
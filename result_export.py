@@ -0,0 +1,129 @@
+"""Streaming export of results with their per-prompt metadata.
+
+Every exporter takes one row at a time and writes it through a buffered file
+(Parquet: in row groups), so a run can be exported while it is going and a
+finished run is written in one pass without building the whole dataset in
+memory. The format follows the file extension:
+
+    .txt      the outputs only, one per line (what Save Output always wrote)
+    .jsonl    one JSON object per row
+    .csv      one row per prompt, header first
+    .parquet  needs pyarrow - pip install pyarrow
+
+Each row maps the source prompt to its output, so downstream tooling never
+has to parse text files to match them up.
+"""
+import csv
+import json
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+EXPORT_DIR = "exports"
+BUFFER_BYTES = 1024 * 1024
+PARQUET_ROW_GROUP = 5000
+
+FIELDS = ("index", "prompt", "output", "count", "unit", "attempts", "retries",
+          "tokens", "latency", "model", "language", "mode")
+
+
+def export_row(index, prompt, output, meta, info=None):
+    """One export row: run-level `info` plus the row's own metadata"""
+    row = dict(info or {}, index=index, prompt=prompt, output=output, **meta)
+    row.setdefault("retries", max(0, row.get("attempts", 0) - 1))
+    return row
+
+
+class TextExporter:
+    """Outputs only, one per line"""
+
+    def __init__(self, path):
+        self._file = open(path, "w", encoding="utf-8", buffering=BUFFER_BYTES)
+        self._first = True
+
+    def write(self, row):
+        if not self._first:
+            self._file.write("\n")
+        self._file.write(row["output"])
+        self._first = False
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JsonlExporter(TextExporter):
+    def write(self, row):
+        self._file.write(json.dumps({key: row.get(key) for key in FIELDS}, ensure_ascii=False) + "\n")
+
+
+class CsvExporter(TextExporter):
+    def __init__(self, path):
+        # utf-8-sig so spreadsheet apps pick up the Chinese text correctly
+        self._file = open(path, "w", encoding="utf-8-sig", newline="", buffering=BUFFER_BYTES)
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDS, extrasaction="ignore")
+        self._writer.writeheader()
+
+    def write(self, row):
+        self._writer.writerow(row)
+
+
+class ParquetExporter(TextExporter):
+    """Buffers PARQUET_ROW_GROUP rows and writes each batch as a row group"""
+
+    def __init__(self, path):
+        if pq is None:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+        self._schema = pa.schema([
+            ("index", pa.int64()), ("prompt", pa.string()), ("output", pa.string()),
+            ("count", pa.int64()), ("unit", pa.string()), ("attempts", pa.int64()),
+            ("retries", pa.int64()), ("tokens", pa.int64()), ("latency", pa.float64()),
+            ("model", pa.string()), ("language", pa.string()), ("mode", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._rows = []
+
+    def write(self, row):
+        self._rows.append({key: row.get(key) for key in FIELDS})
+        if len(self._rows) >= PARQUET_ROW_GROUP:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(pa.Table.from_pylist(self._rows, schema=self._schema))
+            self._rows = []
+
+    def close(self):
+        if self._writer is not None:
+            self._flush()
+            self._writer.close()
+            self._writer = None
+
+
+EXPORTERS = {".txt": TextExporter, ".jsonl": JsonlExporter, ".csv": CsvExporter,
+             ".parquet": ParquetExporter}
+
+
+def available_formats():
+    """Export formats usable here, as extensions without the dot"""
+    return [ext[1:] for ext in EXPORTERS if ext != ".parquet" or pq is not None]
+
+
+def open_exporter(path):
+    """Exporter for `path`, picked by its extension (anything unknown is plain text)"""
+    exporter = EXPORTERS.get(os.path.splitext(path)[1].lower(), TextExporter)
+    return exporter(path)
+
+
+def export_path(language, mode, stamp, file_format, directory=EXPORT_DIR):
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{language}-{mode}-{stamp}.{file_format}")
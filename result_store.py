@@ -0,0 +1,110 @@
+"""Compact store for the results of a run, kept outside the Tk text widget.
+
+The output pane used to be the only copy of the results, which meant reading
+the whole widget back to append a line or to save. A ResultStore keeps the
+text of each result and its source prompt in an anonymous spool file on disk,
+and only per-row offsets and metadata in memory (typed arrays, a few dozen
+bytes per row), so appending and looking up a row cost the same at row
+50,000 as at row 1.
+"""
+import tempfile
+import threading
+from array import array
+
+# Spooled text is kept in memory until it grows past this, then moves to disk
+SPOOL_MEMORY_BYTES = 4 * 1024 * 1024
+
+
+class ResultStore:
+    """Append-only rows of (text, prompt, count, attempts, tokens, latency, model, input index).
+
+    `info` holds run-level fields (language, mode, unit) shared by every row.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spool = None
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            if self._spool is not None:
+                self._spool.close()
+            self._spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+            self._offsets = array("q")
+            self._sizes = array("l")
+            self._prompt_sizes = array("l")
+            self._counts = array("l")
+            self._attempts = array("h")
+            self._tokens = array("l")
+            self._latency = array("f")
+            self._model_ids = array("H")
+            self._inputs = array("q")  # Input index; a fan-out run has several rows per input
+            self._models = []
+            self.info = {}
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def append(self, text, prompt="", count=0, attempts=0, tokens=0, latency=0.0, model="", input_index=None):
+        """Add the next row and return its index; `input_index` defaults to the row's own"""
+        data = text.encode("utf-8")
+        prompt_data = prompt.encode("utf-8")
+        with self._lock:
+            self._spool.seek(0, 2)
+            self._offsets.append(self._spool.tell())
+            self._sizes.append(len(data))
+            self._prompt_sizes.append(len(prompt_data))
+            self._spool.write(data)
+            self._spool.write(prompt_data)
+            self._counts.append(count)
+            self._attempts.append(attempts)
+            self._tokens.append(tokens)
+            self._latency.append(latency)
+            if model not in self._models:
+                self._models.append(model)
+            self._model_ids.append(self._models.index(model))
+            self._inputs.append(len(self._offsets) - 1 if input_index is None else input_index)
+            return len(self._offsets) - 1
+
+    def _read(self, index):
+        self._spool.seek(self._offsets[index])
+        return self._spool.read(self._sizes[index]).decode("utf-8")
+
+    def text(self, index):
+        with self._lock:
+            return self._read(index)
+
+    def prompt(self, index):
+        """Source prompt of a row (stored right after its text)"""
+        with self._lock:
+            self._spool.seek(self._offsets[index] + self._sizes[index])
+            return self._spool.read(self._prompt_sizes[index]).decode("utf-8")
+
+    def texts(self, start=0, stop=None):
+        """Text of rows start..stop, one spool read per row"""
+        with self._lock:
+            stop = len(self._offsets) if stop is None else min(stop, len(self._offsets))
+            return [self._read(i) for i in range(max(0, start), stop)]
+
+    def meta(self, index):
+        """Per-row metadata; retries is attempts beyond the first"""
+        with self._lock:
+            attempts = self._attempts[index]
+            return {
+                "count": self._counts[index],
+                "attempts": attempts,
+                "retries": max(0, attempts - 1),
+                "tokens": self._tokens[index],
+                "latency": round(self._latency[index], 3),
+                "model": self._models[self._model_ids[index]],
+            }
+
+    def rows(self):
+        """Iterate (input index, prompt, text, meta) without holding every row in memory"""
+        for index in range(len(self)):
+            yield self._inputs[index], self.prompt(index), self.text(index), self.meta(index)
+
+    def close(self):
+        with self._lock:
+            self._spool.close()
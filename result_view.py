@@ -0,0 +1,165 @@
+"""Virtualized output pane over a ResultStore.
+
+Only a window of PAGE_ROWS rows around the scroll position is ever inserted
+into the Text widget, so the widget stays small no matter how long the run
+is and adding a result costs the same at row 50,000 as at row 1. The Text
+scrolls natively inside the window; when it reaches either edge the window
+slides by half a page, keeping the line at the top of the view in place. The
+scrollbar is driven from the row position in the whole store rather than
+from the widget.
+
+While the view is at the bottom it follows new results, and the streamed
+draft of the prompt in progress is shown after the last row.
+"""
+import bisect
+import tkinter as tk
+
+# Rows rendered into the widget at a time - enough to overflow the pane so
+# it always has something to scroll
+PAGE_ROWS = 40
+
+
+def _position(index):
+    line, column = index.split(".")
+    return int(line), int(column)
+
+
+class ResultView:
+    """Renders the visible slice of `store` into `text`, scrolled by `scrollbar`"""
+
+    def __init__(self, text, scrollbar, store, page_rows=PAGE_ROWS):
+        self.text = text
+        self.scrollbar = scrollbar
+        self.store = store
+        self.page_rows = page_rows
+        self.top = 0          # First store row in the widget
+        self.end = 0          # One past the last store row in the widget
+        self.starts = []      # Widget position of each rendered row
+        self.follow = True
+        self.draft = ""
+        self._view = (0.0, 1.0)
+        self._shift_pending = False
+        text.config(yscrollcommand=self._on_text_scroll)
+        scrollbar.config(command=self._on_scrollbar)
+
+    # Rendering
+
+    def reset(self):
+        """Forget everything shown - call after clearing the store"""
+        self.top = self.end = 0
+        self.follow = True
+        self.draft = ""
+        self._render(0)
+
+    def refresh(self):
+        """Pick up rows added to the store since the last call"""
+        total = len(self.store)
+        if total == self.end:
+            return
+        if self.follow:
+            self._render(max(0, total - self.page_rows))
+        elif self.end - self.top < self.page_rows:
+            # The window still has room and shows the tail - fill it up in place
+            self._render(self.top, anchor=self._anchor())
+        else:
+            self._update_scrollbar()
+
+    def _render(self, top, anchor=None):
+        total = len(self.store)
+        self.top = top
+        self.end = min(total, top + self.page_rows)
+        self.starts = []
+        self.text.delete("1.0", tk.END)
+        for i, row in enumerate(self.store.texts(self.top, self.end)):
+            if i:
+                self.text.insert(tk.END, "\n")
+            self.starts.append(_position(self.text.index("end-1c")))
+            self.text.insert(tk.END, row)
+        if self.end == total and self.draft:
+            self._insert_draft(self.draft, first=True)
+        if self.follow:
+            self.text.see(tk.END)
+        elif anchor is not None and self.top <= anchor[0] < self.end:
+            row, offset = anchor
+            line, column = self.starts[row - self.top]
+            self.text.yview(f"{line}.{column} + {offset} chars")
+        self._update_scrollbar()
+
+    def _anchor(self):
+        """(row, character offset) of the text at the top of the view"""
+        if not self.starts:
+            return None
+        index = self.text.index("@0,0")
+        local = max(0, bisect.bisect_right(self.starts, _position(index)) - 1)
+        line, column = self.starts[local]
+        offset = self.text.count(f"{line}.{column}", index, "chars")
+        return self.top + local, offset[0] if offset else 0
+
+    # Streamed draft of the prompt in progress
+
+    def _insert_draft(self, text, first):
+        if first and self.end > self.top:
+            self.text.insert(tk.END, "\n", ("draft",))
+        self.text.insert(tk.END, text, ("draft",))
+
+    def _shows_tail(self):
+        return self.end == len(self.store)
+
+    def clear_draft(self):
+        self.draft = ""
+        ranges = self.text.tag_ranges("draft")
+        if ranges:
+            self.text.delete(ranges[0], ranges[-1])
+
+    def extend_draft(self, text):
+        first = not self.draft
+        self.draft += text
+        if self._shows_tail():
+            self._insert_draft(text, first)
+            if self.follow:
+                self.text.see(tk.END)
+
+    # Scrolling
+
+    def _update_scrollbar(self):
+        total = len(self.store)
+        shown = self.end - self.top
+        if not total or not shown:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        first, last = self._view
+        self.scrollbar.set((self.top + first * shown) / total, (self.top + last * shown) / total)
+
+    def _on_text_scroll(self, first, last):
+        self._view = (float(first), float(last))
+        at_bottom = self._view[1] >= 1.0 and self._shows_tail()
+        self.follow = at_bottom
+        self._update_scrollbar()
+        needs_shift = ((self._view[0] <= 0.0 and self.top > 0) or
+                       (self._view[1] >= 1.0 and not self._shows_tail()))
+        if needs_shift and not self._shift_pending:
+            self._shift_pending = True
+            self.text.after_idle(self._shift_window)
+
+    def _shift_window(self):
+        self._shift_pending = False
+        first, last = self._view
+        half = max(1, self.page_rows // 2)
+        if last >= 1.0 and not self._shows_tail():
+            top = min(self.top + half, max(0, len(self.store) - self.page_rows))
+        elif first <= 0.0 and self.top > 0:
+            top = max(0, self.top - half)
+        else:
+            return
+        self._render(top, anchor=self._anchor())
+
+    def _on_scrollbar(self, action, *args):
+        total = len(self.store)
+        if action == "moveto" and total:
+            fraction = min(max(float(args[0]), 0.0), 1.0)
+            row = min(total - 1, int(fraction * total))
+            self.follow = fraction >= 1.0
+            top = min(max(0, row - self.page_rows // 2), max(0, total - self.page_rows))
+            self._render(top, anchor=(row, 0))
+        elif action == "scroll":
+            self.text.yview_scroll(int(args[0]), args[1])
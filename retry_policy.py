@@ -0,0 +1,51 @@
+"""Retry policies for generations that come back too short.
+
+A policy turns "the last attempt was N words short" into the next request.
+The generators give it the first request of the prompt, the final stream
+chunk of the last attempt, the cleaned text so far and the two ready-made
+retry prompts for their language, and get back (request_json, prefix): the
+request to send next and the text its output should be appended to.
+"""
+
+
+class RegenerateRetry:
+    """Start over: a fresh generation with the short output pasted in to expand"""
+
+    name = "regenerate"
+
+    def next_request(self, first_request, final_chunk, clean_prompt, prompts, missing_tokens):
+        request_json = dict(first_request)
+        request_json["prompt"] = prompts["expand"]
+        return request_json, ""
+
+
+class ContinueRetry:
+    """Carry on from the last attempt instead of regenerating it.
+
+    The request keeps the first one's system prompt and options, and its
+    prompt is the original input followed by the text so far and the
+    instruction to continue it. num_predict is cut down to the missing
+    length only, and the new text is appended to what we already have.
+    Ollama's `context` is not used: it is deprecated, and a request built
+    from it runs without the app's system prompt. Falls back to
+    RegenerateRetry when there is no usable text yet.
+    """
+
+    name = "continue"
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback or RegenerateRetry()
+
+    def next_request(self, first_request, final_chunk, clean_prompt, prompts, missing_tokens):
+        if not clean_prompt:
+            return self.fallback.next_request(first_request, final_chunk, clean_prompt,
+                                              prompts, missing_tokens)
+        request_json = dict(first_request)
+        # Same system prompt and opening as the first request, so the server's cached prefix still applies
+        request_json["prompt"] = f"{first_request['prompt']}\n\n{clean_prompt}\n\n{prompts['continue']}"
+        request_json["options"] = dict(first_request.get("options", {}), num_predict=missing_tokens)
+        return request_json, clean_prompt
+
+
+POLICIES = {policy.name: policy for policy in (RegenerateRetry(), ContinueRetry())}
+DEFAULT_RETRY_POLICY = POLICIES["continue"]
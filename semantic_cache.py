@@ -0,0 +1,370 @@
+"""Semantic cache: reuse the result of an earlier prompt that means the same.
+
+The result cache only hits on the exact same input, so "a red dragon, at
+dusk" misses on "At dusk, a red dragon". SemanticCache sits behind it: each
+input is embedded, and if an earlier input with the same model, system
+prompt, mode, language and options is close enough (cosine similarity at or
+above the threshold), that input's cached result is used.
+
+- Embeddings come from Ollama's /api/embed with an embedding model
+  (DRAGON_EMBED_MODEL, nomic-embed-text by default), or from HashingEmbedder,
+  a local stub of hashed words and character pairs that needs no model but
+  only catches reworded, not rephrased, prompts
+- Vectors are kept normalised as float32 rows in a file that is memory-mapped
+  with NumPy, one file per embedder, so the index survives restarts without
+  being read into memory. A small SQLite file maps each row to the result
+  cache key it stands for; the results themselves stay in the result cache
+- Up to EXACT_ROWS rows every row in scope is scored in one matrix product.
+  Past that, rows are bucketed with random-hyperplane LSH (TABLES tables of
+  BITS sign bits, per scope) and only the query's buckets are scored, which
+  keeps lookups well under a millisecond at a million entries at the cost of
+  missing a few matches near the threshold
+- The batch embeds the prompts of the engine's lookahead window in one
+  request (prefetch), so a lookup costs no /api/embed round trip of its own.
+  The search itself stays per prompt: it has to see the results that earlier
+  prompts of the same window stored, and it is a single matrix product
+
+Without NumPy the semantic cache is unavailable and only exact hits are served.
+"""
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+import zlib
+from array import array
+from collections import OrderedDict
+
+import requests
+
+from prompt_dedup import normalize
+
+try:
+    import numpy as np
+except ImportError:  # The semantic cache is optional
+    np = None
+
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_EMBED_MODEL = os.environ.get("DRAGON_EMBED_MODEL", "nomic-embed-text")
+DEFAULT_INDEX_DIR = "semantic_cache"
+
+HASHING_DIMENSIONS = 256
+PAIR_WEIGHT = 0.5         # Word pairs carry some order, at half the weight of words
+INITIAL_ROWS = 4096       # Rows the vector file starts with; it doubles when full
+EXACT_ROWS = 4096         # Largest index searched exhaustively
+TABLES = 8
+BITS = 14
+PLANE_SEED = 1
+PREFETCH_LIMIT = 4096     # Embedded prompts kept for their lookups
+
+_CJK = re.compile(r"[一-鿿]")
+
+
+def available():
+    return np is not None
+
+
+class HashingEmbedder:
+    """Local stand-in for an embedding model: hashed words and character pairs.
+
+    Word order, case and punctuation do not change the vector, and a changed
+    word only moves it a little. Synonyms are not caught - that needs a real
+    embedding model.
+    """
+
+    name = "local"
+
+    def __init__(self, dimensions=HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _features(self, text):
+        """(feature, weight) pairs - characters and their pairs for CJK, else words and word pairs"""
+        normalized = normalize(text)
+        if _CJK.search(normalized):
+            units = list(normalized.replace(" ", ""))
+            pairs = ["".join(pair) for pair in zip(units, units[1:])]
+        else:
+            units = normalized.split()
+            pairs = [f"{a} {b}" for a, b in zip(units, units[1:])]
+        return [(unit, 1.0) for unit in units] + [(pair, PAIR_WEIGHT) for pair in pairs]
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                # The sign bit keeps unrelated features from piling up in one direction
+                vectors[row, h % self.dimensions] += weight if h & 0x80000000 else -weight
+        return vectors
+
+
+class OllamaEmbedder:
+    """Embeddings from an Ollama embedding model through /api/embed"""
+
+    def __init__(self, client, model=DEFAULT_EMBED_MODEL):
+        self.client = client
+        self.model = model
+        self.name = model
+
+    def embed(self, texts):
+        return np.asarray(self.client.embed(self.model, list(texts)), dtype=np.float32)
+
+
+class VectorIndex:
+    """Normalised vectors in a memory-mapped file, searchable per scope"""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(f"{path}.sqlite3", check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (dimensions INTEGER NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS rows ("
+                         " row INTEGER PRIMARY KEY, scope TEXT NOT NULL, key TEXT NOT NULL)")
+        self._db.commit()
+        meta = self._db.execute("SELECT dimensions FROM meta").fetchone()
+        self.dimensions = meta[0] if meta else None
+        self.count = 0
+        self._scope_ids = {}
+        self._scopes = array("i")   # row -> scope id
+        self._buckets = {}          # (scope id, table, signature) -> rows
+        self._vectors = None
+        self._planes = None
+        if self.dimensions:
+            self._open(self.dimensions)
+
+    def _open(self, dimensions):
+        self.dimensions = dimensions
+        rng = np.random.default_rng(PLANE_SEED)
+        self._planes = rng.standard_normal((dimensions, TABLES * BITS)).astype(np.float32)
+        # A vector written before a crash but never committed is simply overwritten
+        self._scopes = array("i", (self._scope_id(scope) for (scope,) in
+                                   self._db.execute("SELECT scope FROM rows ORDER BY row")))
+        self.count = len(self._scopes)
+        capacity = INITIAL_ROWS
+        while capacity < self.count:
+            capacity *= 2
+        self._map(capacity)
+        if self.count > EXACT_ROWS:
+            self._rebuild_buckets()
+
+    def _map(self, capacity):
+        """(Re)map the vector file with room for `capacity` rows"""
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        path = f"{self.path}.f32"
+        size = capacity * self.dimensions * 4
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        capacity = os.path.getsize(path) // (self.dimensions * 4)
+        self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dimensions))
+
+    def _scope_id(self, scope):
+        return self._scope_ids.setdefault(scope, len(self._scope_ids))
+
+    def _signatures(self, vectors):
+        """One BITS-bit LSH signature per table for each vector"""
+        bits = (vectors @ self._planes > 0).reshape(len(vectors), TABLES, BITS)
+        return bits.astype(np.int64) @ (1 << np.arange(BITS, dtype=np.int64))
+
+    def _rebuild_buckets(self):
+        """Bucket every row, grouping with NumPy rather than one row at a time"""
+        self._buckets = {}
+        scopes = np.frombuffer(self._scopes, dtype=np.int32).astype(np.int64)
+        signatures = np.concatenate([self._signatures(self._vectors[start:start + 65536])
+                                     for start in range(0, self.count, 65536)])[:self.count]
+        for table in range(TABLES):
+            keys = (scopes << BITS) | signatures[:, table]
+            order = np.argsort(keys, kind="stable")
+            unique, starts = np.unique(keys[order], return_index=True)
+            for key, rows in zip(unique.tolist(), np.split(order, starts[1:])):
+                bucket = self._buckets[(key >> BITS, table, key & ((1 << BITS) - 1))] = array("q")
+                bucket.frombytes(rows.astype(np.int64).tobytes())
+
+    def key(self, row):
+        """The result cache key row `row` stands for"""
+        return self._db.execute("SELECT key FROM rows WHERE row = ?", (row,)).fetchone()[0]
+
+    def add(self, vectors, scope, keys):
+        """Append normalised `vectors` in `scope`, each standing for one of `keys`"""
+        if self.dimensions is None:
+            self._db.execute("INSERT INTO meta (dimensions) VALUES (?)", (vectors.shape[1],))
+            self._open(vectors.shape[1])
+        start, stop = self.count, self.count + len(vectors)
+        if stop > len(self._vectors):
+            capacity = len(self._vectors)
+            while capacity < stop:
+                capacity *= 2
+            self._map(capacity)
+        self._vectors[start:stop] = vectors
+        self._db.executemany("INSERT OR REPLACE INTO rows (row, scope, key) VALUES (?, ?, ?)",
+                             zip(range(start, stop), [scope] * len(keys), keys))
+        self._db.commit()
+        scope_id = self._scope_id(scope)
+        self._scopes.extend([scope_id] * len(vectors))
+        self.count = stop
+        if stop > EXACT_ROWS >= start:
+            self._rebuild_buckets()
+        elif start > EXACT_ROWS:
+            for row, signatures in enumerate(self._signatures(vectors).tolist(), start):
+                for table, signature in enumerate(signatures):
+                    self._buckets.setdefault((scope_id, table, signature), array("q")).append(row)
+
+    def search(self, vectors, scope):
+        """(row, similarity) of the closest row in `scope` for each query vector, or None each"""
+        scope_id = self._scope_ids.get(scope)
+        if scope_id is None or not self.count:
+            return [None] * len(vectors)
+        if self.count <= EXACT_ROWS:
+            # Every row at once - a single matrix product for the whole batch
+            scores = self._vectors[:self.count] @ vectors.T
+            scores[np.frombuffer(self._scopes, dtype=np.int32) != scope_id] = -np.inf
+            best = scores.argmax(axis=0)
+            return [(int(b), float(scores[b, n])) for n, b in enumerate(best)]
+        matches = []
+        for vector, signatures in zip(vectors, self._signatures(vectors).tolist()):
+            buckets = [np.frombuffer(self._buckets[bucket], dtype=np.int64)
+                       for bucket in ((scope_id, table, signature) for table, signature in enumerate(signatures))
+                       if bucket in self._buckets]
+            if not buckets:
+                matches.append(None)
+                continue
+            candidates = np.unique(np.concatenate(buckets))
+            scores = self._vectors[candidates] @ vector
+            best = int(scores.argmax())
+            matches.append((int(candidates[best]), float(scores[best])))
+        return matches
+
+    def close(self):
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        self._db.close()
+
+
+def _normalise(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _slug(name):
+    return re.sub(r"[^\w.-]+", "_", unicodedata.normalize("NFKC", name))
+
+
+class SemanticCache:
+    """Embedding lookups behind the result cache; a no-op until configured"""
+
+    def __init__(self, directory=DEFAULT_INDEX_DIR):
+        self.directory = directory
+        self.enabled = False
+        self.threshold = DEFAULT_THRESHOLD
+        self.embedder = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self._prefetched = OrderedDict()  # Prompt -> normalised vector
+        self.reset_stats()
+
+    def configure(self, enabled, threshold=DEFAULT_THRESHOLD, embedder=None):
+        """Start a run: turn the cache on or off and pick the embedder"""
+        self.enabled = enabled and available()
+        self.threshold = threshold
+        self.embedder = embedder or (HashingEmbedder() if available() else None)
+        self.error = None
+        with self._lock:
+            self._prefetched.clear()
+
+    def applies_to(self, is_enhancement):
+        # Generate mode wants fresh variety, so near-identical themes never share results
+        return self.enabled and is_enhancement and self.error is None
+
+    def _index(self):
+        name = _slug(self.embedder.name)
+        index = self._indexes.get(name)
+        if index is None:
+            os.makedirs(self.directory, exist_ok=True)
+            index = self._indexes[name] = VectorIndex(os.path.join(self.directory, name))
+        return index
+
+    def prefetch(self, prompts):
+        """Embed upcoming prompts in one request, ahead of their lookups"""
+        with self._lock:
+            prompts = [prompt for prompt in dict.fromkeys(prompts) if prompt not in self._prefetched]
+        if not prompts:
+            return
+        try:
+            vectors = _normalise(self.embedder.embed(prompts))
+        except (requests.RequestException, ValueError, KeyError) as e:
+            self.error = e
+            return
+        with self._lock:
+            self._prefetched.update(zip(prompts, vectors))
+            while len(self._prefetched) > PREFETCH_LIMIT:
+                self._prefetched.popitem(last=False)
+
+    def lookup(self, prompt, scope):
+        """Embed `prompt` (unless prefetched) and find its nearest earlier prompt in `scope`"""
+        with self._lock:
+            vector = self._prefetched.get(prompt)
+        if vector is None:
+            try:
+                vector = _normalise(self.embedder.embed([prompt]))[0]
+            except (requests.RequestException, ValueError, KeyError) as e:
+                # No embedding model on the server - fall back to exact hits for the run
+                self.error = e
+                return None
+        with self._lock:
+            match = self._index().search(vector[None, :], scope)[0]
+            key = None
+            if match is not None and match[1] >= self.threshold:
+                key = self._index().key(match[0])
+            self.lookups += 1
+        return SemanticLookup(self, vector, scope, key, match[1] if match else None)
+
+    def _store(self, vector, scope, key):
+        with self._lock:
+            self._index().add(vector[None, :], scope, [key])
+            self.stores += 1
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def reset_stats(self):
+        self.lookups = self.hits = self.stores = 0
+
+    def summary(self):
+        if not self.enabled:
+            return ""
+        if self.error is not None:
+            return f"Semantic cache: off for this run ({self.error})"
+        return f"Semantic cache: {self.hits} hits / {self.lookups} lookups ({self.embedder.name})"
+
+    def close(self):
+        with self._lock:
+            for index in self._indexes.values():
+                index.close()
+            self._indexes.clear()
+
+
+class SemanticLookup:
+    """One prompt's embedding and nearest match, kept until its result is stored"""
+
+    def __init__(self, cache, vector, scope, key, similarity):
+        self.cache = cache
+        self.vector = vector
+        self.scope = scope
+        self.key = key                # Result cache key of the match, if close enough
+        self.similarity = similarity
+
+    def hit(self, cached):
+        """Count the match as a hit if its result was still in the result cache"""
+        if cached is not None:
+            self.cache.record_hit()
+        return cached
+
+    def store(self, key):
+        """Index this prompt under the result cache key its result was stored at"""
+        self.cache._store(self.vector, self.scope, key)
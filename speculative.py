@@ -0,0 +1,251 @@
+"""Speculative candidates: several attempts at one prompt at the same time.
+
+The generators retry one after another, so a prompt whose first result
+comes back 180 words long waits for a whole second generation.
+SpeculativeGenerator starts K attempts at once instead, each with its own
+seed, and uses one that passes the length and completion checks:
+
+- "first": the first candidate to pass wins and the others are hung up on
+  mid-stream, which makes Ollama stop decoding them
+- "best": every candidate runs to the end and the one closest to the middle
+  of the window wins
+
+If none of them passes, the longest one that is complete and at least as
+long as the generators accept on a retry is used, since K candidates stand
+in for K attempts. Failing that the prompt goes through the normal generator
+with its retries. This trades tokens for tail latency, so it is meant for small
+interactive runs rather than big batches. SpeculativeStats shows the tokens
+spent against the p95 latency saved.
+"""
+import logging
+import queue
+import random
+import threading
+import time
+from array import array
+
+from generation_options import request_options
+from prompt_cleaning import clean_prompt_output
+from prompt_generators import (
+    CANCELLED_RESULT, DEFAULT_MODEL, PROMPTS, EndpointFailover, build_request, generate_chinese_prompt,
+    generate_single_prompt, result_cache, stream_generation
+)
+from prompt_validation import ENDINGS, WINDOWS, measure, validate_item
+from result_cache import make_key
+from stream_guard import BUDGET, CANCELLED, StreamGuard
+from telemetry import percentile
+
+DEFAULT_CANDIDATES = 3
+CANCEL_POLICIES = ("first", "best")
+DEFAULT_CANCEL_POLICY = "first"
+
+# Seed offset between candidates when the profile pins a seed
+SEED_STRIDE = 1000003
+
+# Shortest complete result the generators accept once they have retried
+RETRY_MINIMUM = {"english": 150, "chinese": 80}  # words / characters
+
+# The normal generator, for prompts no candidate passed
+SINGLE = {"english": generate_single_prompt, "chinese": generate_chinese_prompt}
+
+
+class SpeculativeStats:
+    """Latency won against tokens spent, over one run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.prompts = 0
+            self.won = 0            # Prompts a candidate other than the first one won
+            self.fell_back = 0      # Prompts no candidate passed
+            self.tokens = 0         # Every candidate's
+            self.winner_tokens = 0  # The winners' only; a retried prompt has none
+            self.latencies = array("f")
+            self.sequential = array("f")
+
+    def add_tokens(self, tokens):
+        """Add the tokens one candidate streamed, winner or not"""
+        with self._lock:
+            self.tokens += tokens
+
+    def record(self, latency, sequential, winner_tokens, winner):
+        """Add one prompt.
+
+        `sequential` estimates how long the prompt would have taken one
+        attempt at a time: the first candidate's time if it passed, plus the
+        winner's time for a retry if it failed, and no saving at all when the
+        first candidate had not finished or was cancelled.
+        """
+        with self._lock:
+            self.prompts += 1
+            self.won += winner not in (None, 0)
+            self.fell_back += winner is None
+            self.winner_tokens += winner_tokens
+            self.latencies.append(latency)
+            self.sequential.append(sequential)
+
+    def summary(self):
+        with self._lock:
+            if not self.prompts:
+                return "Speculative: none"
+            p95 = percentile(sorted(self.latencies), 0.95)
+            sequential_p95 = percentile(sorted(self.sequential), 0.95)
+            extra = self.tokens - self.winner_tokens
+            spent = f" ({self.tokens / self.winner_tokens:.1f}x)" if self.winner_tokens else ""
+            return (f"Speculative: p95 {p95:.1f}s vs ~{sequential_p95:.1f}s one at a time, "
+                    f"+{extra} tokens{spent}, "
+                    f"{self.won} won by a later candidate, {self.fell_back} retried")
+
+
+class _Candidate:
+    def __init__(self, number):
+        self.number = number
+        self.result = None    # (prompt, count) if it passed
+        self.short = None     # (prompt, count) if it is short but would pass on a retry
+        self.stopped = None
+        self.tokens = 0
+        self.elapsed = None   # Seconds until it finished, passed or not
+
+
+class SpeculativeGenerator:
+    """Runs K seeded candidates per prompt and keeps one that passes"""
+
+    def __init__(self, language, candidates=DEFAULT_CANDIDATES, cancel_policy=DEFAULT_CANCEL_POLICY,
+                 stats=None):
+        if cancel_policy not in CANCEL_POLICIES:
+            raise ValueError(f"Unknown cancel policy {cancel_policy!r}, expected one of {CANCEL_POLICIES}")
+        self.language = language
+        self.candidates = max(1, candidates)
+        self.cancel_policy = cancel_policy
+        self.stats = stats or SpeculativeStats()
+
+    def __call__(self, base_prompt, is_enhancement=True, model=None, on_token=None, variant=None,
+                 retry_policy=None, report=None, cancel=None):
+        """Same arguments and result as generate_single_prompt"""
+        model = model or DEFAULT_MODEL
+        mode = "enhance" if is_enhancement else "generate"
+        report = report if report is not None else {}
+        system_prompt, template = PROMPTS[(self.language, mode)]
+        options, keep_alive = request_options(self.language, mode, variant)
+
+        cache_key = None
+        if result_cache.applies_to(is_enhancement):
+            cache_key = make_key(model, system_prompt, base_prompt, mode, self.language,
+                                 options, None if is_enhancement else variant)
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                report.update(attempts=0, tokens=0, cached=True)
+                return cached
+
+        # Candidate 0 sends exactly what the single path would
+        requests = []
+        for number in range(self.candidates):
+            candidate_options = dict(options)
+            if number:
+                candidate_options["seed"] = (options["seed"] + number * SEED_STRIDE if "seed" in options
+                                             else random.randrange(1 << 31))
+            requests.append(build_request(model, system_prompt, template.format(base_prompt),
+                                          candidate_options, keep_alive))
+
+        started = time.monotonic()
+        hang_up = threading.Event()
+        finished = queue.Queue()
+        candidates = [_Candidate(number) for number in range(self.candidates)]
+        for candidate, request_json in zip(candidates, requests):
+            threading.Thread(target=self._run, name=f"speculative-{candidate.number}", daemon=True,
+                             args=(candidate, request_json, (hang_up, cancel), finished, started,
+                                   on_token if candidate.number == 0 else None)).start()
+
+        winner = None
+        seen = []
+        middle = sum(WINDOWS[self.language]) / 2
+        while len(seen) < len(candidates):
+            candidate = finished.get()
+            seen.append(candidate)
+            if candidate.result is None:
+                continue
+            if self.cancel_policy == "first":
+                winner = candidate
+                hang_up.set()  # The others hang up on their next token
+                break
+            if winner is None or abs(candidate.result[1] - middle) < abs(winner.result[1] - middle):
+                winner = candidate
+        if winner is None:
+            short = [candidate for candidate in seen if candidate.short is not None]
+            winner = max(short, key=lambda candidate: candidate.short[1], default=None)
+            if winner is not None:
+                winner.result = winner.short
+        latency = time.monotonic() - started
+
+        # Candidates still hanging up are not waited for; their tokens are
+        # counted in the stats when they finish, not in this report
+        tokens = sum(candidate.tokens for candidate in seen)
+        report.update(attempts=self.candidates, tokens=tokens, cached=False, policy="speculative")
+        if winner is None and cancel is not None and cancel.is_set():
+            return CANCELLED_RESULT[self.language]
+        if winner is None:
+            single_report = {}
+            result = SINGLE[self.language](base_prompt, is_enhancement, model, on_token=on_token,
+                                           variant=variant, retry_policy=retry_policy, report=single_report,
+                                           cancel=cancel)
+            report["attempts"] += single_report.get("attempts", 0)
+            report["tokens"] += single_report.get("tokens", 0)
+            # The single path's tokens are real spending too; no saving is claimed
+            self.stats.add_tokens(single_report.get("tokens", 0))
+            latency = time.monotonic() - started
+            self.stats.record(latency, latency, 0, None)
+            return result
+
+        # Only candidates taken off the queue are known to have finished; one
+        # still running may have its result but not its timing yet
+        first = candidates[0]
+        if first not in seen or first.stopped == CANCELLED:
+            sequential = latency  # Outcome not known in time - claim no saving
+        elif first.result is not None:
+            sequential = first.elapsed
+        else:
+            sequential = first.elapsed + winner.elapsed  # The single path would have retried
+        self.stats.record(latency, sequential, winner.tokens, winner.number)
+        if on_token and winner.number:
+            on_token(None)
+            on_token(winner.result[0])
+        if cache_key is not None:
+            result_cache.put(cache_key, *winner.result)
+        return winner.result
+
+    def _run(self, candidate, request_json, cancel, finished, started, on_token):
+        high = WINDOWS[self.language][1]
+        guard = StreamGuard(max_words=high if self.language == "english" else None,
+                            max_chars=high if self.language == "chinese" else None,
+                            is_chinese=self.language == "chinese", cancel=cancel)
+        result = None
+        try:
+            text, candidate.stopped, final_chunk = stream_generation(request_json, guard, on_token)
+            candidate.tokens = final_chunk.get("eval_count", guard.chunks)
+            if candidate.stopped in (None, BUDGET):
+                # Past the budget, validate_item cuts it back and closes the sentence
+                result = validate_item(text, self.language)
+                if result is None:
+                    candidate.short = self._short(text)
+        except EndpointFailover:
+            candidate.tokens = guard.chunks
+        except Exception as e:
+            candidate.tokens = guard.chunks
+            if not any(event.is_set() for event in guard.cancel):  # A loser cut off is not worth reporting
+                logging.warning(f"Speculative candidate {candidate.number} failed: {e}")
+        finally:
+            # Timing first, so a result is never seen without it
+            candidate.elapsed = time.monotonic() - started
+            candidate.result = result
+            self.stats.add_tokens(candidate.tokens)
+            finished.put(candidate)
+
+    def _short(self, text):
+        clean = clean_prompt_output(text, is_chinese=self.language == "chinese")
+        count = measure(clean, self.language)
+        if count >= RETRY_MINIMUM[self.language] and clean.endswith(ENDINGS[self.language]):
+            return clean, count
+        return None
@@ -0,0 +1,118 @@
+"""Early termination for streaming generations.
+
+StreamGuard watches the text as it streams in and tells the generator to hang
+up as soon as the result is settled: either the cleaned text is already past
+the word/character budget (everything beyond it would be cut off anyway), or
+the output is clearly headed for rejection - a <think> block that cannot
+finish inside num_predict, or a conversational preamble instead of a prompt.
+Closing the response makes Ollama stop decoding for that request.
+"""
+import re
+import threading
+
+from prompt_cleaning import clean_prompt_output
+
+# Re-check the budget every this many streamed chunks (~tokens)
+CHECK_EVERY = 16
+
+# An open <think> block longer than this can't leave room for a full prompt
+# inside the num_predict budget, so the attempt is abandoned
+THINK_LIMIT_CHARS = 1500
+
+# How much cleaned text to wait for before judging the opening
+PREAMBLE_WINDOW_CHARS = 40
+
+PREAMBLE_PATTERN = re.compile(
+    r"(?:Sure|Certainly|Of course|Absolutely)\b[,!.]"
+    r"|I(?:'d be happy| would be happy| can't| cannot| won't| am unable)"
+    r"|As an AI"
+    r"|好的[，,！!。]|当然[，,！!。]|抱歉"
+)
+
+# Reasons a stream can be cut short. "budget" still yields a usable result;
+# the others mean the attempt is thrown away and retried.
+BUDGET = "budget"
+THINK = "think"
+PREAMBLE = "preamble"
+REJECT_REASONS = (THINK, PREAMBLE)
+# Another speculative candidate already won, or the run was stopped - the
+# attempt is simply dropped
+CANCELLED = "cancelled"
+
+
+class StreamGuard:
+    """Incremental validator for one streamed attempt"""
+
+    def __init__(self, max_words=None, max_chars=None, is_chinese=False, cancel=None):
+        self.max_words = max_words
+        self.max_chars = max_chars
+        self.is_chinese = is_chinese
+        # threading.Event, or several, that stop the stream when set
+        self.cancel = (cancel,) if isinstance(cancel, threading.Event) else tuple(e for e in cancel or () if e is not None)
+        self.chunks = 0
+        self._opening_checked = False
+
+    def check(self, text):
+        """Call after each streamed chunk with the text so far.
+
+        Returns None to keep reading, or the reason to stop.
+        """
+        self.chunks += 1
+        if any(event.is_set() for event in self.cancel):
+            return CANCELLED
+
+        # Runaway reasoning - cheap, so checked on every chunk
+        think_start = text.rfind("<think>")
+        if think_start != -1 and text.find("</think>", think_start) == -1:
+            if len(text) - think_start > THINK_LIMIT_CHARS:
+                return THINK
+            return None
+
+        if self.chunks % CHECK_EVERY and self._opening_checked:
+            return None
+
+        # Raw text can only shrink when cleaned, so skip cleaning until the
+        # raw length could possibly be over budget
+        over_raw = ((self.max_words and len(text.split()) > self.max_words) or
+                    (self.max_chars and len(text) > self.max_chars))
+        if self._opening_checked and not over_raw:
+            return None
+
+        clean = clean_prompt_output(text, is_chinese=self.is_chinese)
+        if not self._opening_checked and len(clean) >= PREAMBLE_WINDOW_CHARS:
+            self._opening_checked = True
+            if PREAMBLE_PATTERN.match(clean):
+                return PREAMBLE
+        if self.max_words and len(clean.split()) > self.max_words:
+            return BUDGET
+        if self.max_chars and len(clean.replace(" ", "")) > self.max_chars:
+            return BUDGET
+        return None
+
+
+class StreamStats:
+    """Per-run counters of early stops and the decode work they saved"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.aborts = {BUDGET: 0, THINK: 0, PREAMBLE: 0, CANCELLED: 0}
+            self.tokens_saved = 0
+
+    def record(self, reason, num_predict, chunks_seen):
+        # Each streamed chunk is roughly one token; without the guard the
+        # server would have kept going until num_predict at worst
+        with self._lock:
+            self.aborts[reason] += 1
+            self.tokens_saved += max(0, num_predict - chunks_seen)
+
+    def summary(self):
+        with self._lock:
+            total = sum(self.aborts.values())
+            if not total:
+                return "Early stops: none"
+            detail = ", ".join(f"{count} {reason}" for reason, count in self.aborts.items() if count)
+            return f"Early stops: {total} ({detail}), ~{self.tokens_saved} tokens saved"
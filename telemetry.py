@@ -0,0 +1,177 @@
+"""Per-request performance numbers from Ollama's final stream chunk.
+
+The closing "done" chunk of every /api/generate stream carries the server's
+own timings (nanoseconds): load_duration (model load), prompt_eval_count /
+prompt_eval_duration (reading the prompt) and eval_count / eval_duration
+(decoding), plus total_duration. RunTelemetry adds them up for the run,
+together with the client-side latency and attempts of each prompt, so it is
+clear whether a slow run is decode bound, prompt-eval bound or stalled on
+model reloads. The warm-up load before the first prompt is kept apart from
+the run's own numbers. MetricsWriter keeps a JSON snapshot of it on disk during the
+run for other tools to watch.
+"""
+import json
+import math
+import os
+import threading
+import time
+from array import array
+
+METRICS_DIR = "metrics"
+METRICS_INTERVAL = 2.0  # Seconds between metrics file rewrites
+
+# A load_duration above this means the model was (re)loaded for the request
+LOAD_STALL_SECONDS = 1.0
+
+NS = 1e9
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+class RunTelemetry:
+    """Thread-safe running totals for one batch"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.monotonic()
+            self.requests = 0
+            self.cut_short = 0  # Streams we hung up on before the final chunk
+            self.warmup_s = 0.0  # Loading the model before the first prompt
+            self.load_ns = 0
+            self.load_stalls = 0
+            self.prompt_eval_count = 0
+            self.prompt_eval_ns = 0
+            self.eval_count = 0
+            self.eval_ns = 0
+            self.total_ns = 0
+            self.prompts = 0
+            self.cached = 0
+            self.retries = 0
+            self.latencies = array("f")
+
+    def record_warmup(self, seconds):
+        """Add the time spent loading the model before the run started"""
+        with self._lock:
+            self.warmup_s += seconds
+
+    def record_request(self, final_chunk):
+        """Add one streamed attempt; final_chunk is {} if it was cut short"""
+        with self._lock:
+            self.requests += 1
+            if not final_chunk:
+                self.cut_short += 1
+                return
+            load_ns = final_chunk.get("load_duration", 0)
+            self.load_ns += load_ns
+            if load_ns > LOAD_STALL_SECONDS * NS:
+                self.load_stalls += 1
+            self.prompt_eval_count += final_chunk.get("prompt_eval_count", 0)
+            self.prompt_eval_ns += final_chunk.get("prompt_eval_duration", 0)
+            self.eval_count += final_chunk.get("eval_count", 0)
+            self.eval_ns += final_chunk.get("eval_duration", 0)
+            self.total_ns += final_chunk.get("total_duration", 0)
+
+    def record_prompt(self, attempts, latency, cached=False):
+        """Add one finished prompt with its client-side latency in seconds"""
+        with self._lock:
+            self.prompts += 1
+            if cached:
+                self.cached += 1
+                return
+            self.retries += max(0, attempts - 1)
+            self.latencies.append(latency)
+
+    def snapshot(self):
+        """Aggregates so far, as a JSON-ready dict"""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            generated = len(latencies)
+            elapsed = time.monotonic() - self.started - self.warmup_s
+            server_ns = self.load_ns + self.prompt_eval_ns + self.eval_ns
+            shares = {
+                "model load": self.load_ns / server_ns if server_ns else 0.0,
+                "prompt eval": self.prompt_eval_ns / server_ns if server_ns else 0.0,
+                "decode": self.eval_ns / server_ns if server_ns else 0.0,
+            }
+            return {
+                "elapsed_s": round(elapsed, 2),
+                "prompts": self.prompts,
+                "cached": self.cached,
+                "prompts_per_s": round(self.prompts / elapsed, 3) if elapsed else 0.0,
+                "requests": self.requests,
+                "cut_short": self.cut_short,
+                "retries_per_prompt": round(self.retries / generated, 3) if generated else 0.0,
+                "latency_s": {
+                    "p50": round(percentile(latencies, 0.50), 3),
+                    "p95": round(percentile(latencies, 0.95), 3),
+                    "p99": round(percentile(latencies, 0.99), 3),
+                    "max": round(latencies[-1], 3) if latencies else 0.0,
+                },
+                "decode_tokens": self.eval_count,
+                "decode_tokens_per_s": round(self.eval_count / (self.eval_ns / NS), 1) if self.eval_ns else 0.0,
+                "prompt_eval_tokens": self.prompt_eval_count,
+                "prompt_eval_tokens_per_s": (round(self.prompt_eval_count / (self.prompt_eval_ns / NS), 1)
+                                             if self.prompt_eval_ns else 0.0),
+                "warmup_s": round(self.warmup_s, 2),
+                "load_stalls": self.load_stalls,
+                "load_s": round(self.load_ns / NS, 2),
+                "server_s": round(self.total_ns / NS, 2),
+                "server_time_share": {name: round(share, 3) for name, share in shares.items()},
+                "bound_by": max(shares, key=shares.get) if server_ns else None,
+            }
+
+
+def format_stats(snapshot):
+    """A few lines for the stats panel"""
+    latency = snapshot["latency_s"]
+    lines = [
+        f"{snapshot['prompts']} prompts ({snapshot['cached']} cached), "
+        f"{snapshot['prompts_per_s']:.2f}/s, {snapshot['retries_per_prompt']:.2f} retries/prompt",
+        f"Latency p50 {latency['p50']:.1f}s  p95 {latency['p95']:.1f}s  p99 {latency['p99']:.1f}s",
+        f"Decode {snapshot['decode_tokens_per_s']:.0f} tok/s, "
+        f"prompt eval {snapshot['prompt_eval_tokens_per_s']:.0f} tok/s",
+        f"Model loads: warm-up {snapshot['warmup_s']:.1f}s, "
+        f"{snapshot['load_stalls']} stalls mid-run ({snapshot['load_s']:.1f}s)",
+    ]
+    if snapshot["bound_by"]:
+        share = snapshot["server_time_share"][snapshot["bound_by"]]
+        lines.append(f"Server time mostly {snapshot['bound_by']} ({share:.0%})")
+    return "\n".join(lines)
+
+
+class MetricsWriter:
+    """Rewrites a metrics JSON file at most every METRICS_INTERVAL seconds"""
+
+    def __init__(self, path, telemetry, info=None):
+        self.path = path
+        self.telemetry = telemetry
+        self.info = info or {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._last_write = 0.0
+
+    def maybe_write(self):
+        if time.monotonic() - self._last_write >= METRICS_INTERVAL:
+            self.write()
+
+    def write(self, finished=False):
+        # Write-then-rename so a reader never sees a half-written file
+        data = dict(self.info, finished=finished, updated=time.time(), **self.telemetry.snapshot())
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self._last_write = time.monotonic()
+
+
+def metrics_path(language, mode, stamp, directory=METRICS_DIR):
+    return os.path.join(directory, f"{language}-{mode}-{stamp}.json")
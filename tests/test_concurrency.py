@@ -0,0 +1,29 @@
+from concurrency import AdaptiveLimiter
+
+
+def test_configure_keeps_slots_held_by_an_earlier_run():
+    limiter = AdaptiveLimiter()
+    limiter.configure(True, 8)
+    old = limiter.slot()
+    old.__enter__()
+    assert limiter.in_flight == 1
+
+    # A new run starts while the stopped run's stream is still hanging up
+    limiter.configure(True, 8)
+    assert limiter.in_flight == 1
+    with limiter.slot() as request:
+        request.finished({"eval_count": 10}, 1)
+        assert limiter.in_flight == 2
+    assert limiter.window_requests == 1 and limiter.window_tokens == 10
+
+    old.__exit__(None, None, None)
+    assert limiter.in_flight == 0
+    # The old stream is not counted as one of the new run's requests
+    assert limiter.window_requests == 1 and limiter.window_tokens == 10
+
+
+def test_disabled_limiter_holds_no_slots():
+    limiter = AdaptiveLimiter()
+    with limiter.slot():
+        assert limiter.in_flight == 0
+    assert limiter.in_flight == 0
@@ -0,0 +1,96 @@
+import pytest
+
+import endpoint_pool
+import prompt_generators
+from endpoint_pool import EndpointPool
+from mock_ollama import MockConfig, MockOllama
+from result_cache import ResultCache
+
+MODEL = prompt_generators.DEFAULT_MODEL
+REQUEST = {"model": MODEL, "prompt": "a dragon", "options": {"num_predict": 10}, "stream": True}
+
+
+@pytest.fixture
+def cluster():
+    """Start a mock server per MockConfig and a pool over them; all are shut down afterwards"""
+    started, pools = [], []
+
+    def start(*configs, **pool_options):
+        servers = [MockOllama(config).start() for config in configs]
+        started.extend(servers)
+        pools.append(EndpointPool([server.url for server in servers], **pool_options))
+        return servers, pools[-1]
+
+    yield start
+    for pool in pools:
+        pool.close()  # Before the servers, which wait for open connections
+    for server in started:
+        server.stop()
+
+
+@pytest.fixture
+def no_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(prompt_generators, "result_cache",
+                        ResultCache(path=str(tmp_path / "cache.sqlite3"), enabled=False))
+
+
+def test_requests_go_to_the_server_with_the_fewest_in_flight(cluster):
+    (a, b), pool = cluster(MockConfig(models=[MODEL]), MockConfig(models=[MODEL]))
+    first = pool.generate(REQUEST)
+    second = pool.generate(REQUEST)
+    assert first.endpoint is not second.endpoint
+    first.close()
+    # The first server is free again, so it takes the next request
+    third = pool.generate(REQUEST)
+    assert third.endpoint is first.endpoint
+    second.close()
+    third.close()
+    assert [e.outstanding for e in pool.endpoints] == [0, 0]
+
+
+def test_stream_dropped_mid_way_fails_over_to_another_server(cluster, no_cache, monkeypatch):
+    (a, b), pool = cluster(MockConfig(models=[MODEL], length="fixed:260", drop_rate=1.0, seed=1),
+                           MockConfig(models=[MODEL], length="fixed:260", seed=1))
+    monkeypatch.setattr(prompt_generators, "ollama", pool)
+    report = {}
+    prompt, count = prompt_generators.generate_single_prompt("a red dragon", report=report)
+    assert 225 <= count <= 300
+    assert report["attempts"] == 1  # The failed stream was not counted as a retry
+    assert (a.config.requests, b.config.requests) == (1, 1)
+    assert pool.endpoints[0].failures == 1 and pool.endpoints[1].served == 1
+
+
+def test_no_failover_to_a_server_without_the_model(cluster, no_cache, monkeypatch):
+    (a, b), pool = cluster(MockConfig(models=[MODEL], length="fixed:260", drop_rate=1.0, seed=1),
+                           MockConfig(models=["other:latest"], seed=1))
+    pool.list_models()
+    monkeypatch.setattr(prompt_generators, "ollama", pool)
+    prompt, count = prompt_generators.generate_single_prompt("a red dragon")
+    assert count == 0 and prompt.startswith("[Error generating prompt")
+    # Every drop counted as a retry, so it gave up after three
+    assert a.config.requests == 3 and b.config.requests == 0
+
+
+def test_failovers_are_capped_when_every_server_keeps_dropping(cluster, no_cache, monkeypatch):
+    monkeypatch.setattr(endpoint_pool, "RECHECK_AFTER", 0.0)  # Failed servers are retried at once
+    (a, b), pool = cluster(*[MockConfig(models=[MODEL], length="fixed:260", drop_rate=1.0, seed=1)
+                             for _ in range(2)])
+    monkeypatch.setattr(prompt_generators, "ollama", pool)
+    prompt, count = prompt_generators.generate_chinese_prompt("一条红龙")
+    assert count == 0 and prompt.startswith("[生成提示词时出错")
+    assert a.config.requests + b.config.requests == prompt_generators.MAX_FAILOVERS + 1
+
+
+@pytest.mark.parametrize("merge, expected", [("union", ["m1", "m2", "m3"]), ("intersection", ["m2"])])
+def test_model_lists_merge(cluster, merge, expected):
+    _, pool = cluster(MockConfig(models=["m1", "m2"], embed_models=()),
+                      MockConfig(models=["m2", "m3"], embed_models=()), model_merge=merge)
+    assert pool.list_models() == expected
+    assert pool.endpoints[0].has_model("m1") and not pool.endpoints[1].has_model("m1")
+
+
+def test_embed_moves_past_a_server_without_the_embedding_model(cluster):
+    (a, b), pool = cluster(MockConfig(models=[MODEL], embed_models=()), MockConfig(models=[MODEL]))
+    embeddings = pool.embed("nomic-embed-text", ["a red dragon"])
+    assert len(embeddings) == 1
+    assert pool.endpoints[0].failures == 0 and pool.endpoints[1].served == 1
@@ -0,0 +1,20 @@
+import pytest
+
+import generation_options
+from generation_options import request_options
+
+
+@pytest.fixture
+def pinned_seed(monkeypatch):
+    monkeypatch.setattr(generation_options, "_overrides", {"english/enhance": {"seed": 42},
+                                                           "english/generate": {"seed": 42}})
+
+
+def test_generate_mode_offsets_the_seed_per_variation(pinned_seed):
+    assert request_options("english", "generate", 3)[0]["seed"] == 45
+    assert request_options("english", "generate")[0]["seed"] == 42
+
+
+def test_enhance_mode_seed_does_not_depend_on_the_input_position(pinned_seed):
+    assert request_options("english", "enhance", 0)[0] == request_options("english", "enhance", 7)[0]
+    assert request_options("english", "enhance", 7)[0]["seed"] == 42
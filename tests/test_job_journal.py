@@ -0,0 +1,63 @@
+import json
+
+from job_journal import Journal, journal_path, load_journal, run_key
+
+HEADER = {"language": "english", "mode": "enhance", "model": "m", "total": 3}
+
+
+def test_run_key_depends_on_settings_and_inputs():
+    key = run_key("english", "enhance", "m", ["a", "b"])
+    assert key == run_key("english", "enhance", "m", iter(["a", "b"]))
+    assert key != run_key("chinese", "enhance", "m", ["a", "b"])
+    assert key != run_key("english", "enhance", "other", ["a", "b"])
+    assert key != run_key("english", "enhance", "m", ["b", "a"])
+    assert key != run_key("english", "enhance", "m", ["a b"])
+
+
+def test_missing_journal_means_nothing_done(tmp_path):
+    assert load_journal(str(tmp_path / "none.jsonl")) == ({}, False)
+
+
+def test_records_are_replayed_on_resume(tmp_path):
+    path = journal_path("english", "enhance", "k", directory=str(tmp_path))
+    journal = Journal(path, HEADER)
+    journal.record(0, "a", "out a", 250, attempts=1)
+    journal.record(2, "c", "out c", 240, attempts=2)
+    journal.close()
+    done, finished = load_journal(path)
+    assert sorted(done) == [0, 2] and not finished
+    assert done[2]["output"] == "out c" and done[2]["attempts"] == 2
+
+    journal = Journal(path, HEADER, resume=True)
+    journal.record(1, "b", "out b", 260)
+    journal.close(finished=True)
+    done, finished = load_journal(path)
+    assert sorted(done) == [0, 1, 2] and finished
+
+
+def test_a_new_run_truncates_the_old_journal(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    journal = Journal(path, HEADER)
+    journal.record(0, "a", "out a", 250)
+    journal.close()
+    Journal(path, HEADER).close()
+    assert load_journal(path) == ({}, False)
+
+
+def test_a_torn_last_line_is_skipped_and_fenced_off(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    journal = Journal(path, HEADER)
+    journal.record(0, "a", "out a", 250)
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"type": "result", "index": 1, "outp')  # Crash mid-write
+    assert sorted(load_journal(path)[0]) == [0]
+
+    journal = Journal(path, HEADER, resume=True)
+    journal.record(1, "b", "out b", 260)
+    journal.close()
+    assert sorted(load_journal(path)[0]) == [0, 1]
+    with open(path, encoding="utf-8") as f:
+        records = [line for line in f if line.strip()]
+    assert sum(1 for line in records if line.startswith('{"type": "result", "index": 1, "outp')) == 1
+    json.loads(records[-1])
@@ -0,0 +1,27 @@
+from model_fanout import GB, plan_groups
+
+SIZES = {"big": 8 * GB, "mid": 4 * GB, "small": 2 * GB, "tiny": 1 * GB}
+
+
+def test_without_a_budget_every_model_runs_alone_in_picked_order():
+    assert plan_groups(["mid", "big", "mid", "small"], SIZES) == [["mid"], ["big"], ["small"]]
+
+
+def test_models_share_a_group_only_when_they_fit_together():
+    # First fit, biggest first: big (9.6) leaves room for tiny (1.2) only
+    groups = plan_groups(["tiny", "big", "small", "mid"], SIZES, vram_bytes=11 * GB)
+    assert groups == [["tiny", "big"], ["small", "mid"]]
+    for group in groups:
+        assert sum(SIZES[model] for model in group) * 1.2 <= 11 * GB
+
+
+def test_unknown_sizes_get_a_group_of_their_own():
+    groups = plan_groups(["small", "mystery", "tiny"], SIZES, vram_bytes=12 * GB)
+    assert ["mystery"] in groups
+    assert ["small", "tiny"] in groups
+
+
+def test_an_already_loaded_model_goes_first():
+    assert plan_groups(["big", "mid", "small"], SIZES, loaded={"small"}) == [["small"], ["big"], ["mid"]]
+    groups = plan_groups(["big", "mid", "small"], SIZES, vram_bytes=11 * GB, loaded={"mid"})
+    assert groups == [["mid", "small"], ["big"]]
@@ -0,0 +1,28 @@
+from endpoint_pool import EndpointPool
+from generation_options import get_profile, request_options
+from mock_ollama import MockConfig, MockOllama
+from model_warmup import PINNED, ModelPin
+
+MODEL = "mock:latest"
+
+
+def test_pin_runs_out_on_its_own_and_releases_once():
+    server = MockOllama(MockConfig(models=[MODEL])).start()
+    pool = EndpointPool([server.url])
+    try:
+        pin = ModelPin(pool, MODEL, "english", "enhance", unload_after=True)
+        pin.load()
+        assert MODEL in server.config.loaded
+        assert request_options("english", "enhance")[1] == PINNED
+
+        pin.release()
+        assert MODEL not in server.config.loaded
+        assert request_options("english", "enhance")[1] == get_profile("english", "enhance").get("keep_alive")
+
+        # A second release (the window closing after the batch) sends nothing
+        server.config.loaded.add(MODEL)
+        pin.release()
+        assert MODEL in server.config.loaded and not pin.errors
+    finally:
+        pool.close()
+        server.stop()
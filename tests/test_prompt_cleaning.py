@@ -0,0 +1,22 @@
+import pytest
+
+from bench_cleaning import build_corpus, legacy_clean_prompt_output
+from prompt_cleaning import clean_prompt_output
+
+
+@pytest.mark.parametrize("name, raw, is_chinese", build_corpus(), ids=[case[0] for case in build_corpus()])
+def test_matches_the_legacy_cleaner(name, raw, is_chinese):
+    assert clean_prompt_output(raw, is_chinese) == legacy_clean_prompt_output(raw, is_chinese)
+
+
+@pytest.mark.parametrize("raw", [
+    "",
+    "   ",
+    "Prompt: Prompt: twice prefixed",
+    "<b>bold</b> and <think>hidden</think> text",
+    "**Summary:** short\n**Prompt:** the prompt itself.",
+    "Thoughts: only thinking, no prompt",
+])
+def test_edge_cases_match_the_legacy_cleaner(raw):
+    for is_chinese in (False, True):
+        assert clean_prompt_output(raw, is_chinese) == legacy_clean_prompt_output(raw, is_chinese)
@@ -0,0 +1,45 @@
+import pytest
+
+from prompt_dedup import Deduper, lsh_bands, normalize
+
+BASE = ("A breathtaking ultra-wide panoramic vista of a bioluminescent fungal forest sprawling across a "
+        "fractured amethyst mesa, colossal crystalline structures piercing a swirling nebula sky")
+
+
+def verdicts(deduper, prompts):
+    return [deduper.check(position, prompt) for position, prompt in enumerate(prompts)]
+
+
+def test_normalize_ignores_case_width_punctuation_and_spacing():
+    assert normalize("  A Red   Dragon!! ") == normalize("a red dragon") == "a red dragon"
+    assert normalize("ＡＢＣ，龙") == normalize("abc 龙")
+
+
+def test_exact_repeats_point_at_the_first_occurrence():
+    deduper = Deduper()
+    assert verdicts(deduper, ["a red dragon", "a castle", "A red dragon.", "a red  DRAGON"]) == [None, None, 0, 0]
+    assert (deduper.unique, deduper.exact_repeats, deduper.near_repeats) == (2, 2, 0)
+
+
+def test_near_repeats_are_found_and_different_prompts_are_not():
+    deduper = Deduper(threshold=0.8)
+    prompts = [BASE, BASE.replace("swirling", "spiraling"), "a quiet harbour town at dawn, watercolour"]
+    assert verdicts(deduper, prompts) == [None, 0, None]
+    assert deduper.near_repeats == 1
+
+
+def test_exact_only_when_near_matching_is_off():
+    deduper = Deduper(near=False)
+    assert verdicts(deduper, [BASE, BASE.replace("swirling", "spiraling")]) == [None, None]
+
+
+@pytest.mark.parametrize("empty", ["", "   ", "...", "!?—", "。，"])
+def test_prompts_without_words_are_never_repeats(empty):
+    deduper = Deduper()
+    assert verdicts(deduper, [empty, empty, "!!!", empty]) == [None, None, None, None]
+    assert deduper.exact_repeats == deduper.near_repeats == 0
+
+
+def test_lsh_bands_divide_the_signature():
+    bands, rows = lsh_bands(0.9)
+    assert bands * rows == 32
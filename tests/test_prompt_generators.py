@@ -0,0 +1,38 @@
+import threading
+import time
+
+import pytest
+
+import prompt_generators
+from endpoint_pool import EndpointPool
+from mock_ollama import MockConfig, MockOllama
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def slow_server(tmp_path, monkeypatch):
+    """A mock server that takes seconds per prompt, and a fresh cache"""
+    server = MockOllama(MockConfig(models=[prompt_generators.DEFAULT_MODEL], token_delay=0.01,
+                                   length="fixed:400", chinese_length="fixed:400", seed=1)).start()
+    pool = EndpointPool([server.url])
+    monkeypatch.setattr(prompt_generators, "ollama", pool)
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(prompt_generators, "result_cache", cache)
+    yield server, cache
+    cache.close()
+    pool.close()
+    server.stop()
+
+
+@pytest.mark.parametrize("language, generate", [("english", prompt_generators.generate_single_prompt),
+                                                ("chinese", prompt_generators.generate_chinese_prompt)])
+def test_stop_hangs_up_the_stream_and_gives_up(slow_server, language, generate):
+    server, cache = slow_server
+    stop = threading.Event()
+    threading.Timer(0.2, stop.set).start()
+    started = time.monotonic()
+    report = {}
+    assert generate("a red dragon", report=report, cancel=stop) == prompt_generators.CANCELLED_RESULT[language]
+    assert time.monotonic() - started < 2.0  # The full stream takes 4s
+    assert report["attempts"] == 1 and server.config.requests == 1
+    assert cache.stores == 0
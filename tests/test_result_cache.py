@@ -0,0 +1,90 @@
+import pytest
+
+import prompt_generators
+from endpoint_pool import EndpointPool
+from mock_ollama import MockConfig, MockOllama
+from result_cache import ResultCache, make_key
+
+OPTIONS = {"temperature": 0.7}
+
+
+def test_key_changes_with_every_input():
+    base = make_key("m", "system", "prompt", "enhance", "english", OPTIONS)
+    assert base == make_key("m", "system", "prompt", "enhance", "english", dict(OPTIONS))
+    assert base != make_key("other", "system", "prompt", "enhance", "english", OPTIONS)
+    assert base != make_key("m", "other", "prompt", "enhance", "english", OPTIONS)
+    assert base != make_key("m", "system", "prompt.", "enhance", "english", OPTIONS)
+    assert base != make_key("m", "system", "prompt", "generate", "english", OPTIONS)
+    assert base != make_key("m", "system", "prompt", "enhance", "chinese", OPTIONS)
+    assert base != make_key("m", "system", "prompt", "enhance", "english", {"temperature": 0.8})
+    assert base != make_key("m", "system", "prompt", "enhance", "english", OPTIONS, variant=1)
+
+
+def test_get_put_and_counters(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"))
+    assert cache.get("k") is None
+    cache.put("k", "result", 250)
+    assert cache.get("k") == ("result", 250)
+    assert (cache.hits, cache.misses, cache.stores) == (1, 1, 1)
+    assert cache.get("k", count=False) == ("result", 250)
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.close()
+
+
+def test_similar_hit_turns_a_miss_into_a_hit(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"))
+    assert cache.get("other") is None
+    cache.record_similar_hit()
+    assert (cache.hits, cache.misses, cache.similar_hits) == (1, 0, 1)
+    assert cache.summary() == "Cache: 1 hits (1 similar) / 0 misses (100% hit rate)"
+    cache.close()
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"), enabled=False)
+    cache.put("k", "result", 250)
+    assert cache.get("k") is None
+    assert not (tmp_path / "cache.sqlite3").exists()
+
+
+def test_eviction_keeps_the_most_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr("result_cache.EVICT_EVERY", 5)
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"), max_entries=3)
+    for n in range(4):
+        cache.put(f"k{n}", f"r{n}", n)
+    cache.get("k0")  # Used again, so it outlives k1
+    cache.put("k4", "r4", 4)  # Fifth write - eviction runs
+    assert [cache.get(f"k{n}") is not None for n in range(5)] == [True, False, False, True, True]
+    cache.close()
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"), max_age_days=-1)
+    cache.put("k", "result", 250)
+    assert cache.get("k") is None
+    cache.close()
+
+
+@pytest.fixture
+def short_server(tmp_path, monkeypatch):
+    """A mock server whose results are always too short, and a fresh cache"""
+    server = MockOllama(MockConfig(models=[prompt_generators.DEFAULT_MODEL], length="fixed:5",
+                                    chinese_length="fixed:5", seed=1)).start()
+    monkeypatch.setattr(prompt_generators, "ollama", EndpointPool([server.url]))
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(prompt_generators, "result_cache", cache)
+    yield cache
+    cache.close()
+    server.stop()
+
+
+@pytest.mark.parametrize("generate", [prompt_generators.generate_single_prompt,
+                                      prompt_generators.generate_chinese_prompt])
+def test_rejected_results_are_not_cached(short_server, generate):
+    first = {}
+    generate("a red dragon", report=first)
+    assert first["attempts"] > 1 and not first["cached"]
+    assert short_server.stores == 0
+    again = {}
+    generate("a red dragon", report=again)
+    assert again["attempts"] > 0 and not again["cached"]
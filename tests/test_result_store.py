@@ -0,0 +1,21 @@
+from result_export import export_row
+from result_store import ResultStore
+
+
+def test_rows_carry_the_input_index_of_a_fan_out_run():
+    store = ResultStore()
+    for i in range(2):
+        for model in ("a", "b"):
+            store.append(f"{model}{i}", prompt=f"p{i}", count=1, model=model, input_index=i)
+    rows = [export_row(index, prompt, text, meta) for index, prompt, text, meta in store.rows()]
+    assert [(row["index"], row["model"], row["output"]) for row in rows] == [
+        (0, "a", "a0"), (0, "b", "b0"), (1, "a", "a1"), (1, "b", "b1")]
+    store.close()
+
+
+def test_input_index_defaults_to_the_row():
+    store = ResultStore()
+    store.append("x")
+    store.append("y")
+    assert [index for index, *_ in store.rows()] == [0, 1]
+    store.close()
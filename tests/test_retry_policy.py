@@ -0,0 +1,41 @@
+from retry_policy import DEFAULT_RETRY_POLICY, POLICIES, ContinueRetry, RegenerateRetry
+
+FIRST = {"model": "m", "system": "You write prompts.", "prompt": "Input prompt to enhance: a dragon",
+         "options": {"temperature": 0.7, "num_predict": 400}, "stream": True}
+PROMPTS = {"expand": "Expand this: short text.", "continue": "Continue with about 80 more words."}
+FINAL = {"done": True, "eval_count": 120, "context": [1, 2, 3]}
+
+
+def test_regenerate_starts_over_with_the_expand_prompt():
+    request_json, prefix = RegenerateRetry().next_request(FIRST, FINAL, "short text.", PROMPTS, 100)
+    assert request_json["prompt"] == PROMPTS["expand"]
+    assert request_json["system"] == FIRST["system"]
+    assert request_json["options"] == FIRST["options"]
+    assert prefix == ""
+
+
+def test_continue_keeps_the_system_prompt_and_sends_the_text_so_far():
+    request_json, prefix = ContinueRetry().next_request(FIRST, FINAL, "short text.", PROMPTS, 100)
+    assert request_json["system"] == FIRST["system"]
+    assert "context" not in request_json
+    assert request_json["prompt"].startswith(FIRST["prompt"])
+    assert "short text." in request_json["prompt"]
+    assert request_json["prompt"].endswith(PROMPTS["continue"])
+    assert request_json["options"] == {"temperature": 0.7, "num_predict": 100}
+    assert prefix == "short text."
+
+
+def test_continue_leaves_the_first_request_alone():
+    ContinueRetry().next_request(FIRST, FINAL, "short text.", PROMPTS, 100)
+    assert FIRST["options"]["num_predict"] == 400
+
+
+def test_continue_falls_back_without_text():
+    request_json, prefix = ContinueRetry().next_request(FIRST, {}, "", PROMPTS, 100)
+    assert request_json["prompt"] == PROMPTS["expand"]
+    assert prefix == ""
+
+
+def test_policies_by_name():
+    assert set(POLICIES) == {"regenerate", "continue"}
+    assert DEFAULT_RETRY_POLICY is POLICIES["continue"]
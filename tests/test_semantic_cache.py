@@ -0,0 +1,71 @@
+import pytest
+
+import prompt_generators
+import semantic_cache
+from endpoint_pool import EndpointPool
+from mock_ollama import MockConfig, MockOllama
+from result_cache import ResultCache
+
+pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """A mock server with an embedding model, and fresh exact and semantic caches"""
+    server = MockOllama(MockConfig(models=[prompt_generators.DEFAULT_MODEL], length="fixed:260", seed=1)).start()
+    pool = EndpointPool([server.url])
+    monkeypatch.setattr(prompt_generators, "ollama", pool)
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(prompt_generators, "result_cache", cache)
+    similar = semantic_cache.SemanticCache(str(tmp_path / "semantic"))
+    similar.configure(True, embedder=semantic_cache.OllamaEmbedder(pool))
+    monkeypatch.setattr(prompt_generators, "semantic_cache", similar)
+    yield pool, cache, similar
+    similar.close()
+    cache.close()
+    server.stop()
+
+
+def test_mock_embeddings_are_deterministic(server):
+    pool = server[0]
+    first, again, other = pool.embed(semantic_cache.DEFAULT_EMBED_MODEL,
+                                     ["A red dragon", "a red dragon!", "a blue whale"])
+    assert first == again
+    assert first != other
+    assert sum(x * x for x in first) == pytest.approx(1.0)
+
+
+def test_similar_prompt_counts_as_a_cache_hit(server):
+    _, cache, similar = server
+    first = prompt_generators.generate_single_prompt("a red dragon over a castle at dawn")
+    report = {}
+    again = prompt_generators.generate_single_prompt("A red dragon over a castle, at dawn!", report=report)
+    assert again == first and report["cached"]
+    assert (cache.hits, cache.misses, cache.similar_hits) == (1, 1, 1)
+    assert similar.hits == 1
+
+
+class CountingEmbedder(semantic_cache.HashingEmbedder):
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def embed(self, texts):
+        self.requests.append(len(texts))
+        return super().embed(texts)
+
+
+def test_prefetched_prompts_are_looked_up_without_embedding_again(tmp_path):
+    embedder = CountingEmbedder()
+    cache = semantic_cache.SemanticCache(str(tmp_path / "semantic"))
+    cache.configure(True, embedder=embedder)
+    prompts = ["a red dragon at dawn", "a blue whale", "At dawn, a red dragon!"]
+    cache.prefetch(prompts)
+    cache.lookup(prompts[0], "scope").store("key-0")
+    cache.lookup(prompts[1], "scope").store("key-1")
+    # A prompt earlier in the same window was stored in the meantime, and is found
+    assert cache.lookup(prompts[2], "scope").key == "key-0"
+    assert embedder.requests == [3]
+    cache.lookup("not prefetched", "scope")
+    assert embedder.requests == [3, 1]
+    cache.close()
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+import generation_options
+import prompt_generators
+import speculative
+from endpoint_pool import EndpointPool
+from mock_ollama import MockConfig, MockOllama
+from prompt_validation import WINDOWS, validate_item
+from result_cache import ResultCache
+from speculative import SpeculativeGenerator, SpeculativeStats
+from stream_guard import CANCELLED, StreamStats
+
+
+def test_winner_while_the_first_candidate_has_no_timing_yet(monkeypatch, tmp_path):
+    monkeypatch.setattr(speculative, "result_cache", ResultCache(str(tmp_path / "cache.sqlite3"), enabled=False))
+    release = threading.Event()
+
+    def run(self, candidate, request_json, cancel, finished, started, on_token):
+        if candidate.number == 0:
+            # Has its result but is still inside _run, with elapsed unset
+            candidate.result = ("first prompt.", 250)
+            release.wait(5)
+            candidate.elapsed = time.monotonic() - started
+        else:
+            candidate.elapsed = time.monotonic() - started
+            candidate.result = ("second prompt.", 260)
+        finished.put(candidate)
+
+    monkeypatch.setattr(SpeculativeGenerator, "_run", run)
+    stats = SpeculativeStats()
+    generator = SpeculativeGenerator("english", candidates=2, stats=stats)
+    report = {}
+    try:
+        assert generator("a dragon", report=report) == ("second prompt.", 260)
+    finally:
+        release.set()
+    assert report["attempts"] == 2
+    assert stats.prompts == 1 and stats.won == 1
+    # No saving is claimed for a candidate whose time is not known
+    assert stats.sequential[0] == stats.latencies[0]
+
+
+@pytest.fixture
+def streams(tmp_path, monkeypatch):
+    """Three seeded candidates streaming 250, 240 and 270 tokens from a mock server"""
+    server = MockOllama(MockConfig(models=[prompt_generators.DEFAULT_MODEL], length="uniform:230:295",
+                                   token_delay=0.003)).start()
+    pool = EndpointPool([server.url])
+    monkeypatch.setattr(prompt_generators, "ollama", pool)
+    monkeypatch.setattr(prompt_generators, "stream_stats", StreamStats())
+    monkeypatch.setattr(speculative, "result_cache", ResultCache(str(tmp_path / "cache.sqlite3"), enabled=False))
+    monkeypatch.setattr(generation_options, "_overrides", {"english/enhance": {"seed": 6}})
+    validated = []
+
+    def spy(text, language):
+        result = validate_item(text, language)
+        validated.append(result)
+        return result
+
+    monkeypatch.setattr(speculative, "validate_item", spy)
+    yield validated
+    pool.close()
+    server.stop()
+
+
+def test_first_policy_hangs_up_on_the_losers_mid_stream(streams):
+    stats = SpeculativeStats()
+    result = SpeculativeGenerator("english", candidates=3, cancel_policy="first", stats=stats)("a red dragon")
+    assert streams == [result]  # Only the winner streamed to the end
+    assert stats.won == 1  # The shortest stream was the second candidate's
+    deadline = time.monotonic() + 5
+    while prompt_generators.stream_stats.aborts[CANCELLED] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert prompt_generators.stream_stats.aborts[CANCELLED] == 2
+    assert stats.tokens < 250 + 240 + 270
+
+
+def test_best_policy_waits_for_every_candidate_and_picks_the_middle(streams):
+    stats = SpeculativeStats()
+    result = SpeculativeGenerator("english", candidates=3, cancel_policy="best", stats=stats)("a red dragon")
+    assert len(streams) == 3 and all(streams)
+    middle = sum(WINDOWS["english"]) / 2
+    assert result == min(streams, key=lambda passed: abs(passed[1] - middle))
+    assert result != streams[0] and stats.won == 1
+    assert prompt_generators.stream_stats.aborts[CANCELLED] == 0